@@ -0,0 +1,137 @@
+'''
+Allocation benchmark of one runggeKutta4 step on the array-backed State.
+
+The reference is the State it replaced: five attributes walked through
+__dict__ for every operator, with runggeKutta4 building a new State for every
+stage product and sum. Both steps integrate the same derivative, written against
+the State object API, so only the State arithmetic differs.
+
+The arithmetic rows replace the derivative by a constant rate, which leaves only
+the stage sums and products the array-backed State was written for. tracemalloc
+does not count allocations, so the allocation count is estimated from the time
+tracemalloc adds to a step, in units of the time it adds to one object() (one
+allocation and one free). The peak row is the most memory allocated during one
+step above the memory held before it; the array path holds fewer but larger
+objects (numpy arrays and memoryviews), so this is no smaller than the reference.
+
+Usage:
+    python benchmarks/bench_allocations.py
+'''
+import timeit
+import tracemalloc
+
+from leoss import *
+
+MU = 398600.4418e9
+
+class ReferenceState():
+
+    def __init__(self, mass=0.0, pos=Vector(), vel=Vector(), quat=Quaternion(), omega=Vector()):
+        self.mass       = mass
+        self.position   = pos
+        self.velocity   = vel
+        self.quaternion = quat
+        self.bodyrate   = omega
+
+    def __getitem__(self, item):
+        return list(self.__dict__.values())[item]
+
+    def __setitem__(self, item, value):
+        key = list(self.__dict__.keys())[item]
+        self.__dict__[key] = value
+
+    def __add__(self, other):
+        newstate = ReferenceState()
+        for i in range(0,len(self.__dict__),1):
+            if isinstance(self[i], Quaternion):
+                newstate[i] = Quaternion(self[i].w + other[i].w, self[i].x + other[i].x,
+                                         self[i].y + other[i].y, self[i].z + other[i].z)
+            else:
+                newstate[i] = self[i] + other[i]
+        return newstate
+
+    def __mul__(self, other):
+        newstate = ReferenceState()
+        for i in range(0,len(self.__dict__),1):
+            newstate[i] = self[i] * other
+        return newstate
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __truediv__(self, other):
+        newstate = ReferenceState()
+        for i in range(0,len(self.__dict__),1):
+            newstate[i] = self[i] / other
+        return newstate
+
+def referenceRungeKutta4(derivative, state, time, deltaTime):
+    k1 = derivative(state, time)
+    k2 = derivative(state + k1*deltaTime/2, time + deltaTime/2)
+    k3 = derivative(state + k2*deltaTime/2, time + deltaTime/2)
+    k4 = derivative(state + k3*deltaTime, time + deltaTime)
+    k  = (1/6)*(k1 + 2*k2 + 2*k3 + k4)*deltaTime
+    return state + k
+
+def newDerivative(stateclass):
+    def derivative(state, time):
+        position = state.position
+        deltaState = stateclass()
+        deltaState.position   = state.velocity
+        deltaState.velocity   = position*(-MU/position.magnitude()**3)
+        deltaState.quaternion = quaternionDerivative(state.bodyrate, state.quaternion)
+        deltaState.bodyrate   = Vector(0, 0, 0)
+        return deltaState
+    return derivative
+
+def newState(stateclass):
+    return stateclass(4.0, 1e3*Vector(4395.079, 3631.589, -3712.576), 1e3*Vector(-5.769, 2.582, -4.310),
+                      Quaternion(1, 0, 0, 0), Vector(0.01, 0.02, 0.03))
+
+def tracedCost(function, number):
+    # time tracemalloc adds to one call: it traces every allocation and free
+    untraced = min(timeit.repeat(function, number=number, repeat=5))/number
+    tracemalloc.start()
+    traced = min(timeit.repeat(function, number=number, repeat=5))/number
+    tracemalloc.stop()
+    return traced - untraced
+
+def peakPerStep(function, steps):
+    peaks = []
+    tracemalloc.start()
+    for k in range(steps):
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        function()
+        peaks.append(tracemalloc.get_traced_memory()[1] - start)
+    tracemalloc.stop()
+    return min(peaks)
+
+def main(number=5000, steps=200):
+    print(f'{"":28s} {"reference":>12s} {"array":>12s} {"ratio":>8s}')
+
+    full, arithmetic = [], []
+    for integrator, stateclass in ((referenceRungeKutta4, ReferenceState), (runggeKutta4, State)):
+        derivative = newDerivative(stateclass)
+        state = newState(stateclass)
+        rate = derivative(state, 0.0)
+        full.append(lambda integrator=integrator, derivative=derivative, state=state:
+                    integrator(derivative, state, 0.0, 1/32))
+        arithmetic.append(lambda integrator=integrator, rate=rate, state=state:
+                          integrator(lambda state, time: rate, state, 0.0, 1/32))
+
+    times = [ min(timeit.repeat(step, number=number, repeat=5))/number for step in full ]
+    print(f'{"time per step":28s} {times[0]*1e6:9.2f} us {times[1]*1e6:9.2f} us {times[0]/times[1]:7.2f}x')
+
+    times = [ min(timeit.repeat(step, number=number, repeat=5))/number for step in arithmetic ]
+    print(f'{"arithmetic time per step":28s} {times[0]*1e6:9.2f} us {times[1]*1e6:9.2f} us {times[0]/times[1]:7.2f}x')
+
+    allocation = tracedCost(object, 40*number)
+    counts = [ tracedCost(step, number)/allocation for step in arithmetic ]
+    print(f'{"arithmetic allocations":28s} {counts[0]:12.0f} {counts[1]:12.0f} {counts[0]/counts[1]:7.2f}x')
+
+    peaks = [ peakPerStep(step, steps) for step in arithmetic ]
+    print(f'{"arithmetic peak memory":28s} {peaks[0]:10.0f} B {peaks[1]:10.0f} B {peaks[0]/peaks[1]:7.2f}x')
+
+if __name__ == '__main__':
+    main()
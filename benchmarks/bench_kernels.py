@@ -0,0 +1,121 @@
+'''
+Micro-benchmark of the Vector, Quaternion and Matrix kernels used in the attitude path.
+
+Each kernel is timed next to a reference written the way it was before the direct
+3x3 kernels: dict based Vector and Matrix classes storing the column vectors, and
+products built from temporary Vectors. quaternionDerivative is timed next to the former
+function, which multiplied the zero terms and divided every component by 2.
+
+Usage:
+    python benchmarks/bench_kernels.py
+'''
+import timeit
+
+from leoss import *
+
+class ReferenceVector():
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def __add__(self, other):
+        return ReferenceVector(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __mul__(self, other):
+        if isinstance(other, ReferenceVector):
+            return ReferenceVector(self.x * other.x, self.y * other.y, self.z * other.z)
+        return ReferenceVector(self.x * other, self.y * other, self.z * other)
+
+    def sum(self):
+        return self.x + self.y + self.z
+
+class ReferenceMatrix():
+
+    def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.xx = x.x; self.yx = y.x; self.zx = z.x
+        self.xy = x.y; self.yy = y.y; self.zy = z.y
+        self.xz = x.z; self.yz = y.z; self.zz = z.z
+
+    def transpose(self):
+        x = ReferenceVector(self.xx, self.yx, self.zx)
+        y = ReferenceVector(self.xy, self.yy, self.zy)
+        z = ReferenceVector(self.xz, self.yz, self.zz)
+        return ReferenceMatrix(x, y, z)
+
+    def __mul__(self, other):
+        T = self.transpose()
+        return ReferenceVector((T.x * other).sum(), (T.y * other).sum(), (T.z * other).sum())
+
+    def __truediv__(self, other):
+        return ReferenceMatrix(self.x*(1/other), self.y*(1/other), self.z*(1/other))
+
+    def inverse(self):
+        m1 = self.xx; m2 = self.yx; m3 = self.zx
+        m4 = self.xy; m5 = self.yy; m6 = self.zy
+        m7 = self.xz; m8 = self.yz; m9 = self.zz
+
+        x = ReferenceVector( m5*m9-m6*m8, m6*m7-m4*m9, m4*m8-m5*m7 )
+        y = ReferenceVector( m3*m8-m2*m9, m1*m9-m3*m7, m2*m7-m1*m8 )
+        z = ReferenceVector( m2*m6-m3*m5, m3*m4-m1*m6, m1*m5-m2*m4 )
+        inv = ReferenceMatrix(x, y, z)
+
+        w = ReferenceVector(inv.xx, inv.yx, inv.zx)
+        return inv / (w*self.x).sum()
+
+def referenceToMatrix(quat):
+    x = ReferenceVector()
+    y = ReferenceVector()
+    z = ReferenceVector()
+    x.x = 1 - 2*(quat.y**2 + quat.z**2)
+    y.x = 2*quat.x*quat.y + 2*quat.w*quat.z
+    z.x = -2*quat.w*quat.y + 2*quat.x*quat.z
+
+    x.y = 2*quat.x*quat.y - 2*quat.w*quat.z
+    y.y = 1 - 2*(quat.x**2+quat.z**2)
+    z.y = 2*quat.w*quat.x + 2*quat.y*quat.z
+
+    x.z = 2*quat.w*quat.y + 2*quat.x*quat.z
+    y.z = -2*quat.w*quat.x + 2*quat.y*quat.z
+    z.z = 1 - 2*(quat.x**2 + quat.y**2)
+    return ReferenceMatrix(x, y, z)
+
+def referenceQuaternionDerivative(omega, quat):
+    qdotW =       0*quat.w - omega.x*quat.x - omega.y*quat.y - omega.z*quat.z
+    qdotX = omega.x*quat.w +       0*quat.x + omega.z*quat.y - omega.y*quat.z
+    qdotY = omega.y*quat.w - omega.z*quat.x +       0*quat.y + omega.x*quat.z
+    qdotZ = omega.z*quat.w + omega.y*quat.x - omega.x*quat.y +       0*quat.z
+    return Quaternion( qdotW/2, qdotX/2, qdotY/2, qdotZ/2 )
+
+def main(number=200000):
+    omega = Vector(0.1, -0.2, 0.3)
+    quat  = Quaternion(0.9238795325112867, 0.3826834323650898, 0.0, 0.0)
+    matrix = rectbodyInertia(Vector(0.1, 0.1, 0.3405), 4.0)
+    vector = Vector(5.0, 3.0, 4.0)
+
+    referenceOmega  = ReferenceVector(0.1, -0.2, 0.3)
+    referenceVector = ReferenceVector(5.0, 3.0, 4.0)
+    referenceMatrix = ReferenceMatrix(ReferenceVector(matrix.xx, matrix.xy, matrix.xz),
+                                      ReferenceVector(matrix.yx, matrix.yy, matrix.yz),
+                                      ReferenceVector(matrix.zx, matrix.zy, matrix.zz))
+
+    cases = {
+        'quaternionDerivative': (lambda: quaternionDerivative(omega, quat), lambda: referenceQuaternionDerivative(omega, quat)),
+        'Quaternion.toMatrix' : (lambda: quat.toMatrix(), lambda: referenceToMatrix(quat)),
+        'Matrix.inverse'      : (lambda: matrix.inverse(), lambda: referenceMatrix.inverse()),
+        'Matrix * Vector'     : (lambda: matrix * vector, lambda: referenceMatrix * referenceVector),
+        'Vector + Vector'     : (lambda: vector + omega, lambda: referenceVector + referenceOmega),
+    }
+
+    print(f'{"":24s} {"reference":>12s} {"kernel":>12s} {"speedup":>8s}')
+    for name, (case, reference) in cases.items():
+        best = min(timeit.repeat(case, number=number, repeat=5))/number
+        baseline = min(timeit.repeat(reference, number=number, repeat=5))/number
+        print(f'{name:24s} {baseline*1e9:9.1f} ns {best*1e9:9.1f} ns {baseline/best:7.2f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+'''
+Benchmark of the multi-rate integrator against single-rate RK4.
+
+Both runs detumble the DIWATA spacecraft for 60 s at a 1/32 s step with the IGRF
+disturbance torque of its dipole. The multi-rate run takes the orbit in 4 s steps
+and the attitude in 1/32 s sub-steps; the single-rate run takes both at 1/32 s.
+Printed are the wall clock of each run and how far the multi-rate run ends from the
+single-rate one.
+
+Usage:
+    python benchmarks/bench_multirate.py
+'''
+import time
+
+from leoss import *
+
+def newSystem():
+    system = LEOSS()
+    system.epoch(2023,9,26,3,11,18,0)
+    system.addSpacecraft("DIWATA")
+    spacecraft = system[0]
+    spacecraft.setmass(4)
+    spacecraft.setsize(Vector(0.1, 0.1, 0.3))
+    spacecraft.setposition(1e3*Vector(4395.079058029986, 3631.5889348004957, -3712.575674067216))
+    spacecraft.setvelocity(1e3*Vector(-5.76886641743168, 2.5823185921356733, -4.310210403510053))
+    spacecraft.setbodyrate(Vector(5, -4, 3))
+    spacecraft.magnetfieldTYPE = "EARTH"
+    spacecraft.dipole = Vector(0.05, 0.02, 0.01)
+    return system
+
+def timed(timeEnd, **options):
+    best = None
+    for k in range(3):
+        system = newSystem()
+        start = time.perf_counter()
+        simulate(system, timeEnd, 1/32, **options)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, system
+
+def main(timeEnd=60, orbitStep=4.0):
+    single, singleSystem = timed(timeEnd)
+    multi, multiSystem = timed(timeEnd, integrator='multirate', orbitStep=orbitStep)
+    print(f'{"":24s} {"single rate":>12s} {"multi-rate":>12s} {"ratio":>8s}')
+    print(f'{"wall clock":24s} {single:10.2f} s {multi:10.2f} s {single/multi:7.2f}x')
+
+    position = (multiSystem[0].getposition() - singleSystem[0].getposition()).magnitude()
+    bodyrate = (multiSystem[0].state.bodyrate - singleSystem[0].state.bodyrate).magnitude()
+    print(f'{"position difference":24s} {position*1e3:10.3f} mm')
+    print(f'{"body rate difference":24s} {bodyrate:12.2e} rad/s')
+
+if __name__ == '__main__':
+    main()
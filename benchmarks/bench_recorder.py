@@ -0,0 +1,134 @@
+'''
+Benchmark of Recorder.update against the recorder it replaced.
+
+The reference keeps one list of objects per item, appends the datetime of every
+update and reads every item through the if/elif chain of Spacecraft.__getitem__
+with list(keys()) lookups, as the recorder did before the float64 columns.
+
+Between updates the spacecraft goes through what an integration step leaves
+behind: a new State, new Vectors of computed values for the location, the net
+force, torque and momentum and the Sun, the illumination memo refreshed and the
+sensors read every 32 steps. The record cost is the time a run of steps takes
+with the updates less the time it takes without them. Garbage collection stays
+on, as in a simulation: the objects the reference keeps are what it traverses.
+The memory per sample is what the recorder retains after a run, its reserved rows
+included, over its samples.
+
+Usage:
+    python benchmarks/bench_recorder.py
+'''
+import time
+import tracemalloc
+
+from leoss import *
+
+class ReferenceRecorder():
+
+    def __init__(self, spacecraft, datalist):
+        self.attachedTo = spacecraft
+        self.dataDict = { "Datetime" : [] }
+        for item in datalist:
+            self.dataDict[item] = []
+
+    def update(self, datetime):
+        self.dataDict["Datetime"].append(datetime)
+        for item in list(self.dataDict.keys())[1:]:
+            self.dataDict[item].append(referenceItem(self.attachedTo, item))
+
+def referenceItem(spacecraft, item):
+    if item == "State":
+        return spacecraft.state
+    elif item == "Netforce":
+        return spacecraft.netforce
+    elif item == "Nettorque":
+        return spacecraft.nettorque
+    elif item == "Netmoment":
+        return spacecraft.netmomentum
+    elif item == "Location":
+        return spacecraft.location
+    elif item == "Sunlocation":
+        return spacecraft.system.sunLocation
+    elif item == "Sunvector":
+        return spacecraft.system.sunVector
+    elif item == "Illumination":
+        return spacecraft.getillumination()
+    elif item in list(spacecraft.sensors.keys()):
+        return spacecraft.getSensors()[item].data
+    raise TypeError("Operand should be a recorder item")
+
+def newSpacecraft():
+    system = LEOSS()
+    system.addSpacecraft("DIWATA", ["Illumination", "Sunvector"])
+    spacecraft = system[0]
+    spacecraft.setmass(4)
+    spacecraft.setsize(Vector(0.1, 0.1, 0.3))
+    spacecraft.setposition(1e3*Vector(4395.079, 3631.589, -3712.576))
+    spacecraft.setvelocity(1e3*Vector(-5.769, 2.582, -4.310))
+    for k in range(4):
+        spacecraft.addSensor(Sensor(f"Sensor{k}"))
+    return spacecraft
+
+def step(spacecraft, k):
+    system = spacecraft.system
+    system.time = system.time + 1.0
+    array = spacecraft.state.array + 1e-3
+    spacecraft.state = State.fromarray(array)
+    spacecraft.getposition()
+    x, y, z = array[1:4].tolist()
+    spacecraft.location    = Vector(14.6 + 1e-6*x, 121.0 + 1e-6*y, 420.0 + 1e-6*z)
+    spacecraft.netforce    = Vector(-1e-7*x, -1e-7*y, -1e-7*z)
+    spacecraft.nettorque   = Vector(1e-9*x, 1e-9*y, 1e-9*z)
+    spacecraft.netmomentum = Vector(1e-8*x, 1e-8*y, 1e-8*z)
+    system.sunVector   = Vector(1.5e11 - x, 1e-3*y, 1e-3*z)
+    system.sunLocation = Vector(-23.0 + 1e-9*x, 1e-9*y, 1.5e8 + 1e-9*z)
+    spacecraft.illuminationMemo = (system.time, x, y, z, spacecraft.shadowTYPE, 1.0 - 1e-9*x)
+    if k % 32 == 0:
+        for sensor in spacecraft.sensors.values():
+            sensor.data = Vector(1e-9*x, 1e-9*y, 1e-9*z)
+
+def run(steps, record=None):
+    spacecraft = newSpacecraft()
+    update = None if record is None else record(spacecraft)
+    start = time.perf_counter()
+    for k in range(steps):
+        step(spacecraft, k)
+        if update is not None:
+            update()
+    return time.perf_counter() - start
+
+def columnar(spacecraft, samples=0):
+    # as LEOSS records, at the time in seconds, into the rows simulate reserves
+    recorder, system = spacecraft.recorder, spacecraft.system
+    recorder.reserve(0.0, samples, 1.0)
+    return lambda: recorder.update(system.time)
+
+def lists(spacecraft, samples=0):
+    # as LEOSS recorded, at the datetime
+    recorder, system = ReferenceRecorder(spacecraft, list(spacecraft.recorder.channels)), spacecraft.system
+    return lambda: recorder.update(system.datenow())
+
+def retained(record, samples):
+    spacecraft = newSpacecraft()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    update = record(spacecraft, samples)
+    for k in range(samples):
+        step(spacecraft, k)
+        update()
+    step(spacecraft, samples)
+    size = (tracemalloc.get_traced_memory()[0] - start)/samples
+    tracemalloc.stop()
+    return size
+
+def main(steps=50000, samples=16383, repeat=7):
+    print(f'{"":24s} {"reference":>12s} {"columnar":>12s} {"ratio":>8s}')
+
+    stepOnly = min( run(steps) for k in range(repeat) )
+    costs = [ (min( run(steps, record) for k in range(repeat) ) - stepOnly)/steps for record in (lists, columnar) ]
+    print(f'{"record cost per step":24s} {costs[0]*1e6:9.2f} us {costs[1]*1e6:9.2f} us {costs[0]/costs[1]:7.2f}x')
+
+    sizes = [ retained(record, samples) for record in (lists, columnar) ]
+    print(f'{"memory per sample":24s} {sizes[0]:10.0f} B {sizes[1]:10.0f} B {sizes[0]/sizes[1]:7.2f}x')
+
+if __name__ == '__main__':
+    main()
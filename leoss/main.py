@@ -1,15 +1,52 @@
+import atexit
+import bisect
+import collections.abc
+import copy
+import csv
 import datetime
+import functools
 import math
+import os
+import queue
+import threading
 import time as clock
 
 from tqdm import tqdm
+import numpy as np
+import pandas as pd
 import pyIGRF as IGRF
 
 R2D = 180/math.pi
 D2R = math.pi/180
 
+STATE_SIZE    = 14
+STATE_DEFAULT = np.array([0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+STATE_COLUMNS = ('mass', 'x', 'y', 'z', 'xdot', 'ydot', 'zdot', 'q0', 'q1', 'q2', 'q3', 'p', 'q', 'r')
+
+PROPAGATOR_TYPES = ("NUMERICAL", "KEPLER", "J2")
+
+THIRDBODY_TYPES = ("NONE", "SUN", "MOON", "SUNMOON")
+
+AU = 149597870.691e3
+
+GRAVITY_TYPES = ("NONE", "SPHERICAL2BODY", "J2", "GEOPOTENTIAL")
+
+SRP_TYPES    = ("NONE", "CANNONBALL")
+SHADOW_TYPES = ("CYLINDRICAL", "CONICAL")
+
+GEOMETRY_TYPES = ("MEANAREA", "PANELS")
+
+RECORD_TYPES = ("EVERY", "CADENCE", "ONCHANGE", "WINDOW")
+
+SOLAR_PRESSURE = 4.56e-6    ## N/m^2 at 1 AU
+SUN_RADIUS     = 696000e3   ## m
+
+TICKS_PER_SECOND = 10**9
+
 class Vector():
 
+    __slots__ = ('x', 'y', 'z')
+
     def __init__(self, x=0.0, y=0.0, z=0.0):
         self.x = x
         self.y = y
@@ -79,6 +116,47 @@ class Vector():
                 )
         else:
             raise TypeError("Operand must be int, or float")
+
+    def __iadd__(self, other):
+        if isinstance(other, Vector):
+            self.x = self.x + other.x
+            self.y = self.y + other.y
+            self.z = self.z + other.z
+            return self
+        else:
+            raise TypeError("Operand must a Vector")
+
+    def __isub__(self, other):
+        if isinstance(other, Vector):
+            self.x = self.x - other.x
+            self.y = self.y - other.y
+            self.z = self.z - other.z
+            return self
+        else:
+            raise TypeError("Operand must a Vector")
+
+    def __imul__(self, other):
+        if isinstance(other, Vector):
+            self.x = self.x * other.x
+            self.y = self.y * other.y
+            self.z = self.z * other.z
+            return self
+        elif isinstance(other, (int, float)):
+            self.x = self.x * other
+            self.y = self.y * other
+            self.z = self.z * other
+            return self
+        else:
+            raise TypeError("Operand must be Vector, int, or float")
+
+    def __itruediv__(self, other):
+        if isinstance(other, (int, float)):
+            self.x = self.x / other
+            self.y = self.y / other
+            self.z = self.z / other
+            return self
+        else:
+            raise TypeError("Operand must be int, or float")
         
     def __eq__(self, other):
         if isinstance(other, Vector):
@@ -88,10 +166,12 @@ class Vector():
         
     def cross(self, other):
         if isinstance(other, Vector):
+            ax = self.x; ay = self.y; az = self.z
+            bx = other.x; by = other.y; bz = other.z
             return Vector(
-                self.y * other.z - self.z * other.y,
-                self.z * other.x - self.x * other.z,
-                self.x * other.y - self.y * other.x
+                ay * bz - az * by,
+                az * bx - ax * bz,
+                ax * by - ay * bx
                 )
         else:
             raise TypeError("Operand must be Vector")
@@ -132,14 +212,48 @@ class Vector():
         return 3
 
 class Matrix():
+    '''
+    3x3 matrix stored as nine scalars, x, y, z being its column vectors.
+    '''
+
+    __slots__ = ('xx', 'xy', 'xz', 'yx', 'yy', 'yz', 'zx', 'zy', 'zz')
 
     def __init__(self, x=Vector(1,0,0), y=Vector(0,1,0), z=Vector(0,0,1)):
-        self.x = x
-        self.y = y
-        self.z = z
         self.xx = x.x; self.yx = y.x; self.zx = z.x
         self.xy = x.y; self.yy = y.y; self.zy = z.y
         self.xz = x.z; self.yz = y.z; self.zz = z.z
+
+    @classmethod
+    def fromcomponents(cls, xx, xy, xz, yx, yy, yz, zx, zy, zz):
+        M = cls.__new__(cls)
+        M.xx = xx; M.yx = yx; M.zx = zx
+        M.xy = xy; M.yy = yy; M.zy = zy
+        M.xz = xz; M.yz = yz; M.zz = zz
+        return M
+
+    @property
+    def x(self):
+        return Vector(self.xx, self.xy, self.xz)
+
+    @x.setter
+    def x(self, other):
+        self.xx = other.x; self.xy = other.y; self.xz = other.z
+
+    @property
+    def y(self):
+        return Vector(self.yx, self.yy, self.yz)
+
+    @y.setter
+    def y(self, other):
+        self.yx = other.x; self.yy = other.y; self.yz = other.z
+
+    @property
+    def z(self):
+        return Vector(self.zx, self.zy, self.zz)
+
+    @z.setter
+    def z(self, other):
+        self.zx = other.x; self.zy = other.y; self.zz = other.z
     
     def __repr__(self):
         return f'Matrix({self.xx}, {self.yx}, {self.zx}; {self.xy}, {self.yy}, {self.zy}; {self.xz}, {self.yz}, {self.zz})'
@@ -148,40 +262,67 @@ class Matrix():
         return f'Matrix({self.xx}, {self.yx}, {self.zx}; {self.xy}, {self.yy}, {self.zy}; {self.xz}, {self.yz}, {self.zz})'
 
     def transpose(self):
-        x = Vector(self.xx, self.yx, self.zx)
-        y = Vector(self.xy, self.yy, self.zy)
-        z = Vector(self.xz, self.yz, self.zz)
-        return Matrix(x, y, z)
+        return Matrix.fromcomponents(self.xx, self.yx, self.zx,
+                                     self.xy, self.yy, self.zy,
+                                     self.xz, self.yz, self.zz)
 
     def __mul__(self, other):
         if isinstance(other, Vector):
-            T = self.transpose()
-            x = (T.x * other).sum()
-            y = (T.y * other).sum()
-            z = (T.z * other).sum()
-            return Vector(x, y, z)
+            vx = other.x; vy = other.y; vz = other.z
+            return Vector(
+                self.xx*vx + self.yx*vy + self.zx*vz,
+                self.xy*vx + self.yy*vy + self.zy*vz,
+                self.xz*vx + self.yz*vy + self.zz*vz
+                )
         elif isinstance(other, Matrix):
-            x = self * other.x
-            y = self * other.y
-            z = self * other.z
-            return Matrix(x, y, z)
+            xx = self.xx; yx = self.yx; zx = self.zx
+            xy = self.xy; yy = self.yy; zy = self.zy
+            xz = self.xz; yz = self.yz; zz = self.zz
+            ox = other.xx; oy = other.xy; oz = other.xz
+            px = other.yx; py = other.yy; pz = other.yz
+            qx = other.zx; qy = other.zy; qz = other.zz
+            return Matrix.fromcomponents(
+                xx*ox + yx*oy + zx*oz, xy*ox + yy*oy + zy*oz, xz*ox + yz*oy + zz*oz,
+                xx*px + yx*py + zx*pz, xy*px + yy*py + zy*pz, xz*px + yz*py + zz*pz,
+                xx*qx + yx*qy + zx*qz, xy*qx + yy*qy + zy*qz, xz*qx + yz*qy + zz*qz
+                )
         elif isinstance(other, int) or isinstance(other, float):
-            return Matrix(self.x*other, self.y*other, self.z*other)
+            return Matrix.fromcomponents(self.xx*other, self.xy*other, self.xz*other,
+                                         self.yx*other, self.yy*other, self.yz*other,
+                                         self.zx*other, self.zy*other, self.zz*other)
         else:
             raise TypeError("Operand should be a Vector, int or float")
         
     def __rmul__(self, other):
         if isinstance(other, int) or isinstance(other, float):
-            return Matrix(self.x*other, self.y*other, self.z*other)
+            return self * other
         else:
             raise TypeError("Operand should be int or float")
 
     def __truediv__(self, other):
         if isinstance(other, int) or isinstance(other, float):
-            return Matrix(self.x/other, self.y/other, self.z/other)
+            return Matrix.fromcomponents(self.xx/other, self.xy/other, self.xz/other,
+                                         self.yx/other, self.yy/other, self.yz/other,
+                                         self.zx/other, self.zy/other, self.zz/other)
+        else:
+            raise TypeError("Operand should be int or float")
+
+    def __imul__(self, other):
+        if isinstance(other, int) or isinstance(other, float):
+            self.xx = self.xx*other; self.yx = self.yx*other; self.zx = self.zx*other
+            self.xy = self.xy*other; self.yy = self.yy*other; self.zy = self.zy*other
+            self.xz = self.xz*other; self.yz = self.yz*other; self.zz = self.zz*other
+            return self
         else:
             raise TypeError("Operand should be int or float")
 
+    def rotate_into(self, other: Vector, out: Vector):
+        vx = other.x; vy = other.y; vz = other.z
+        out.x = self.xx*vx + self.yx*vy + self.zx*vz
+        out.y = self.xy*vx + self.yy*vy + self.zy*vz
+        out.z = self.xz*vx + self.yz*vy + self.zz*vz
+        return out
+
     def trace(self):
         return self.xx + self.yy + self.zz 
 
@@ -189,14 +330,15 @@ class Matrix():
         m1 = self.xx; m2 = self.yx; m3 = self.zx
         m4 = self.xy; m5 = self.yy; m6 = self.zy
         m7 = self.xz; m8 = self.yz; m9 = self.zz
-        
-        x = Vector( m5*m9-m6*m8, m6*m7-m4*m9, m4*m8-m5*m7 )
-        y = Vector( m3*m8-m2*m9, m1*m9-m3*m7, m2*m7-m1*m8 )
-        z = Vector( m2*m6-m3*m5, m3*m4-m1*m6, m1*m5-m2*m4 )
-        inv = Matrix(x, y, z)
 
-        w = Vector(inv.xx, inv.yx, inv.zx)
-        return inv / (w*self.x).sum()
+        cxx = m5*m9-m6*m8; cxy = m6*m7-m4*m9; cxz = m4*m8-m5*m7
+        cyx = m3*m8-m2*m9; cyy = m1*m9-m3*m7; cyz = m2*m7-m1*m8
+        czx = m2*m6-m3*m5; czy = m3*m4-m1*m6; czz = m1*m5-m2*m4
+
+        det = cxx*m1 + cyx*m4 + czx*m7
+        return Matrix.fromcomponents(cxx/det, cxy/det, cxz/det,
+                                     cyx/det, cyy/det, cyz/det,
+                                     czx/det, czy/det, czz/det)
 
     def isOrthogonal(self):
         I = self * self.transpose()
@@ -246,6 +388,8 @@ class Matrix():
 
 class Quaternion():
 
+    __slots__ = ('w', 'x', 'y', 'z')
+
     def __init__(self, w=1.0, x=0.0, y=0.0, z=0.0):
         self.w = w
         self.x = x
@@ -351,21 +495,12 @@ class Quaternion():
         return Vector(self.x, self.y, self.z) / (1 + self.magnitude())
 
     def toMatrix(self):
-        x = Vector()
-        y = Vector()
-        z = Vector()
-        x.x = 1 - 2*(self.y**2 + self.z**2)
-        y.x = 2*self.x*self.y + 2*self.w*self.z
-        z.x = -2*self.w*self.y + 2*self.x*self.z
-
-        x.y = 2*self.x*self.y - 2*self.w*self.z
-        y.y = 1 - 2*(self.x**2+self.z**2)
-        z.y = 2*self.w*self.x + 2*self.y*self.z
-        
-        x.z = 2*self.w*self.y + 2*self.x*self.z
-        y.z = -2*self.w*self.x + 2*self.y*self.z
-        z.z = 1 - 2*(self.x**2 + self.y**2)
-        return Matrix(x, y, z)
+        w = self.w; x = self.x; y = self.y; z = self.z
+        return Matrix.fromcomponents(
+            1 - 2*(y**2 + z**2),       2*x*y - 2*w*z,           2*w*y + 2*x*z,
+            2*x*y + 2*w*z,             1 - 2*(x**2+z**2),       -2*w*x + 2*y*z,
+            -2*w*y + 2*x*z,            2*w*x + 2*y*z,           1 - 2*(x**2 + y**2)
+            )
 
     def YPR_toRPY_vector(self):
         Q = self.normalize()
@@ -377,93 +512,284 @@ class Quaternion():
         return Vector(phi, theta, psi)
     
     def rotate(self, other: Vector):
+        return self.rotate_into(other, Vector())
+
+    def rotate_into(self, other: Vector, out: Vector):
         if isinstance(other, Vector):
-            Rt = Quaternion(self.w, -self.x, -self.y, -self.z)
-            P  = Quaternion(0, other.x, other.y, other.z)
-            RP = hamiltonProduct(self, P)
-            RPRt = hamiltonProduct(RP, Rt)
-            Vec = Vector(RPRt.x, RPRt.y, RPRt.z)
-            return Vec
+            w = self.w; x = self.x; y = self.y; z = self.z
+            vx = other.x; vy = other.y; vz = other.z
+            W = w*0 - x*vx - y*vy - z*vz
+            X = w*vx + x*0 + y*vz - z*vy
+            Y = w*vy - x*vz + y*0 + z*vx
+            Z = w*vz + x*vy - y*vx + z*0
+            out.x = W*-x + X*w + Y*-z - Z*-y
+            out.y = W*-y - X*-z + Y*w + Z*-x
+            out.z = W*-z + X*-y - Y*-x + Z*w
+            return out
         else:
             raise TypeError("Operand should be a Vector")
 
+    def __imul__(self, other):
+        if isinstance(other, (int, float)):
+            self.w = self.w * other
+            self.x = self.x * other
+            self.y = self.y * other
+            self.z = self.z * other
+            return self
+        else:
+            raise TypeError("Operand must be int, or float")
+
     def conjugate(self):
         return Quaternion(self.w, -self.x, -self.y, -self.z)
 
     def __len__(self):
         return 4
 
-class State():
+class VectorView(Vector):
+    '''
+    Vector whose components live inside the float64 buffer of a State.
+    Reading or assigning x, y, z reads or writes the buffer in place.
+    '''
+
+    __slots__ = ('_buffer', '_offset')
+
+    def __init__(self, buffer, offset):
+        self._buffer = buffer
+        self._offset = offset
+
+    def detach(self):
+        self._buffer = [self.x, self.y, self.z]
+        self._offset = 0
+
+    # augmented assignment on a view rebinds the name to a new Vector,
+    # so v = state.position; v += dv leaves the State untouched
+    def __iadd__(self, other):
+        return self + other
+
+    def __isub__(self, other):
+        return self - other
+
+    def __imul__(self, other):
+        return self * other
+
+    def __itruediv__(self, other):
+        return self / other
+
+    @property
+    def x(self):
+        return self._buffer[self._offset]
+
+    @x.setter
+    def x(self, value):
+        self._buffer[self._offset] = value
+
+    @property
+    def y(self):
+        return self._buffer[self._offset+1]
+
+    @y.setter
+    def y(self, value):
+        self._buffer[self._offset+1] = value
+
+    @property
+    def z(self):
+        return self._buffer[self._offset+2]
 
-    def __init__(self, mass=0.0, pos=Vector(), vel=Vector(), quat=Quaternion(), omega=Vector()):
-        self.mass       = mass
-        self.position   = pos
-        self.velocity   = vel
-        self.quaternion = quat
-        self.bodyrate   = omega
+    @z.setter
+    def z(self, value):
+        self._buffer[self._offset+2] = value
+
+class QuaternionView(Quaternion):
+    '''
+    Quaternion whose components live inside the float64 buffer of a State.
+    Reading or assigning w, x, y, z reads or writes the buffer in place.
+    '''
+
+    __slots__ = ('_buffer', '_offset')
+
+    def __init__(self, buffer, offset):
+        self._buffer = buffer
+        self._offset = offset
+
+    def detach(self):
+        self._buffer = [self.w, self.x, self.y, self.z]
+        self._offset = 0
+
+    def __imul__(self, other):
+        return self * other
+
+    @property
+    def w(self):
+        return self._buffer[self._offset]
+
+    @w.setter
+    def w(self, value):
+        self._buffer[self._offset] = value
+
+    @property
+    def x(self):
+        return self._buffer[self._offset+1]
+
+    @x.setter
+    def x(self, value):
+        self._buffer[self._offset+1] = value
+
+    @property
+    def y(self):
+        return self._buffer[self._offset+2]
+
+    @y.setter
+    def y(self, value):
+        self._buffer[self._offset+2] = value
+
+    @property
+    def z(self):
+        return self._buffer[self._offset+3]
+
+    @z.setter
+    def z(self, value):
+        self._buffer[self._offset+3] = value
+
+class State():
+    '''
+    Spacecraft state stored in one contiguous float64 buffer of STATE_SIZE values:
+        [ mass | position x,y,z | velocity x,y,z | quaternion w,x,y,z | bodyrate x,y,z ]
+    position, velocity, quaternion and bodyrate are views into the buffer, so writing a
+    component (state.position.x = 7) writes the state. Assigning a whole field detaches the
+    view handed out before, which keeps the values it had, as with the former attributes.
+    '''
+
+    fields = ('mass', 'position', 'velocity', 'quaternion', 'bodyrate')
+
+    def __init__(self, mass=0.0, pos=None, vel=None, quat=None, omega=None):
+        self.array  = STATE_DEFAULT.copy()
+        self.buffer = memoryview(self.array)
+        self._views = None
+
+        self.mass = mass
+        if pos is not None:
+            self.position = pos
+        if vel is not None:
+            self.velocity = vel
+        if quat is not None:
+            self.quaternion = quat
+        if omega is not None:
+            self.bodyrate = omega
+
+    @classmethod
+    def fromarray(cls, array):
+        state = cls.__new__(cls)
+        state.array  = array
+        state.buffer = memoryview(array)
+        state._views = None
+        return state
+
+    def copy(self):
+        return State.fromarray(self.array.copy())
+
+    def views(self):
+        if self._views is None:
+            self._views = ( VectorView(self.buffer, 1),
+                            VectorView(self.buffer, 4),
+                            QuaternionView(self.buffer, 7),
+                            VectorView(self.buffer, 11) )
+        return self._views
+
+    def release(self, index):
+        views = self._views
+        if views is not None:
+            views[index].detach()
+            self._views = None
+
+    @property
+    def mass(self):
+        return self.buffer[0]
+
+    @mass.setter
+    def mass(self, value):
+        self.buffer[0] = value
+
+    @property
+    def position(self):
+        return self.views()[0]
+
+    @position.setter
+    def position(self, value):
+        self.release(0)
+        buffer = self.buffer
+        buffer[1] = value.x; buffer[2] = value.y; buffer[3] = value.z
+
+    @property
+    def velocity(self):
+        return self.views()[1]
+
+    @velocity.setter
+    def velocity(self, value):
+        self.release(1)
+        buffer = self.buffer
+        buffer[4] = value.x; buffer[5] = value.y; buffer[6] = value.z
+
+    @property
+    def quaternion(self):
+        return self.views()[2]
+
+    @quaternion.setter
+    def quaternion(self, value):
+        self.release(2)
+        buffer = self.buffer
+        buffer[7] = value.w; buffer[8] = value.x; buffer[9] = value.y; buffer[10] = value.z
+
+    @property
+    def bodyrate(self):
+        return self.views()[3]
+
+    @bodyrate.setter
+    def bodyrate(self, value):
+        self.release(3)
+        buffer = self.buffer
+        buffer[11] = value.x; buffer[12] = value.y; buffer[13] = value.z
+
+    def normalizeQuaternion(self):
+        buffer = self.buffer
+        magnitude = (buffer[7]**2 + buffer[8]**2 + buffer[9]**2 + buffer[10]**2)**0.5
+        self.release(2)
+        self.array[7:11] /= magnitude
 
     def __getitem__(self, item):
         if isinstance(item, int):
-            if item >= 0 and item < len(self.__dict__):
-                return list(self.__dict__.values())[item]
+            if item >= 0 and item < len(State.fields):
+                return getattr(self, State.fields[item])
             else:
-                raise IndexError(f"There are only {len(self.__dict__)} state variables")
+                raise IndexError(f"There are only {len(State.fields)} state variables")
         else:
             raise TypeError("Operand should be a positive int")
         
     def __setitem__(self, item, value):
         if isinstance(item, int):
-            if item >= 0 and item < len(self.__dict__):
-                key = list(self.__dict__.keys())[item]
-                self.__dict__[key] = value
+            if item >= 0 and item < len(State.fields):
+                setattr(self, State.fields[item], value)
             else:
-                raise IndexError(f"There are only {len(self.__dict__)} state variables")
+                raise IndexError(f"There are only {len(State.fields)} state variables")
         else:
             raise TypeError("Operand should be a positive int")
 
     def __add__(self, other):
         if isinstance(other, State):
-            newstate = State()
-            for i in range(0,len(self.__dict__),1):
-                if isinstance(self[i], Quaternion):
-                    qw = self[i].w + other[i].w 
-                    qx = self[i].x + other[i].x
-                    qy = self[i].y + other[i].y
-                    qz = self[i].z + other[i].z
-                    newstate[i] = Quaternion(qw, qx, qy, qz)
-                else:
-                    newstate[i] = self[i] + other[i]
-            return newstate
+            return State.fromarray(self.array + other.array)
         else:
             raise TypeError("Operand must be a State")
     
     def __sub__(self, other):
         if isinstance(other, State):
-            newstate = State()
-            for i in range(0,len(self.__dict__),1):
-                if isinstance(self[i], Quaternion):
-                    qw = self[i].w - other[i].w 
-                    qx = self[i].x - other[i].x
-                    qy = self[i].y - other[i].y
-                    qz = self[i].z - other[i].z
-                    newstate[i] = Quaternion(qw, qx, qy, qz)
-                else:
-                    newstate[i] = self[i] - other[i]
-            return newstate
+            return State.fromarray(self.array - other.array)
         else:
             raise TypeError("Operand must be a State")
     
     def __mul__(self, other):
         if isinstance(other, State):
-            newstate = State()
-            for i in range(0,len(self.__dict__),1):
-                newstate[i] = self[i] * other[i]
-            return newstate
+            return State.fromarray(self.array * other.array)
         elif isinstance(other, (int, float)):
-            newstate = State()
-            for i in range(0,len(self.__dict__),1):
-                newstate[i] = self[i] * other
-            return newstate
+            return State.fromarray(self.array * other)
         else:
             raise TypeError("Operand must be a State, int or float")
         
@@ -472,16 +798,13 @@ class State():
         
     def __truediv__(self, other):
         if isinstance(other, (int, float)):
-            newstate = State()
-            for i in range(0,len(self.__dict__),1):
-                newstate[i] = self[i] / other
-            return newstate
+            return State.fromarray(self.array / other)
         else:
             raise TypeError("Operand must be int, or float")
         
     def __eq__(self, other):
         if isinstance(other, State):
-            for i in range(0,len(self.__dict__),1):
+            for i in range(0,len(State.fields),1):
                 if self[i] != other[i]:
                     return False
             return True
@@ -490,7 +813,7 @@ class State():
         
     def __str__(self):
         out = str(self[0])
-        for i in range(1,len(self.__dict__),1):
+        for i in range(1,len(State.fields),1):
             out = out + ", " + str(self[i])
         return f'State({out})'
     
@@ -599,6 +922,7 @@ class Spacecraft():
         self.netmomentum = Vector(0,0,0)
 
         self.location = Vector(0,0,0)
+        self.environment = None
         self.system = None
 
         self.recorder = None
@@ -610,9 +934,27 @@ class Spacecraft():
 
         self.dipole = Vector(0.0, 0.0, 0.0)
 
+        self.inertiaTensor  = None
+        self.inertiaKey     = None
+        self.inertiaMatrix  = None
+        self.inverseInertia = None
+
         self.gravityTYPE     = "SPHERICAL2BODY"
         self.atmosphereTYPE  = "NONE"
         self.magnetfieldTYPE = "NONE"
+        self.thirdbodyTYPE   = "NONE"
+        self.srpTYPE         = "NONE"
+        self.shadowTYPE      = "CONICAL"
+        self.propagatorTYPE  = "NUMERICAL"
+
+        self.reflectivity   = 1.5
+        self.pressureCenter = Vector(0.0, 0.0, 0.0)
+
+        self.geometryTYPE = "MEANAREA"
+        self.faceTable    = None
+        self.faces        = None
+        self.panelMemo    = None
+        self.illuminationMemo = None
 
         self.sked        = None
         self.nextCMD     = None
@@ -626,17 +968,28 @@ class Spacecraft():
             self.idxCMD = 0
             self.nextCMD = self.sked[self.idxCMD]
             self.nextCMDline = self.nextCMD.replace('\n','').replace(' ','').split(',')
-            self.unixTime = int(self.system.datenow().timestamp())
+            self.unixTime = self.system.clock.unixTime()
         else:
             raise TypeError("Input argument is not a valid class of type Sked")
 
+    def getEnvironment(self):
+        '''
+        Environment of the spacecraft at the current system time, built once per time step.
+        '''
+        if self.environment is None or not self.environment.matches(self.state.position, self.system.time):
+            self.environment = Environment(self.system, self.state.position, self.system.time)
+        return self.environment
+
     def updateUnixTime(self, cycle=1):
-        if int(self.system.datenow().timestamp()) >= self.unixTime + cycle:
-            self.unixTime = int(self.system.datenow().timestamp())
+        unixTime = self.system.clock.unixTime()
+        if unixTime >= self.unixTime + cycle:
+            self.unixTime = unixTime
             self.processSked()
             self.updateComponents()
         
     def processSked(self):
+        if self.sked is None:
+            return
         if int(self.nextCMDline[0]) == self.unixTime:
             self.COMMANDEXEC(self.nextCMDline[1], self.nextCMDline[2])
             if self.idxCMD < self.sked.size()-1:
@@ -645,6 +998,9 @@ class Spacecraft():
                 self.nextCMDline    = self.nextCMD.replace('\n','').replace(' ','').split(',')
 
     def COMMANDEXEC(self, command: str, arg=[]):
+        if self.recorder is not None:
+            self.recorder.trigger(self.system.time, "SKED")
+
         if command == 'Components' and arg == 'ON':
             for sensor in self.sensors.values():
                 sensor.power = True
@@ -666,9 +1022,132 @@ class Spacecraft():
         self.updateControllers()
         self.updateActuators()        
 
+    def setGravityModel(self, other):
+        if isinstance(other, str):
+            if other in GRAVITY_TYPES:
+                self.gravityTYPE = other
+            else:
+                raise ValueError("Input str is not a valid GravityModel")
+        else:
+            raise TypeError("Operand should be str")
+
+    def setPropagator(self, other):
+        if isinstance(other, str):
+            if other in PROPAGATOR_TYPES:
+                self.propagatorTYPE = other
+            else:
+                raise ValueError("Input str is not a valid Propagator")
+        else:
+            raise TypeError("Operand should be str")
+
+    def setThirdBodyModel(self, other):
+        if isinstance(other, str):
+            if other in THIRDBODY_TYPES:
+                self.thirdbodyTYPE = other
+            else:
+                raise ValueError("Input str is not a valid ThirdBodyModel")
+        else:
+            raise TypeError("Operand should be str")
+
+    def setSRPModel(self, other):
+        if isinstance(other, str):
+            if other in SRP_TYPES:
+                self.srpTYPE = other
+            else:
+                raise ValueError("Input str is not a valid SRPModel")
+        else:
+            raise TypeError("Operand should be str")
+
+    def setShadowModel(self, other):
+        if isinstance(other, str):
+            if other in SHADOW_TYPES:
+                self.shadowTYPE = other
+            else:
+                raise ValueError("Input str is not a valid ShadowModel")
+        else:
+            raise TypeError("Operand should be str")
+
+    def setreflectivity(self, other):
+        if isinstance(other, (int, float)):
+            self.reflectivity = other
+        else:
+            raise TypeError("Operand should be int or float")
+
+    def setpressureCenter(self, other):
+        '''
+        Offset (m) of the centre of pressure from the centre of mass in the body frame, the arm of the SRP torque.
+        '''
+        if isinstance(other, Vector):
+            self.pressureCenter = other
+        else:
+            raise TypeError("Operand should be a Vector")
+
+    def setGeometryModel(self, other):
+        '''
+        "MEANAREA" -- drag and SRP on the mean surface area of the size box, independent of attitude
+        "PANELS"   -- drag, SRP and their torques summed over the faces of getfaces in the body frame
+        '''
+        if isinstance(other, str):
+            if other in GEOMETRY_TYPES:
+                self.geometryTYPE = other
+            else:
+                raise ValueError("Input str is not a valid GeometryModel")
+        else:
+            raise TypeError("Operand should be str")
+
+    def getfaces(self):
+        '''
+        Faces of the spacecraft, the FaceTable given with setfaces or else the six faces of the size box.
+        '''
+        if self.faces is None:
+            if self.faceTable is not None:
+                self.faces = self.faceTable
+            else:
+                self.faces = FaceTable.box(self.size)
+        return self.faces
+
+    def setfaces(self, other):
+        if isinstance(other, FaceTable) or other is None:
+            self.faceTable = other
+            self.faces     = None
+        else:
+            raise TypeError("Operand should be a FaceTable")
+
+    def panelKinetics(self, state: State, time):
+        '''
+        Drag and SRP force (inertial) and torque (body) of the faces, kept for the attitude derivative of the same stage.
+        '''
+        memo = self.panelMemo
+        if memo is not None and memo[0] == time and np.array_equal(memo[1], state.array):
+            return memo[2]
+        kinetics = systemPanels(self.system, state, self.getfaces(), self.atmosphereTYPE, self.srpTYPE, self.shadowTYPE, self.reflectivity)
+        self.panelMemo = (time, state.array.copy(), kinetics)
+        return kinetics
+
+    def getillumination(self):
+        # the memo checked against the state buffer, without a view of the position, as read once per record
+        memo, buffer, time = self.illuminationMemo, self.state.buffer, self.system.time
+        if memo is not None and memo[0] == time and memo[1] == buffer[1] and memo[2] == buffer[2] \
+                and memo[3] == buffer[3] and memo[4] == self.shadowTYPE:
+            return memo[5]
+        return self.illuminationAt(self.state.position, time)
+
+    def illuminationAt(self, position, time):
+        '''
+        Illumination fraction of shadowFunction at a stage position, kept for the SRP force, the SRP torque
+        and the sensors of the same stage.
+        '''
+        memo = self.illuminationMemo
+        if memo is not None and memo[0] == time and memo[1] == position.x and memo[2] == position.y \
+                and memo[3] == position.z and memo[4] == self.shadowTYPE:
+            return memo[5]
+        illumination = shadowFunction(self.system, position, self.system.sunVector, self.shadowTYPE)
+        self.illuminationMemo = (time, position.x, position.y, position.z, self.shadowTYPE, illumination)
+        return illumination
+
     def setAtmosphereModel(self, other):
         if isinstance(other, str):
-            if (other == "NONE" or other == "US76" or other == "CIRA12"):
+            if other == "NONE" or other in ATMOSPHERE_MODELS:
                 self.atmosphereTYPE = other
             else:
                 raise ValueError("Input str is not a valid AtmosphereModel")
@@ -681,6 +1160,7 @@ class Spacecraft():
     def setmass(self, other):
         if isinstance(other, (int, float)):
             self.state.mass = other
+            self.resetInertia()
         else:
             raise TypeError("Operand should be int or float")
 
@@ -690,9 +1170,62 @@ class Spacecraft():
     def setsize(self, other):
         if isinstance(other, Vector):
             self.size = other
+            self.faces = None
+            self.resetInertia()
         else:
             raise TypeError("Operand should be a Vector")
 
+    def getinertia(self):
+        '''
+        Inertia tensor (kg m^2) in the body frame, the one given with setinertia or else the one of a
+        uniform box of the spacecraft size and mass. It is built once and kept until setinertia is called or
+        the size or the mass change, so writing state.mass or the size components directly rebuilds it.
+        '''
+        key = (self.size.x, self.size.y, self.size.z, self.state.mass)
+        if key != self.inertiaKey:
+            if self.inertiaTensor is not None:
+                self.inertiaMatrix = self.inertiaTensor
+            else:
+                self.inertiaMatrix = rectbodyInertia(self.size, self.state.mass)
+            self.inertiaKey     = key
+            self.inverseInertia = None
+        return self.inertiaMatrix
+
+    def getinverseInertia(self):
+        inertia = self.getinertia()
+        if self.inverseInertia is None:
+            self.inverseInertia = inertia.inverse()
+        return self.inverseInertia
+
+    @property
+    def inertia(self):
+        return self.getinertia()
+
+    @inertia.setter
+    def inertia(self, other):
+        self.setinertia(other)
+
+    def setinertia(self, other):
+        '''
+        Sets a full 3x3 inertia tensor (kg m^2) in the body frame for spacecraft that are not uniform boxes,
+        setinertia(None) goes back to the box of the spacecraft size and mass.
+        The tensor is copied, changing the given Matrix afterwards leaves the spacecraft as it is.
+        '''
+        if isinstance(other, Matrix):
+            self.inertiaTensor = Matrix.fromcomponents(other.xx, other.xy, other.xz,
+                                                       other.yx, other.yy, other.yz,
+                                                       other.zx, other.zy, other.zz)
+            self.resetInertia()
+        elif other is None:
+            self.inertiaTensor = None
+            self.resetInertia()
+        else:
+            raise TypeError("Operand should be a Matrix")
+
+    def resetInertia(self):
+        self.inertiaKey     = None
+        self.inverseInertia = None
+
     def getposition(self):
         return self.state.position
     
@@ -740,32 +1273,88 @@ class Spacecraft():
 
         deltaState.mass = 0
 
+        self.orbitDerivative(state, time, deltaState)
+
+        if self.system.orbitPropOnly == False:
+            self.attitudeDerivative(state, time, deltaState)
+
+        return deltaState
+
+    def orbitDerivative(self, state: State, time, deltaState=None):
+        if deltaState is None:
+            self.netforce = Vector(0,0,0)
+            deltaState = State(quat=Quaternion(0,0,0,0))
+
         deltaState.position = state.velocity
 
+        if self.geometryTYPE == "PANELS":
+            surfaceForce, _ = self.panelKinetics(state, time)
+        else:
+            illumination = self.illuminationAt(state.position, time) if self.srpTYPE != "NONE" else None
+            surfaceForce = systemAtmosphere(self.system, state, self.size, self.atmosphereTYPE) \
+                         + systemSolarPressure(self.system, state, self.size, self.reflectivity, self.srpTYPE, self.shadowTYPE, illumination)
+
         self.netforce = self.netforce \
-                      + systemGravity(self.system, state.mass, state.position, self.gravityTYPE) \
-                      + systemAtmosphere(self.system, state, self.size, self.atmosphereTYPE)
+                      + systemGravity(self.system, state.mass, state.position, self.gravityTYPE, time) \
+                      + systemThirdBody(self.system, state.mass, state.position, time, self.thirdbodyTYPE) \
+                      + surfaceForce
         
         deltaState.velocity = self.netforce/state.mass
 
-        self.inertia = rectbodyInertia(self.size, state.mass)
-        if self.system.orbitPropOnly == False:
-            deltaState.quaternion = quaternionDerivative(state.bodyrate, state.quaternion)
+        return deltaState
+
+    def attitudeDerivative(self, state: State, time, deltaState=None, magneticField=None):
+        if deltaState is None:
+            self.nettorque   = Vector(0,0,0)
+            self.netmomentum = Vector(0,0,0)
+            deltaState = State()
+
+        deltaState.quaternion = quaternionDerivative(state.bodyrate, state.quaternion)
 
-            self.netmomentum = self.netmomentum + self.inertia*state.bodyrate
-            self.nettorque = self.nettorque \
-                           + self.calculateTorques() \
-                           + systemMagneticField(self.system, state, time, self.dipole, self.magnetfieldTYPE)
+        if magneticField is None and self.magnetfieldTYPE == "EARTH" \
+                and self.environment is not None and self.environment.matches(state.position, time):
+            magneticField = self.environment.magneticField
 
-            deltaState.bodyrate = self.inertia.inverse()*(self.nettorque-state.bodyrate.cross(self.netmomentum))
+        if self.geometryTYPE == "PANELS":
+            _, surfaceTorque = self.panelKinetics(state, time)
+        else:
+            illumination = self.illuminationAt(state.position, time) if self.srpTYPE != "NONE" else None
+            surfaceTorque = systemSolarPressureTorque(self.system, state, self.size, self.reflectivity, self.pressureCenter, self.srpTYPE, self.shadowTYPE, illumination)
+
+        self.netmomentum = self.netmomentum + self.getinertia()*state.bodyrate
+        self.nettorque = self.nettorque \
+                       + self.calculateTorques() \
+                       + systemMagneticField(self.system, state, time, self.dipole, self.magnetfieldTYPE, magneticField) \
+                       + surfaceTorque
+
+        deltaState.bodyrate = self.getinverseInertia()*(self.nettorque-state.bodyrate.cross(self.netmomentum))
 
         return deltaState
     
+    def fallbackKinetics(self, state: State, time):
+        '''
+        Force and torque terms that fleet mode does not batch, evaluated on one stage state.
+        Override to add custom per-spacecraft models to a fleet propagation.
+        '''
+        force  = Vector(0,0,0)
+        torque = self.calculateTorques()
+        return force, torque
+
+    def needsFallback(self):
+        return len(self.torques) > 0 \
+            or type(self).fallbackKinetics is not Spacecraft.fallbackKinetics
+
     def clearKinetics(self):
         self.netforce    = Vector(0,0,0)
         self.nettorque   = Vector(0,0,0)
         self.netmomentum = Vector(0,0,0)
 
+    def getKinetics(self):
+        return self.netforce, self.nettorque, self.netmomentum
+
+    def setKinetics(self, kinetics):
+        self.netforce, self.nettorque, self.netmomentum = kinetics
+
     def addSensor(self, other):
         if isinstance(other, Sensor):
             self.sensors[other.name] = other
@@ -821,36 +1410,44 @@ class Spacecraft():
     def getTorques(self):
         return self.torques
 
+    def recordSource(self, item):
+        '''
+        Where a recorder item is read from: an (object, attribute) pair or a method without arguments.
+        '''
+        if item == "State":
+            return (self, 'state')
+        elif item == "Netforce":
+            return (self, 'netforce')
+        elif item == "Nettorque":
+            return (self, 'nettorque')
+        elif item == "Netmoment":
+            return (self, 'netmomentum')
+        elif item == "Location":
+            return (self, 'location')
+        elif item == "Sunlocation":
+            return (self.system, 'sunLocation')
+        elif item == "Sunvector":
+            return (self.system, 'sunVector')
+        elif item == "Illumination":
+            return self.getillumination
+
+        elif item in self.sensors:
+            return (self.sensors[item], 'data')
+        elif item in self.controllers:
+            return (self.controllers[item], 'data')
+        elif item in self.actuators:
+            return (self.actuators[item], 'data')
+        elif item in self.torques:
+            return (self.torques[item], 'data')
+        else:
+            raise TypeError("Operand should be a recorder item")
+
     def __getitem__(self, item):
         if isinstance(item, str):
-            if item == "State": 
-                return self.state
-            elif item == "Netforce": 
-                return self.netforce
-            elif item == "Nettorque": 
-                return self.nettorque
-            elif item == "Netmoment": 
-                return self.netmomentum
-            elif item == "Location": 
-                return self.location
-            elif item == "Sunlocation":
-                return self.system.sunLocation
-            elif item == "Sunvector":
-                return self.system.sunVector
-
-            elif item in list(self.sensors.keys()):
-                return self.getSensors()[item].data
-            
-            elif item in list(self.controllers.keys()):
-                return self.getControllers()[item].data
-            
-            elif item in list(self.actuators.keys()):
-                return self.getActuators()[item].data
-            
-            elif item in list(self.torques.keys()):
-                return self.getTorques()[item].data
-            else:
-                raise TypeError("Operand should be a recorder item")
+            source = self.recordSource(item)
+            if callable(source):
+                return source()
+            return getattr(*source)
         else:
             raise TypeError("Operand should be a recorder item in str")
 
@@ -883,118 +1480,1612 @@ class Pass():
     def __repr__(self):
         return self.__str__()
 
-class Recorder():
-
-    def __init__(self, datetime: datetime.datetime,  spacecraft: Spacecraft, datalist: list):
-        self.attachedTo   = spacecraft
-        self.attachedWhen = datetime
-        self.dataDict = { "Datetime" : [] }
+class DatetimeSequence(collections.abc.Sequence):
+    '''
+    Datetimes of the recorded samples, built from the numeric sample times only when they are read.
+    '''
+    def __init__(self, recorder):
+        self.recorder = recorder
 
-        for item in datalist:
-            self.dataDict[item] = []
-    
-    def addItem(self, item):
-        self.dataDict[item.name] = []
+    def __len__(self):
+        return len(self.recorder.times)
 
-    def update(self, datetime: datetime.datetime):
-        Datetime = datetime
-        self.dataDict["Datetime"].append(Datetime)
+    def __getitem__(self, index):
+        datetime0 = self.recorder.attachedTo.system.datetime0
+        if isinstance(index, slice):
+            return [ datetime0 + datetime.timedelta(seconds=time) for time in self.recorder.times[index] ]
+        return datetime0 + datetime.timedelta(seconds=self.recorder.times[index])
 
-        for item in list(self.dataDict.keys())[1:]:
-            self.dataDict[item].append(self.attachedTo[item])
+    def __eq__(self, other):
+        if isinstance(other, collections.abc.Sequence):
+            return list(self) == list(other)
+        return NotImplemented
 
-    def __getitem__(self, item):
-        if isinstance(item, str) and item in self.dataDict.keys():
-            return self.dataDict[item]
+    def __repr__(self):
+        return repr(list(self))
+
+def recordKind(value):
+    '''
+    Type and number of float64 columns of a recorded value, (object, 0) for values kept as objects.
+    '''
+    if isinstance(value, State):
+        return State, STATE_SIZE
+    if isinstance(value, Quaternion):
+        return Quaternion, 4
+    if isinstance(value, Vector):
+        return Vector, 3
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+        return float, 1
+    return object, 0
+
+class CallSource():
+    '''
+    A method without arguments read as an attribute, value.
+    '''
+    def __init__(self, method):
+        self.method = method
+
+    @property
+    def value(self):
+        return self.method()
+
+class RecorderChannel():
+    '''
+    One recorder item: where its value is read from, resolved once, and its columns in the rows of the recorder.
+    '''
+    def __init__(self, name, kind=None, width=0, column=0):
+        self.name    = name
+        self.source  = None
+        self.kind    = kind
+        self.width   = width
+        self.column  = column
+        self.start   = 0
+        self.first   = 0
+        self.objects = None
+        self.latest  = None
+        self.segments = []
+
+    def value(self):
+        if callable(self.source):
+            return self.source()
+        return getattr(*self.source)
+
+    def writer(self):
+        '''
+        Function writing the value of the item into its columns of the row at flat[k], flat being the rows as a flat view.
+        A value no longer of the type of the item is not written, the function returns the channel instead.
+        '''
+        channel, first = self, self.column
+        if callable(self.source):
+            # a method is read through the value property of a CallSource
+            owner, attribute = CallSource(self.source), 'value'
         else:
-            raise TypeError("Operand should be recorder item")
+            owner, attribute = self.source
+
+        if self.kind is State:
+            def write(flat, k):
+                s = getattr(owner, attribute)
+                if not isinstance(s, State):
+                    return channel
+                flat[k+first:k+first+STATE_SIZE] = s.buffer
+        elif self.kind is Quaternion:
+            def write(flat, k):
+                q = getattr(owner, attribute)
+                if not isinstance(q, Quaternion):
+                    return channel
+                flat[k+first] = q.w; flat[k+first+1] = q.x; flat[k+first+2] = q.y; flat[k+first+3] = q.z
+        elif self.kind is Vector:
+            def write(flat, k):
+                v = getattr(owner, attribute)
+                if not isinstance(v, Vector):
+                    return channel
+                flat[k+first] = v.x; flat[k+first+1] = v.y; flat[k+first+2] = v.z
+        else:
+            def write(flat, k):
+                x = getattr(owner, attribute)
+                if x.__class__ is not float and recordKind(x)[0] is not float:
+                    return channel
+                flat[k+first] = x
+        return write
+
+    def wrap(self, values):
+        if self.kind is State:
+            return State.fromarray(np.array(values, dtype=float))
+        if self.kind is Quaternion:
+            return Quaternion(*values)
+        if self.kind is Vector:
+            return Vector(*values)
+        return values[0]
+
+class RecordedSequence(collections.abc.Sequence):
+    '''
+    Recorded values of one item, the State, Vector or number of a row built only when it is read.
+    array is the (N, width) block of float64 columns of the item, without copying while they are all in memory.
+    at, nearest, between and last find samples by time through the time index of the recorder.
+    '''
+    def __init__(self, recorder, channel: RecorderChannel):
+        self.recorder = recorder
+        self.channel  = channel
 
-class LEOSS():
+    def __len__(self):
+        if self.channel.objects is not None:
+            return len(self.channel.objects)
+        return self.recorder.count - self.channel.start
+
+    def __getitem__(self, index):
+        channel = self.channel
+        if channel.objects is not None:
+            return channel.objects[index]
+        if isinstance(index, slice):
+            return [ self[i] for i in range(*index.indices(len(self))) ]
+        size = len(self)
+        if index < 0:
+            index = index + size
+        if not 0 <= index < size:
+            raise IndexError("Recorder index out of range")
+        values = self.recorder.values(channel, channel.start + index)
+        return channel.wrap(values.tolist())
+
+    @property
+    def array(self):
+        channel = self.channel
+        if channel.objects is not None:
+            raise TypeError(f"Recorder item {channel.name} is not numeric")
+        return self.recorder.columns(channel)
+
+    def at(self, time):
+        '''
+        Columns of the item at time (s), a ValueError when there is no sample at time.
+        '''
+        return self.sample(self.recorder.at(time))
 
-    def __init__(self):
-        self.spacecraftObjects = []
-        self.recorderObjects = {}
+    def nearest(self, time):
+        '''
+        Columns of the item in the sample closest to time (s).
+        '''
+        return self.sample(max(self.recorder.nearest(time), self.channel.start))
 
-        self.time = 0.0
-        self.mu = 398600.4418e9
-        self.radi = 6378.137e3
+    def between(self, time0, time1):
+        '''
+        (N, width) columns of the item from time0 to time1 (s), both included.
+        '''
+        return self.rows(self.recorder.between(time0, time1))
 
-        self.epochDT(datetime.datetime.today())
-        self.sunVector, self.sunLocation = systemSun(self)
+    def last(self, k):
+        '''
+        (k, width) columns of the last k samples of the item.
+        '''
+        return self.rows(self.recorder.last(k))
 
-        self.orbitPropOnly = False
+    def sample(self, index):
+        channel = self.channel
+        if index < channel.start:
+            raise ValueError(f"Recorder item {channel.name} has no sample at this time")
+        if channel.objects is not None:
+            return channel.objects[index - channel.start]
+        return np.asarray(self.recorder.values(channel, index))
 
-    def epochDT(self, dt: datetime.datetime):
-            self.epoch(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, dt.microsecond)
+    def rows(self, indices: slice):
+        '''
+        Columns of the item in a slice of the samples, a view unless they span segments.
+        '''
+        channel = self.channel
+        begin, end = max(indices.start, channel.start), max(indices.stop, channel.start)
+        if channel.objects is not None:
+            return channel.objects[begin-channel.start:end-channel.start]
+        parts = []
+        for first, columns in self.recorder.blocks(channel):
+            if first < end and first + len(columns) > begin:
+                parts.append(columns[max(begin-first, 0):end-first])
+        if len(parts) == 0:
+            return np.empty((0, channel.width))
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
 
-    def epoch(self, year=0, month=0, day=0, hour=0, minute=0, second=0, microsecond=0):
-            
-            self.datetime0 = datetime.datetime(year, month, day, hour, minute, second, microsecond)
-            self.jdate0 = 367*year - int((7*(year + int((month+9)/12)))/4) + int(275*month/9) + day + 1721013.5
-            
-            hours  = hour + minute/60 + second/3600 + microsecond/3600000000
-            j2000  = 2451545
-            T0     = (self.jdate0 - j2000)/36525
-            
-            gmst0_ =  100.4606184 + 36000.77004*T0 + 0.000387933*(T0**2) - (2.583e-8)*(T0**3)
+    def __eq__(self, other):
+        if isinstance(other, collections.abc.Sequence):
+            return list(self) == list(other)
+        return NotImplemented
 
-            self.gmst0 = gmst0_%360
-            self.gmst  = self.gmst0 + 360.98564724*hours/24
+    def __repr__(self):
+        return repr(list(self))
+
+class RecordPolicy():
+    '''
+    When a recorder keeps a sample:
+    EVERY, every value-th update; CADENCE, the first update at or after every value seconds;
+    ONCHANGE, when a component moved by more than value (the deadband) since the last kept sample;
+    WINDOW, from value seconds before to post seconds after a trigger. A window is triggered by
+    the sked commands (trigger="SKED"), or at the updates where trigger(spacecraft) turns True.
+    '''
+    def __init__(self, policyTYPE: str, value=1, post=0.0, trigger="SKED"):
+        if not isinstance(policyTYPE, str):
+            raise TypeError("Operand should be str")
+        if policyTYPE not in RECORD_TYPES:
+            raise ValueError("Input str is not a valid RecordPolicy")
+        if not isinstance(value, (int, float)) or not isinstance(post, (int, float)):
+            raise TypeError("Operand should be int or float")
+        if policyTYPE == "EVERY" and (not isinstance(value, int) or value < 1):
+            raise ValueError("Every should be a positive int")
+        if policyTYPE == "CADENCE" and not value > 0:
+            raise ValueError("Cadence should be positive")
+        if value < 0 or post < 0:
+            raise ValueError("Deadband and windows should not be negative")
+        if trigger != "SKED" and not callable(trigger):
+            raise TypeError("Trigger should be \"SKED\" or a function of the spacecraft")
+
+        self.policyTYPE = policyTYPE
+        self.value      = value
+        self.post       = post
+        self.trigger    = trigger
+        self.reset()
 
-    def datenow(self):
-        return self.datetime0 + datetime.timedelta(seconds=self.time)
+    def __repr__(self):
+        return f'RecordPolicy({self.policyTYPE}, {self.value}, {self.post})'
 
-    def addSpacecraft(self, name, recordList: list = []):
-        
-        recordList = ['State','Location','Netforce','Nettorque','Netmoment','Sunlocation'] + recordList
-        spacecraft = Spacecraft(name)
-        spacecraft.system = self
-        self.spacecraftObjects.append(spacecraft)
-        recorder = Recorder(self.datenow(), spacecraft, recordList)
-        self.recorderObjects[name] = recorder
-        spacecraft.recorder = recorder
+    def reset(self):
+        self.updates   = 0
+        self.due       = None
+        self.reference = None
+        self.until     = -math.inf
+        self.active    = False
 
-    def listSpacecraft(self):
-        names = []
-        for spacecraft in self.spacecraftObjects:
-            names.append(spacecraft.name)
-        return names
-    
-    def getSpacecrafts(self):
-        spacecraftDict = {}
-        for spacecraft in self.spacecraftObjects:
-            spacecraftDict[spacecraft.name] = spacecraft
-        return spacecraftDict
-    
-    def getRecorders(self):
-        return self.recorderObjects
-    
-    def numSpacecraft(self):
-        return len(self.spacecraftObjects)
+    def admit(self, time, row):
+        '''
+        Whether the update at time with the float64 row (time first) is kept.
+        '''
+        self.updates = self.updates + 1
+        if self.policyTYPE == "EVERY":
+            return (self.updates - 1) % self.value == 0
+        if self.policyTYPE == "CADENCE":
+            if self.due is not None and time < self.due - 1e-9*max(1.0, abs(time)):
+                return False
+            if self.due is None:
+                self.due = time
+            while self.due <= time + 1e-9*max(1.0, abs(time)):
+                self.due = self.due + self.value
+            return True
+        if self.policyTYPE == "ONCHANGE":
+            values = row[1:]
+            if self.reference is not None and len(self.reference) == len(values) and not np.abs(values - self.reference).max(initial=0.0) > self.value:
+                return False
+            self.reference = values.copy()
+            return True
+        return time <= self.until
+
+    def triggered(self, spacecraft):
+        '''
+        Whether the trigger function of the window turned True since the last update.
+        '''
+        if not callable(self.trigger):
+            return False
+        active = bool(self.trigger(spacecraft))
+        rising = active and not self.active
+        self.active = active
+        return rising
+
+    def open(self, time):
+        '''
+        Opens the window of a trigger at time, returns the earliest time kept before it.
+        '''
+        self.until = max(self.until, time + self.post)
+        return time - self.value
+
+    def expected(self, rows, time0, time1):
+        '''
+        Number of samples kept out of rows updates from time0 to time1, none when unknown beforehand.
+        '''
+        if self.policyTYPE == "EVERY":
+            return math.ceil(rows/self.value)
+        if self.policyTYPE == "CADENCE":
+            return min(rows, math.ceil((time1 - time0)/self.value) + 1)
+        return 0
+
+def passTrigger(station: GroundStation):
+    '''
+    Window trigger at the acquisition of signal of a pass over the ground station.
+    '''
+    return lambda spacecraft: elevationsensor_function(spacecraft, [station]).x > station.min_elevation
+
+class RecorderSink():
+    '''
+    Writes the recorded columns to disk, so that long runs do not keep them in memory.
+    A recorder with a sink moves its rows out every chunkRows samples: the columns of each item
+    are saved as one .npy segment, directory/<recorder>/<item>/<first sample>.npy, by a writer thread.
+    The segments are read back as memory-mapped arrays, the last maxOpen of them kept open.
+    '''
+    def __init__(self, directory: str, chunkRows=65536, maxOpen=64):
+        if not isinstance(directory, str):
+            raise TypeError("Operand should be str")
+        if not isinstance(chunkRows, int) or chunkRows < 1:
+            raise ValueError("Chunk rows should be a positive int")
+
+        self.directory = directory
+        self.chunkRows = chunkRows
+        self.pending   = queue.Queue()
+        self.error     = None
+        self.maxOpen   = maxOpen
+        self.memmaps   = collections.OrderedDict()
+        self.writer    = threading.Thread(target=self.work, daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def work(self):
+        while True:
+            task = self.pending.get()
+            try:
+                if task is None:
+                    return
+                path, block = task
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                np.save(path, block)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.pending.task_done()
+
+    def path(self, label, name, first):
+        return os.path.join(self.directory, label, name, f'{first:012d}.npy')
+
+    def write(self, path, block):
+        if self.error is not None:
+            raise self.error
+        if not self.writer.is_alive():
+            raise ValueError("Recorder sink is closed")
+        self.pending.put((path, block))
+
+    def sync(self):
+        '''
+        Waits until the segments handed to the writer are on disk.
+        '''
+        self.pending.join()
+        if self.error is not None:
+            raise self.error
+
+    def load(self, path):
+        memmap = self.memmaps.get(path)
+        if memmap is not None:
+            self.memmaps.move_to_end(path)
+            return memmap
+        self.sync()
+        memmap = np.load(path, mmap_mode='r')
+        self.memmaps[path] = memmap
+        if len(self.memmaps) > self.maxOpen:
+            # the file closes once the arrays given out of it are released
+            self.memmaps.popitem(last=False)
+        return memmap
+
+    def close(self):
+        if self.writer.is_alive():
+            self.pending.put(None)
+            self.writer.join()
+        atexit.unregister(self.close)
+        if self.error is not None:
+            raise self.error
+
+def readOnly(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+class Recorder():
+    '''
+    Records the items of a spacecraft as rows of float64 values, one column per component: the time,
+    then the columns of each State (14), Quaternion (4), Vector (3) or number (1) item.
+    Where each item is read from is resolved once, on the first record after it is added, into a writer of the
+    item that puts its components straight into the next row of a preallocated array, which grows when full.
+    Items of other types are kept as lists of objects.
+    recorder[item] is a RecordedSequence view of the rows of the item.
+    With a RecordPolicy only some of the updates are kept; items given their own policy are
+    recorded apart, with their own times. latest(item) is the value of the item at the last update.
+    With a RecorderSink the rows are moved to disk in chunks and only the last chunk stays in memory.
+    An update costs about a third of what appending the objects did, and a sample about a fifth of
+    the memory (benchmarks/bench_recorder.py).
+    '''
+    blockRows = 1024
+
+    def __init__(self, datetime: datetime.datetime,  spacecraft: Spacecraft, datalist: list):
+        self.attachedTo   = spacecraft
+        self.attachedWhen = datetime
+
+        self.timeChannel = RecorderChannel("Time", float, 1, 0)
+        self.channels = {}
+        self.writers  = []
+        self.objectChannels = []
+        self.pending  = False
+
+        self.width  = 1
+        self.setRows(np.empty((0, 1)))
+        self.stored = 0
+        self.count  = 0
+
+        self.sink    = None
+        self.label   = spacecraft.name
+        self.spilled = 0
+
+        self.version = 0
+        self.exports = {}
+        self.frames  = {}
+        self.exportKey = None
+
+        self.indexed  = 0
+        self.uniform  = True
+        self.time0    = None
+        self.timeStep = None
+        self.segmentEnds = []
+
+        self.policy  = None
+        self.history = collections.deque()
+        self.groups  = []
+        self.grouped = {}
+        self.updates = 0
+        self.latestIndex = None
+        self.latestTime  = None
+
+        for item in datalist:
+            self.addChannel(item)
+        self.layout()
+
+        self.outputStep  = None
+        self.outputTimes = None
+        self.outputTime0 = 0.0
+        self.outputIndex = 0
+    
+    def addItem(self, item):
+        self.addChannel(item.name)
+
+    def addChannel(self, name):
+        '''
+        Records the item from the next sample on, an item added again starts over.
+        '''
+        if name in self.grouped:
+            self.grouped[name].addChannel(name)
+            return
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = RecorderChannel(name)
+            self.channels[name] = channel
+        channel.source = None
+        channel.start  = self.count
+        channel.first  = self.updates
+        channel.segments = []
+        if channel.objects is not None:
+            channel.objects = []
+        self.pending = True
+
+    @property
+    def times(self):
+        return RecordedSequence(self, self.timeChannel)
+
+    @property
+    def dataDict(self):
+        data = { "Datetime" : DatetimeSequence(self) }
+        for name, channel in self.channels.items():
+            data[name] = RecordedSequence(self, channel)
+        return data
+
+    def resolve(self):
+        '''
+        Finds where the new items are read from and lays out their columns.
+        '''
+        for channel in self.channels.values():
+            if channel.source is not None:
+                continue
+            channel.source = self.attachedTo.recordSource(channel.name)
+            kind, width = recordKind(channel.value())
+            if channel.kind is not None and channel.kind is not kind:
+                self.demote(channel)
+            if channel.kind is None:
+                channel.kind, channel.width, channel.column = kind, width, self.width
+                if width > 0:
+                    self.setRows(np.hstack((self.rows, np.full((len(self.rows), width), np.nan))))
+                    self.width = self.width + width
+                else:
+                    channel.objects = []
+        self.pending = False
+        self.layout()
+
+    def removeChannel(self, name):
+        '''
+        Stops recording the item and drops its samples.
+        '''
+        channel = self.channels.pop(name)
+        if channel.objects is None and channel.width > 0:
+            self.dropColumns(channel)
+        self.layout()
+
+    def dropColumns(self, channel: RecorderChannel):
+        first, last = channel.column, channel.column + channel.width
+        self.setRows(np.delete(self.rows, np.s_[first:last], axis=1))
+        self.width = self.width - channel.width
+        for other in self.channels.values():
+            if other.objects is None and other.column > first:
+                other.column = other.column - channel.width
+
+    def layout(self):
+        '''
+        Lays out the writers of the rows: one per numeric item, writing it into its columns of a row straight
+        from where it was resolved to. Items not resolved yet get theirs on the next update.
+        '''
+        self.writers = [ channel.writer() for channel in self.channels.values()
+                         if channel.objects is None and channel.source is not None and channel.width > 0 ]
+        self.objectChannels = [ channel for channel in self.channels.values() if channel.objects is not None ]
+        # the rows waiting for a trigger no longer match the columns
+        self.history.clear()
+        self.version = self.version + 1
+
+    def setRows(self, rows):
+        '''
+        Replaces the row array, and the flat float64 view of it the writers write into.
+        '''
+        self.rows = rows
+        self.flat = memoryview(rows.reshape(-1))
+
+    def demote(self, channel: RecorderChannel):
+        '''
+        Keeps an item whose value is no longer of its recorded type as a list of objects.
+        '''
+        objects = [ channel.wrap(values) for values in self.columns(channel).tolist() ]
+        channel.segments = []
+        self.dropColumns(channel)
+        channel.kind, channel.width, channel.column, channel.objects = object, 0, 0, objects
+        self.layout()
+
+    def spill(self):
+        '''
+        Hands the rows in memory to the sink, one segment per item, and empties the rows.
+        '''
+        n, first = self.stored, self.spilled
+        for channel in [self.timeChannel] + list(self.channels.values()):
+            if channel.objects is not None or channel.width == 0:
+                continue
+            begin = max(channel.start - first, 0)
+            if begin >= n:
+                continue
+            path = self.sink.path(self.label, channel.name, first + begin)
+            self.sink.write(path, np.array(self.rows[begin:n, channel.column:channel.column+channel.width]))
+            channel.segments.append((first + begin, n - begin, path, self.sink))
+        self.spilled = first + n
+        self.stored  = 0
+        # a new buffer, the views given out of the old one keep their values;
+        # the last row stays in front for latest() until the next update
+        rows = np.empty_like(self.rows)
+        rows[0] = self.rows[n-1]
+        self.setRows(rows)
+        if self.latestIndex is not None:
+            self.latestIndex = 0
+
+    def setSink(self, sink):
+        '''
+        Moves the recorded rows to disk through the RecorderSink from now on, None keeps them in memory.
+        '''
+        if sink is not None and not isinstance(sink, RecorderSink):
+            raise TypeError("Operand should be RecorderSink")
+        if self.sink is not None and self.stored > 0:
+            self.spill()
+        self.sink = sink
+        for group in self.groups:
+            group.setSink(sink)
+
+    def allocate(self, rows):
+        if rows > len(self.rows):
+            size = max(rows, 2*len(self.rows), self.blockRows)
+            if self.sink is not None:
+                # the rows never hold more than two chunks before they are moved out
+                size = max(rows, min(size, 2*self.sink.chunkRows))
+            grown = np.empty((size, self.width))
+            # with the row of the last update, when it was not kept
+            kept = min(self.stored + 1, len(self.rows))
+            grown[:kept] = self.rows[:kept]
+            self.setRows(grown)
+
+    def reserve(self, time0, time1, step):
+        '''
+        Preallocates the rows of a run from time0 to time1 recorded every step seconds (or on the recorder's schedule).
+        '''
+        if self.outputTimes is not None:
+            rows = len(self.outputTimes) - self.outputIndex
+        else:
+            rows = math.ceil((time1 - time0)/(self.outputStep if self.outputStep is not None else step)) + 1
+        for group in self.groups:
+            group.allocate(group.count - group.spilled + group.chunk(group.policy.expected(rows, time0, time1)))
+        if self.policy is not None:
+            rows = self.policy.expected(rows, time0, time1)
+        self.allocate(self.count - self.spilled + self.chunk(rows))
+
+    def chunk(self, rows):
+        '''
+        Rows to keep in memory out of rows samples to come.
+        '''
+        rows = max(rows, 0)
+        if self.sink is not None:
+            return min(rows, self.sink.chunkRows)
+        return rows
+
+    def values(self, channel: RecorderChannel, index):
+        '''
+        Float values of the item in the sample index: from a segment on disk or the rows.
+        '''
+        if index < self.spilled:
+            first, n, path, sink = channel.segments[bisect.bisect_right(channel.segments, (index, math.inf)) - 1]
+            return sink.load(path)[index - first]
+        index = index - self.spilled
+        return self.rows[index, channel.column:channel.column+channel.width]
+
+    def blocks(self, channel: RecorderChannel):
+        '''
+        Yields the index of the first sample and the columns of the item for each segment on disk, then for the rows in memory.
+        '''
+        for first, n, path, sink in channel.segments:
+            yield first, sink.load(path)
+        begin = max(channel.start - self.spilled, 0)
+        yield self.spilled + begin, self.rows[begin:self.stored, channel.column:channel.column+channel.width]
+
+    def columns(self, channel: RecorderChannel):
+        '''
+        Columns of the item for all its samples, a view of the rows unless part of them are on disk.
+        '''
+        blocks = [ columns for first, columns in self.blocks(channel) ]
+        if len(blocks) == 1:
+            return blocks[0]
+        return np.concatenate(blocks)
+
+    def to_arrays(self, items=None):
+        '''
+        Float columns of the recorded samples by name, built once and cached until new samples arrive:
+        t (s), the State as mass, x, y, z, xdot, ydot, zdot, q0, q1, q2, q3, p, q, r, the geodetic
+        lat, lon (deg) and alt (km), and the other items as "<item>.x", "<item>.w" or "<item>".
+        Columns in memory are read-only views of the rows, items added later are padded with NaN in front.
+        items selects the items ("Geodetic" for lat, lon and alt), by default all the numeric ones.
+        Items with their own policy are exported on their own times, apart from the other items.
+        '''
+        if items is not None:
+            owner = self.exportOwner(items)
+            if owner is not self:
+                return owner.to_arrays(items)
+        if self.exportKey != (self.count, self.version):
+            self.exports, self.frames = {}, {}
+            self.exportKey = (self.count, self.version)
+        if items is None:
+            items = [ name for name, channel in self.channels.items() if channel.objects is None and channel.width > 0 ]
+            if "State" in items or "Location" in items:
+                items.append("Geodetic")
+
+        arrays = dict(self.exported("Time"))
+        for item in items:
+            arrays.update(self.exported(item))
+        return arrays
+
+    def to_frame(self, items=None):
+        '''
+        DataFrame of the columns of to_arrays, built once and cached until new samples arrive.
+        '''
+        if items is not None:
+            owner = self.exportOwner(items)
+            if owner is not self:
+                return owner.to_frame(items)
+        arrays = self.to_arrays(items)
+        key = None if items is None else tuple(items)
+        if key not in self.frames:
+            self.frames[key] = pd.DataFrame(arrays)
+        return self.frames[key]
+
+    def exportOwner(self, items):
+        '''
+        Recorder whose samples the items are exported on, this one or the one of the items given their own
+        policy; items on different samples are rejected with their policies.
+        '''
+        owners = {}
+        for item in items:
+            if item == "Geodetic" and "State" not in self.channels and "Location" not in self.channels:
+                item = "Location" if "Location" in self.grouped else "State"
+            owner = self.grouped.get(item, self)
+            owners[id(owner)] = owner
+        if len(owners) > 1:
+            policies = ", ".join(f"{item} on {self.grouped[item].policy}" for item in items if item in self.grouped)
+            raise TypeError(f"Recorder items are sampled apart ({policies}), export them separately")
+        return next(iter(owners.values()), self)
+
+    def exported(self, item):
+        columns = self.exports.get(item)
+        if columns is None:
+            columns = self.export(item)
+            self.exports[item] = columns
+        return columns
+
+    def export(self, item):
+        '''
+        Named read-only float columns of one item over all the samples, its own samples when it has its own policy.
+        '''
+        if item in self.grouped:
+            return self.grouped[item].export(item)
+        if item == "Time":
+            return { 't' : readOnly(self.columns(self.timeChannel)[:,0]) }
+        if item == "Geodetic":
+            location = self.channels.get("Location")
+            if location is not None and location.objects is None and location.start == 0:
+                columns = self.columns(location)
+            else:
+                if "State" not in self.channels:
+                    raise TypeError("Operand should be recorder item")
+                system = self.attachedTo.system
+                columns = np.concatenate([ geodeticArray(system, states[:,1:4], times) for times, states in self.chunks("State") ])
+            return { 'lat' : readOnly(columns[:,0]), 'lon' : readOnly(columns[:,1]), 'alt' : readOnly(columns[:,2]) }
+
+        channel = self.channels.get(item)
+        if channel is None:
+            raise TypeError("Operand should be recorder item")
+        if channel.objects is not None:
+            raise TypeError(f"Recorder item {item} is not numeric")
+        columns = self.columns(channel)
+        if channel.start > 0:
+            columns = np.concatenate((np.full((channel.start, channel.width), np.nan), columns))
+        if channel.kind is State:
+            names = STATE_COLUMNS
+        elif channel.kind is Quaternion:
+            names = [ item + '.w', item + '.x', item + '.y', item + '.z' ]
+        elif channel.kind is Vector:
+            names = [ item + '.x', item + '.y', item + '.z' ]
+        else:
+            names = [ item ]
+        return { name : readOnly(columns[:,k]) for k, name in enumerate(names) }
+
+    def between(self, time0, time1):
+        '''
+        Slice of the samples from time0 to time1 (s), both included.
+        '''
+        return slice(self.locate(time0), self.locate(time1, True))
+
+    def at(self, time):
+        '''
+        Index of the sample at time (s), a ValueError when there is none.
+        '''
+        index = self.locate(time)
+        if index < self.count and abs(self.values(self.timeChannel, index)[0] - time) <= 1e-9*max(1.0, abs(time)):
+            return index
+        raise ValueError(f"No recorded sample at time {time}")
+
+    def nearest(self, time):
+        '''
+        Index of the sample closest to time (s), the earlier one of a tie.
+        '''
+        if self.count == 0:
+            raise ValueError("No recorded samples")
+        index = self.locate(time)
+        if index == self.count or (index > 0 and time - self.values(self.timeChannel, index-1)[0] <= self.values(self.timeChannel, index)[0] - time):
+            index = index - 1
+        return index
+
+    def last(self, k):
+        '''
+        Slice of the last k samples.
+        '''
+        return slice(max(self.count - k, 0), self.count)
+
+    def locate(self, time, right=False):
+        '''
+        Number of samples before time (s), or up to time included when right, by arithmetic
+        while the samples are uniform in time and by bisection otherwise.
+        '''
+        self.timeIndex()
+        tolerance = 1e-9*max(1.0, abs(time))
+        if self.uniform and self.timeStep is not None:
+            position = (time - self.time0)/self.timeStep
+            if right:
+                index = math.floor(position + tolerance/self.timeStep) + 1
+            else:
+                index = math.ceil(position - tolerance/self.timeStep)
+            return min(max(index, 0), self.count)
+
+        key  = time + tolerance if right else time - tolerance
+        side = 'right' if right else 'left'
+        segments = self.timeChannel.segments
+        # the first segment ending after the key, then the rows in memory
+        k = bisect.bisect_right(self.segmentEnds, key) if right else bisect.bisect_left(self.segmentEnds, key)
+        if k < len(segments):
+            first, n, path, sink = segments[k]
+            return first + int(np.searchsorted(sink.load(path)[:,0], key, side))
+        return self.spilled + int(np.searchsorted(self.rows[:self.stored,0], key, side))
+
+    def timeIndex(self):
+        '''
+        Brings the time index up to the last sample: the end times of the segments on disk and whether
+        all the samples are uniform in time, t0 + i*step, checked for the new samples at once.
+        '''
+        segments = self.timeChannel.segments
+        while len(self.segmentEnds) < len(segments):
+            first, n, path, sink = segments[len(self.segmentEnds)]
+            self.segmentEnds.append(float(sink.load(path)[-1,0]))
+        if self.indexed == self.count or self.count < 2:
+            return
+        if self.timeStep is None:
+            self.time0    = float(self.values(self.timeChannel, 0)[0])
+            self.timeStep = float(self.values(self.timeChannel, 1)[0]) - self.time0
+            self.uniform  = self.timeStep > 0
+        for first, times in self.blocks(self.timeChannel):
+            if not self.uniform:
+                break
+            if first + len(times) <= self.indexed:
+                continue
+            begin = max(self.indexed, first)
+            expected = self.time0 + np.arange(begin, first + len(times))*self.timeStep
+            if np.any(np.abs(times[begin-first:,0] - expected) > 1e-9*np.maximum(1.0, np.abs(expected))):
+                self.uniform = False
+        self.indexed = self.count
+
+    def chunks(self, item):
+        '''
+        Yields the times and the columns of the item chunk by chunk, memory-mapped from the segments on disk
+        and then from the rows in memory, to go through recordings larger than memory. to_arrays and the
+        plots of leoss.visual hold all the samples they use.
+        '''
+        recorder = self.recorderOf(item)
+        channel  = recorder.channels[item]
+        if channel.objects is not None:
+            raise TypeError(f"Recorder item {channel.name} is not numeric")
+        timeSegments = recorder.timeChannel.segments
+        for first, n, path, sink in channel.segments:
+            timeFirst, timeN, timePath, timeSink = timeSegments[bisect.bisect_right(timeSegments, (first, math.inf)) - 1]
+            times = timeSink.load(timePath)[first - timeFirst:first - timeFirst + n, 0]
+            yield times, sink.load(path)
+        begin = max(channel.start - recorder.spilled, 0)
+        if begin < recorder.stored:
+            yield recorder.rows[begin:recorder.stored, 0], recorder.rows[begin:recorder.stored, channel.column:channel.column+channel.width]
+
+    def setOutput(self, step=None, times=None):
+        '''
+        Samples the recorder on its own schedule instead of at every integrator step:
+        every step seconds from now, or at the listed times (seconds of simulation time).
+        The samples are taken from the continuous interpolant of the integrator step.
+        setOutput() without arguments goes back to recording every step.
+        '''
+        if step is not None and times is not None:
+            raise ValueError("Give either an output step or a list of output times")
+        if step is not None and not step > 0:
+            raise ValueError("Output step should be positive")
+
+        self.outputStep  = step
+        self.outputTimes = sorted(times) if times is not None else None
+        self.outputTime0 = self.attachedTo.system.time if self.attachedTo.system is not None else 0.0
+        self.outputIndex = 0
+
+    def scheduled(self):
+        return self.outputStep is not None or self.outputTimes is not None
+
+    def dueTimes(self, time0, time1):
+        '''
+        Returns the scheduled output times in [time0, time1) and moves past them.
+        '''
+        tolerance = 1e-9*max(1.0, abs(time1))
+        times = []
+        while True:
+            if self.outputStep is not None:
+                time = self.outputTime0 + self.outputIndex*self.outputStep
+            elif self.outputTimes is not None and self.outputIndex < len(self.outputTimes):
+                time = self.outputTimes[self.outputIndex]
+            else:
+                break
+            if time >= time1 - tolerance:
+                break
+            if time >= time0 - tolerance:
+                times.append(time)
+            self.outputIndex = self.outputIndex + 1
+        return times
+
+    def update(self, time):
+        '''
+        Records the attached spacecraft, time in seconds since the epoch (or a datetime).
+        The values are written into the row after the kept samples, which the policy keeps or not.
+        '''
+        if time.__class__ is not float and isinstance(time, datetime.datetime):
+            time = (time - self.attachedTo.system.datetime0).total_seconds()
+        if self.pending:
+            self.resolve()
+
+        policy = self.policy
+        if policy is not None and policy.policyTYPE == "WINDOW" and policy.triggered(self.attachedTo):
+            self.open(time)
+
+        index = self.stored
+        if index == len(self.rows):
+            self.allocate(index + 1)
+        self.write(index, time)
+
+        if self.objectChannels:
+            for channel in self.objectChannels:
+                channel.latest = channel.value()
+        self.latestIndex, self.latestTime = index, time
+        self.updates = self.updates + 1
+
+        if policy is None and not self.objectChannels and self.sink is None:
+            # the row is kept where it was written
+            self.stored = index + 1
+            self.count  = self.count + 1
+        else:
+            self.keep(index, time)
+
+        if self.groups:
+            for group in self.groups:
+                group.update(time)
+
+    def write(self, index, time):
+        '''
+        Writes the time and the numeric items into the row index. Items whose value changed type are kept as
+        objects from now on and the row is written again with the columns left.
+        '''
+        while True:
+            flat, k = self.flat, index*self.width
+            flat[k] = time
+            changed = [ write(flat, k) for write in self.writers ]
+            if not any(changed):
+                return
+            for channel in changed:
+                if channel is not None:
+                    self.demote(channel)
+
+    def keep(self, index, time):
+        '''
+        Keeps the row index, written at time after the kept samples, as the next sample or not as the policy says.
+        '''
+        policy = self.policy
+        if policy is None or policy.admit(time, self.rows[index]):
+            self.commit()
+        elif policy.policyTYPE == "WINDOW" and policy.value > 0:
+            # kept aside in case a trigger comes within the pre window
+            self.history.append((time, self.rows[index].copy(), [ channel.latest for channel in self.objectChannels ]))
+            while self.history[0][0] < time - policy.value:
+                self.history.popleft()
+
+    def updateBlock(self, times, values):
+        '''
+        Records the attached spacecraft at each of times (s) at once, the items in values (by name, (N, width) float
+        columns) taken from there and the other items as they are now. The rows are written in bulk, or one by one
+        through the policy.
+        '''
+        times = np.asarray(times, dtype=float).reshape(-1)
+        if len(times) == 0:
+            return
+        if self.pending:
+            self.resolve()
+
+        index = self.stored
+        if index == len(self.rows):
+            self.allocate(index + 1)
+        self.write(index, float(times[0]))
+        block = np.repeat(self.rows[index:index+1], len(times), axis=0)
+        block[:,0] = times
+        for name, columns in values.items():
+            channel = self.channels.get(name)
+            if channel is not None and channel.objects is None and channel.width > 0:
+                block[:,channel.column:channel.column+channel.width] = columns
+
+        if self.objectChannels:
+            for channel in self.objectChannels:
+                channel.latest = channel.value()
+        self.updates = self.updates + len(block)
+
+        policy = self.policy
+        if policy is None and not self.objectChannels:
+            start = 0
+            while start < len(block):
+                n = len(block) - start
+                if self.sink is not None:
+                    n = min(n, self.sink.chunkRows - self.stored)
+                self.allocate(self.stored + n)
+                self.rows[self.stored:self.stored+n] = block[start:start+n]
+                self.stored, self.count, start = self.stored + n, self.count + n, start + n
+                self.latestIndex, self.latestTime = self.stored - 1, float(times[start-1])
+                if self.sink is not None and self.stored >= self.sink.chunkRows:
+                    self.spill()
+        else:
+            for row in block:
+                time = float(row[0])
+                if policy is not None and policy.policyTYPE == "WINDOW" and policy.triggered(self.attachedTo):
+                    self.open(time)
+                index = self.stored
+                if index == len(self.rows):
+                    self.allocate(index + 1)
+                self.rows[index] = row
+                self.latestIndex, self.latestTime = index, time
+                self.keep(index, time)
+
+        for group in self.groups:
+            group.updateBlock(times, values)
+
+    def commit(self, row=None, objects=None):
+        '''
+        Keeps the row after the kept samples, or the given row written there, (and the values of the object items) as the next sample.
+        '''
+        index = self.stored
+        if row is not None:
+            if index == len(self.rows):
+                self.allocate(index + 1)
+            self.rows[index] = row
+        if self.objectChannels:
+            for i, channel in enumerate(self.objectChannels):
+                channel.objects.append(channel.latest if objects is None else objects[i])
+        self.stored = index + 1
+        self.count  = self.count + 1
+        if self.sink is not None and self.stored >= self.sink.chunkRows:
+            self.spill()
+
+    def open(self, time):
+        '''
+        Opens the window of the recorder policy at time, keeping the updates of its pre window.
+        '''
+        start = self.policy.open(time)
+        replayed = False
+        for sampleTime, row, objects in self.history:
+            if sampleTime >= start:
+                self.commit(row, objects)
+                replayed = True
+        self.history.clear()
+        # the last update kept aside is the last one kept now
+        if replayed and self.stored > 0:
+            self.latestIndex = self.stored - 1
+
+    def trigger(self, time=None, source=None):
+        '''
+        Triggers the WINDOW policies of the recorder and of its items, all of them or those triggered by source ("SKED").
+        '''
+        if time is None:
+            time = self.attachedTo.system.time
+        for recorder in [self] + self.groups:
+            policy = recorder.policy
+            if policy is not None and policy.policyTYPE == "WINDOW" and (source is None or policy.trigger == source):
+                recorder.open(time)
+
+    def setPolicy(self, policy, items=None):
+        '''
+        Samples the recorder, or only the listed items, with the RecordPolicy; None keeps every update.
+        Items moved to or from their own policy start over.
+        '''
+        if policy is not None and not isinstance(policy, RecordPolicy):
+            raise TypeError("Operand should be RecordPolicy")
+        if policy is not None:
+            policy = copy.copy(policy)
+            policy.reset()
+
+        if items is None:
+            self.policy = policy
+            self.history.clear()
+            return
+
+        names = [ item.name if hasattr(item, 'name') else item for item in items ]
+        for name in names:
+            if name in self.grouped:
+                group = self.grouped.pop(name)
+                group.removeChannel(name)
+                if len(group.channels) == 0:
+                    self.groups.remove(group)
+            elif name in self.channels:
+                self.removeChannel(name)
+        if policy is None:
+            for name in names:
+                self.addChannel(name)
+            return
+
+        group = Recorder(self.attachedWhen, self.attachedTo, names)
+        group.policy = policy
+        group.label  = f'{self.label}.{names[0]}'
+        group.setSink(self.sink)
+        self.groups.append(group)
+        for name in names:
+            self.grouped[name] = group
+
+    def recorderOf(self, item):
+        if item in self.grouped:
+            return self.grouped[item]
+        if item in self.channels:
+            return self
+        raise TypeError("Operand should be recorder item")
+
+    def timesOf(self, item):
+        '''
+        Times of the samples of the item, the recorder times unless it has its own policy.
+        '''
+        return self.recorderOf(item).times
+
+    def latest(self, item):
+        '''
+        Value of the item at the last update, kept as a sample or not.
+        '''
+        recorder = self.recorderOf(item)
+        channel  = recorder.channels[item]
+        if channel.objects is not None:
+            return channel.latest
+        if recorder.latestIndex is None or channel.kind is None:
+            return None
+        values = recorder.rows[recorder.latestIndex, channel.column:channel.column+channel.width]
+        return channel.wrap(values.tolist())
+
+    def seen(self, item):
+        '''
+        Number of updates since the item was added, kept as samples or not.
+        '''
+        recorder = self.recorderOf(item)
+        return recorder.updates - recorder.channels[item].first
+
+    def updateAt(self, time, state):
+        '''
+        Records the attached spacecraft as if it were in the given (interpolated) state at time.
+        The State, Location, Netforce, Nettorque, Netmoment, Sunvector, Sunlocation and Illumination
+        items are evaluated at the sample, the sensor, controller and actuator items keep the values of the
+        step the sample falls in. The spacecraft and the system are left as they were.
+        '''
+        spacecraft = self.attachedTo
+        system = spacecraft.system
+        current, location, kinetics = spacecraft.state, spacecraft.location, spacecraft.getKinetics()
+        sun = system.sunVector, system.sunLocation
+
+        try:
+            spacecraft.state = state
+            spacecraft.location = system.locate(spacecraft, time)
+            system.sunVector, system.sunLocation = systemSun(system, time)
+            spacecraft.derivative(state, time)
+            self.update(time)
+        finally:
+            spacecraft.state, spacecraft.location = current, location
+            spacecraft.setKinetics(kinetics)
+            system.sunVector, system.sunLocation = sun
+
+    def __getitem__(self, item):
+        if item == "Datetime":
+            return DatetimeSequence(self)
+        if isinstance(item, str) and item in self.channels:
+            return RecordedSequence(self, self.channels[item])
+        if isinstance(item, str) and item in self.grouped:
+            return self.grouped[item][item]
+        else:
+            raise TypeError("Operand should be recorder item")
+
+class Clock():
+    '''
+    Simulation time scale. The elapsed time since the epoch is kept as integer ticks (nanoseconds) so that
+    long runs do not accumulate float error, the Unix time and the year follow it incrementally and
+    datetimes are only built on request.
+    '''
+    def __init__(self):
+        self.ticks = 0
+        self.residual = 0.0
+        self.time  = 0.0
+        self.setEpoch(datetime.datetime(2000, 1, 1))
+
+    def setEpoch(self, datetime0: datetime.datetime):
+        self.datetime0 = datetime0
+        self.unixTicks0 = int(datetime0.replace(microsecond=0).timestamp())*TICKS_PER_SECOND + datetime0.microsecond*1000
+        self.yearStart = None
+        self.yearEnd   = None
+
+    def set(self, time):
+        self.ticks = round(time*TICKS_PER_SECOND)
+        self.residual = 0.0
+        self.time  = self.ticks/TICKS_PER_SECOND
+
+    def advance(self, deltaTime):
+        # the sub-tick part of the step is carried over, steps that are not whole ticks do not drift either
+        ticks = deltaTime*TICKS_PER_SECOND + self.residual
+        whole = round(ticks)
+        self.residual = ticks - whole
+        self.ticks = self.ticks + whole
+        self.time  = self.ticks/TICKS_PER_SECOND
+
+    def datetime(self, time=None):
+        if time is None:
+            time = self.time
+        return self.datetime0 + datetime.timedelta(seconds=time)
+
+    def unixTime(self):
+        return (self.unixTicks0 + self.ticks)//TICKS_PER_SECOND
+
+    def decimalYear(self, time=None):
+        '''
+        Year with its elapsed fraction at time (s), the calendar is only consulted when the year changes.
+        '''
+        if time is None:
+            time = self.time
+        if self.yearStart is None or not self.yearStart <= time < self.yearEnd:
+            year = self.datetime(time).year
+            self.year      = year
+            self.yearStart = (datetime.datetime(year, 1, 1) - self.datetime0).total_seconds()
+            self.yearEnd   = (datetime.datetime(year + 1, 1, 1) - self.datetime0).total_seconds()
+        return self.year + (time - self.yearStart)/(self.yearEnd - self.yearStart)
+
+class LEOSS():
+
+    def __init__(self):
+        self.spacecraftObjects = []
+        self.recorderObjects = {}
+
+        self.clock = Clock()
+        self.time = 0.0
+        self.mu = 398600.4418e9
+        self.radi = 6378.137e3
+        self.J2 = 1.08262668e-3
+
+        self.sunEphemeris = SunEphemeris()
+        self.epochDT(datetime.datetime.today())
+
+        self.orbitPropOnly = False
+        self.fleetMode = False
+        self.propagatorTYPE = "NUMERICAL"
+        self.magneticField = IGRFField()
+        self.geopotentialModel = None
+        self.thirdBody = ThirdBodyEphemeris()
+        self.spaceWeather = SpaceWeather()
+
+    def epochDT(self, dt: datetime.datetime):
+            self.epoch(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, dt.microsecond)
+
+    def epoch(self, year=0, month=0, day=0, hour=0, minute=0, second=0, microsecond=0):
+            
+            self.datetime0 = datetime.datetime(year, month, day, hour, minute, second, microsecond)
+            self.clock.setEpoch(self.datetime0)
+            self.jdate0 = 367*year - int((7*(year + int((month+9)/12)))/4) + int(275*month/9) + day + 1721013.5
+            
+            hours  = hour + minute/60 + second/3600 + microsecond/3600000000
+            j2000  = 2451545
+            T0     = (self.jdate0 - j2000)/36525
+            
+            gmst0_ =  100.4606184 + 36000.77004*T0 + 0.000387933*(T0**2) - (2.583e-8)*(T0**3)
+
+            self.gmst0 = gmst0_%360
+            self.gmst  = self.gmst0 + 360.98564724*hours/24
+
+            self.jdateEpoch = self.jdate0 + hours/24
+            self.sunVector, self.sunLocation = systemSun(self)
+
+    @property
+    def time(self):
+        return self.clock.time
+
+    @time.setter
+    def time(self, time):
+        self.clock.set(time)
+
+    def datenow(self):
+        return self.clock.datetime()
+
+    def yearnow(self):
+        return int(self.clock.decimalYear())
+
+    def fieldyear(self):
+        '''
+        Decimal year at which the magnetic field is evaluated, rounded to the day so the field
+        models keep their caches within a day while following the secular variation.
+        '''
+        return round(self.clock.decimalYear()*365.25)/365.25
+
+    def addSpacecraft(self, name, recordList: list = []):
+        
+        recordList = ['State','Location','Netforce','Nettorque','Netmoment','Sunlocation'] + recordList
+        spacecraft = Spacecraft(name)
+        spacecraft.system = self
+        spacecraft.propagatorTYPE = self.propagatorTYPE
+        self.spacecraftObjects.append(spacecraft)
+        recorder = Recorder(self.datenow(), spacecraft, recordList)
+        self.recorderObjects[name] = recorder
+        spacecraft.recorder = recorder
+
+    def listSpacecraft(self):
+        names = []
+        for spacecraft in self.spacecraftObjects:
+            names.append(spacecraft.name)
+        return names
     
+    def getSpacecrafts(self):
+        spacecraftDict = {}
+        for spacecraft in self.spacecraftObjects:
+            spacecraftDict[spacecraft.name] = spacecraft
+        return spacecraftDict
+    
+    def getRecorders(self):
+        return self.recorderObjects
+    
+    def numSpacecraft(self):
+        return len(self.spacecraftObjects)
+    
+    def setFleetMode(self, other):
+        if isinstance(other, bool):
+            self.fleetMode = other
+        else:
+            raise TypeError("Operand should be bool")
+
+    def setMagneticFieldModel(self, other):
+        if isinstance(other, (IGRFField, MemoizedIGRFField, GriddedIGRFField)):
+            self.magneticField = other
+        else:
+            raise TypeError("Operand should be IGRFField, MemoizedIGRFField or GriddedIGRFField")
+
+    def setSunEphemeris(self, other):
+        if isinstance(other, (SunEphemeris, SunTable)):
+            self.sunEphemeris = other
+        else:
+            raise TypeError("Operand should be SunEphemeris or SunTable")
+
+    @property
+    def geopotential(self):
+        '''
+        Geopotential model of the "GEOPOTENTIAL" gravity, the EGM96 file is only read on first use.
+        '''
+        if self.geopotentialModel is None:
+            self.geopotentialModel = GeopotentialModel()
+        return self.geopotentialModel
+
+    def setGeopotentialModel(self, other):
+        if isinstance(other, GeopotentialModel):
+            self.geopotentialModel = other
+        else:
+            raise TypeError("Operand should be GeopotentialModel")
+
+    def setSpaceWeather(self, other):
+        if isinstance(other, SpaceWeather):
+            self.spaceWeather = other
+        else:
+            raise TypeError("Operand should be SpaceWeather")
+
+    def setPropagator(self, propagatorTYPE):
+        '''
+        Selects the orbit propagator of the system and of all its spacecraft, "NUMERICAL" (integrated
+        with the forces), "KEPLER" (analytic two-body) or "J2" (analytic two-body with J2 secular drift).
+        The analytic propagators are only used in orbit propagation only runs.
+        '''
+        if propagatorTYPE not in PROPAGATOR_TYPES:
+            raise ValueError("Propagator should be either 'NUMERICAL', 'KEPLER' or 'J2'")
+        self.propagatorTYPE = propagatorTYPE
+        for spacecraft in self.spacecraftObjects:
+            spacecraft.propagatorTYPE = propagatorTYPE
+
+    def numericalSpacecraft(self):
+        '''
+        Returns the spacecraft moved by the integrators, those with an analytic propagator
+        are left to propagateAnalytic in orbit propagation only runs.
+        '''
+        if self.orbitPropOnly == False:
+            return self.spacecraftObjects
+        return [ spacecraft for spacecraft in self.spacecraftObjects if spacecraft.propagatorTYPE == "NUMERICAL" ]
+
+    def propagateAnalytic(self, timeEnd, timeStep):
+        '''
+        Moves the spacecraft with an analytic propagator straight to timeEnd in one vectorized Kepler solve,
+        recording them every timeStep seconds (or on their recorder's schedule) on the way, all the samples
+        at once from analyticSamples. Only the orbit is propagated, the attitude is left as it is.
+        '''
+        time0 = self.time
+        count = max(0, math.ceil((timeEnd - time0)/timeStep - 1e-9))
+        grid  = time0 + timeStep*np.arange(count)
+
+        for spacecraft in self.spacecraftObjects:
+            if spacecraft.propagatorTYPE == "NUMERICAL":
+                continue
+            if spacecraft.propagatorTYPE not in PROPAGATOR_TYPES:
+                raise ValueError("Propagator should be either 'NUMERICAL', 'KEPLER' or 'J2'")
+
+            recorder = self.recorderObjects[spacecraft.name]
+            times = np.array(recorder.dueTimes(time0, timeEnd)) if recorder.scheduled() else grid
+            times = np.append(times, timeEnd)
+
+            positions, velocities = keplerPropagate(self, spacecraft.state.position, spacecraft.state.velocity,
+                                                    times - time0, spacecraft.propagatorTYPE == "J2")
+
+            recorder.updateBlock(times[:-1], self.analyticSamples(spacecraft, times[:-1], positions[:-1], velocities[:-1]))
+
+            state = spacecraft.state
+            state.array[1:4] = positions[-1]
+            state.array[4:7] = velocities[-1]
+            self.updateEnvironment(spacecraft, timeEnd)
+
+        self.sunVector, self.sunLocation = systemSun(self)
+
+    def analyticSamples(self, spacecraft: Spacecraft, times, positions, velocities):
+        '''
+        Recorder columns of a spacecraft on its analytic orbit at times (N,): the State with the propagated
+        positions and velocities, the Location, the Sunvector, Sunlocation and Illumination, and the gravity of
+        the propagator as the Netforce. No torque acts on the attitude, which is left as it is.
+        '''
+        states = np.repeat(spacecraft.state.array[None], len(times), axis=0)
+        states[:,1:4] = positions
+        states[:,4:7] = velocities
+        sunVectors, sunLocations = systemSunArray(self, times)
+        gravityTYPE = np.full(len(times), "J2" if spacecraft.propagatorTYPE == "J2" else "SPHERICAL2BODY")
+        zeros = np.zeros((len(times), 3))
+        return { "State"        : states,
+                 "Location"     : geodeticArray(self, positions, times),
+                 "Sunvector"    : sunVectors,
+                 "Sunlocation"  : sunLocations,
+                 "Illumination" : shadowFunctionArray(self, positions, sunVectors, spacecraft.shadowTYPE)[:,None],
+                 "Netforce"     : fleetGravity(self, states[:,0], positions, gravityTYPE),
+                 "Nettorque"    : zeros,
+                 "Netmoment"    : zeros }
+
     def advance1timestep(self, deltaTime):
 
         self.sunVector, self.sunLocation = systemSun(self)
 
-        for spacecraft in self.spacecraftObjects:
+        if self.fleetMode == True:
+            self.advanceFleet(deltaTime)
+            self.clock.advance(deltaTime)
+            return
+
+        for spacecraft in self.numericalSpacecraft():
 
-            spacecraft.location = self.locate(spacecraft, self.time)
+            self.updateEnvironment(spacecraft, self.time)
             spacecraft.updateUnixTime()
             # spacecraft.updateSensors()
             # spacecraft.updateControllers()
             # spacecraft.updateActuators()
-            newstate = runggeKutta4(spacecraft.derivative, spacecraft.state, self.time, deltaTime)
-            newstate.quaternion = newstate.quaternion.normalize()
+            newstate, interpolant = runggeKutta4(spacecraft.derivative, spacecraft.state, self.time, deltaTime, dense=True)
+            newstate.normalizeQuaternion()
 
-            self.recorderObjects[spacecraft.name].update(self.datenow()) #+datetime.timedelta(seconds=deltaTime)
+            recorder = self.recorderObjects[spacecraft.name]
+            if recorder.scheduled():
+                self.recordDense(spacecraft, interpolant, recorder.dueTimes(self.time, self.time + deltaTime))
+            else:
+                recorder.update(self.time)
 
             spacecraft.state = newstate
 
-        self.time = self.time + deltaTime
+        self.clock.advance(deltaTime)
+
+    def advanceFleet(self, deltaTime):
+        '''
+        Integrates all spacecraft together as one (N, STATE_SIZE) array.
+        Gravity, drag and the rigid body kinematics are evaluated for the whole fleet at once,
+        the remaining per-spacecraft terms go through Spacecraft.fallbackKinetics.
+        '''
+        if len(self.numericalSpacecraft()) == 0:
+            return
+
+        for spacecraft in self.numericalSpacecraft():
+            self.updateEnvironment(spacecraft, self.time)
+            spacecraft.updateUnixTime()
+
+        derivative, fleet = self.stackedDerivative()
+        newstates, interpolant = runggeKutta4Fleet(derivative, self.stackStates(), self.time, deltaTime, dense=True)
+        self.commitStates(newstates, fleet)
+
+        for i, spacecraft in enumerate(self.numericalSpacecraft()):
+            recorder = self.recorderObjects[spacecraft.name]
+            if recorder.scheduled():
+                self.recordDense(spacecraft, interpolant, recorder.dueTimes(self.time, self.time + deltaTime), i)
+
+    def advanceMultirate(self, orbitStep, attitudeStep):
+        '''
+        Advances the system by one orbit step with multi-rate integration.
+        Position and velocity take one RK4 step of orbitStep with the attitude frozen,
+        batched through a Fleet in fleet mode.
+        The attitude then takes RK4 sub-steps of attitudeStep against the Hermite interpolated
+        orbit, the interpolated sun vector and the interpolated inertial magnetic field,
+        which are evaluated at the orbit rate only.
+        '''
+        if self.orbitPropOnly == True:
+            self.advance1timestep(orbitStep)
+            return
+
+        time0 = self.time
+        time1 = time0 + orbitStep
+
+        sunVector0, _ = systemSun(self, time0)
+        sunVector1, _ = systemSun(self, time1)
+
+        if self.fleetMode == True:
+            fleet = Fleet(self, self.spacecraftObjects)
+            newstates = runggeKutta4Fleet(fleet.orbitDerivative, self.stackStates(), time0, orbitStep)
+            for i, spacecraft in enumerate(self.spacecraftObjects):
+                spacecraft.netforce = Vector(*fleet.netforce[i].tolist())
+            states1 = [ State.fromarray(states) for states in newstates ]
+        else:
+            states1 = [ runggeKutta4(spacecraft.orbitDerivative, spacecraft.state.copy(), time0, orbitStep) for spacecraft in self.spacecraftObjects ]
+
+        orbits = []
+        for spacecraft, state1 in zip(self.spacecraftObjects, states1):
+            state0 = spacecraft.state.copy()
+            field0 = systemMagneticFieldInertial(self, state0.position, time0, spacecraft.magnetfieldTYPE)
+            field1 = systemMagneticFieldInertial(self, state1.position, time1, spacecraft.magnetfieldTYPE)
+            orbits.append((state0, state1, field0, field1))
+
+        substeps  = max(1, round(orbitStep/attitudeStep))
+        deltaTime = orbitStep/substeps
+
+        for n in range(substeps):
+            time = time0 + n*deltaTime
+            self.time = time
+            self.sunVector = lerp(sunVector0, sunVector1, n/substeps).normalize()
+            self.sunLocation = subsolarPoint(self, self.sunVector, time)
+
+            for spacecraft, (state0, state1, field0, field1) in zip(self.spacecraftObjects, orbits):
+                position, velocity = hermiteInterpolate(state0.position, state0.velocity, state1.position, state1.velocity, orbitStep, n/substeps)
+                spacecraft.state.position = position
+                spacecraft.state.velocity = velocity
+
+                self.updateEnvironment(spacecraft, time)
+                spacecraft.updateUnixTime()
+
+                def derivative(state, t, spacecraft=spacecraft, field0=field0, field1=field1):
+                    return spacecraft.attitudeDerivative(state, t, magneticField=lerp(field0, field1, (t-time0)/orbitStep))
+
+                newstate, interpolant = runggeKutta4(derivative, spacecraft.state, time, deltaTime, dense=True)
+                newstate.normalizeQuaternion()
+
+                recorder = self.recorderObjects[spacecraft.name]
+                if recorder.scheduled():
+                    def sample(t, interpolant=interpolant, state0=state0, state1=state1):
+                        # the attitude sub-step holds the orbit, take it from the orbit step instead
+                        states = interpolant(t)
+                        position, velocity = hermiteInterpolate(state0.array[1:4], state0.array[4:7], state1.array[1:4], state1.array[4:7], orbitStep, (t-time0)/orbitStep)
+                        states[1:4] = position
+                        states[4:7] = velocity
+                        return states
+                    self.recordDense(spacecraft, sample, recorder.dueTimes(time, time + deltaTime))
+                else:
+                    recorder.update(self.time)
+
+                spacecraft.state = newstate
+
+        for spacecraft, (state0, state1, field0, field1) in zip(self.spacecraftObjects, orbits):
+            spacecraft.state.position = state1.position
+            spacecraft.state.velocity = state1.velocity
+
+        self.time = time1
+
+    def stackStates(self):
+        return np.stack([ spacecraft.state.array for spacecraft in self.numericalSpacecraft() ])
+
+    def stackedDerivative(self):
+        '''
+        Returns the derivative function of the stacked (N, STATE_SIZE) states of all spacecraft
+        (batched through a Fleet in fleet mode, spacecraft by spacecraft otherwise) and the Fleet used.
+        '''
+        if self.fleetMode == True:
+            fleet = Fleet(self, self.numericalSpacecraft())
+            return fleet.derivative, fleet
+
+        spacecrafts = self.numericalSpacecraft()
+
+        def derivative(states, time):
+            deltaStates = np.empty_like(states)
+            for i, spacecraft in enumerate(spacecrafts):
+                deltaStates[i] = spacecraft.derivative(State.fromarray(states[i]), time).array
+            return deltaStates
+
+        return derivative, None
+
+    def commitStates(self, newstates, fleet=None, record=True):
+        newstates[:,7:11] /= np.sqrt(np.sum(newstates[:,7:11]**2, axis=1))[:,None]
+
+        now = self.time
+        for i, spacecraft in enumerate(self.numericalSpacecraft()):
+            if fleet is not None:
+                spacecraft.netforce    = Vector(*fleet.netforce[i].tolist())
+                spacecraft.nettorque   = Vector(*fleet.nettorque[i].tolist())
+                spacecraft.netmomentum = Vector(*fleet.netmomentum[i].tolist())
+
+            recorder = self.recorderObjects[spacecraft.name]
+            if record == True and not recorder.scheduled():
+                recorder.update(now)
+
+            spacecraft.state = State.fromarray(newstates[i])
+
+    def recordDense(self, spacecraft, interpolant, times, index=None):
+        '''
+        Records the spacecraft at the given times within the current step from the step interpolant,
+        a function of time returning the state array (or the stacked states, row index for this spacecraft).
+        The interpolant may evaluate the derivative at the end of the step, which would leave its
+        kinetics on the spacecraft, so they are put back afterwards.
+        '''
+        recorder = self.recorderObjects[spacecraft.name]
+        kinetics = spacecraft.getKinetics()
+        for time in times:
+            states = interpolant(time)
+            spacecraft.setKinetics(kinetics)
+            state = State.fromarray(states if index is None else states[index])
+            state.normalizeQuaternion()
+            recorder.updateAt(time, state)
 
     def updateRecorders(self):
         for spacecraft in self.spacecraftObjects:
-            self.recorderObjects[spacecraft.name].update(self.datenow())
+            self.recorderObjects[spacecraft.name].update(self.time)
     
     def __getitem__(self, item):
         if isinstance(item, int):
@@ -1006,50 +3097,195 @@ class LEOSS():
             raise TypeError("Operand should be a positive int")
         
     def locate(self, spacecraft: Spacecraft, time):
-        
-        position = spacecraft.getposition()
+        return Environment(self, spacecraft.getposition(), time).location
+
+    def updateEnvironment(self, spacecraft: Spacecraft, time):
+        spacecraft.environment = Environment(self, spacecraft.getposition(), time)
+        spacecraft.location = spacecraft.environment.location
+
+GEODETIC_E2 = 0.006694385000
+
+def geodeticCoordinates(system: LEOSS, x, y, z):
+    '''
+    Geodetic latitude (rad) and ellipsoidal height (m) of a position (m) in closed form (Vermeille, 2011),
+    without iterations and valid everywhere, including inside the evolute near the centre of the Earth.
+    '''
+    a  = system.radi
+    e2 = GEODETIC_E2
+    e4 = e2*e2
+
+    xy = math.sqrt(x*x + y*y)
+    p = (xy/a)**2
+    q = (1 - e2)*(z/a)**2
+    r = (p + q - e4)/6
+
+    if q == 0.0:
+        # equatorial plane, the equator normal goes through every point of it
+        return 0.0, xy - a
+
+    evolute = 8*r*r*r + e4*p*q
+    if evolute > 0:
+        rad1 = math.sqrt(evolute)
+        rad2 = math.sqrt(e4*p*q)
+        if evolute > 10*e2:
+            rad3 = ((rad1 + rad2)**2)**(1/3)
+            u = r + 0.5*rad3 + 2*r*r/rad3
+        else:
+            u = r + 0.5*((rad1 + rad2)**2)**(1/3) + 0.5*((rad1 - rad2)**2)**(1/3)
+    else:
+        rad1 = math.sqrt(-evolute)
+        rad2 = math.sqrt(-8*r*r*r)
+        rad3 = math.sqrt(e4*p*q)
+        angle = 2*math.atan2(rad3, rad1 + rad2)/3
+        u = -4*r*math.sin(angle)*math.cos(math.pi/6 + angle)
+
+    v = math.sqrt(u*u + e4*q)
+    w = e2*(u + v - q)/(2*v)
+    k = (u + v)/(math.sqrt(w*w + u + v) + w)
+    D = k*xy/(k + e2)
+    root = math.sqrt(D*D + z*z)
+
+    return 2*math.atan2(z, root + D), (k + e2 - 1)*root/k
+
+def geodeticArray(system: LEOSS, positions, times):
+    '''
+    Geodetic latitude, longitude (deg) and altitude (km) of (N, 3) positions (m, ECI) at times (N,)
+    or a scalar time (s), the vectorized LEOSS.locate.
+    '''
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    x, y, z = positions[:,0], positions[:,1], positions[:,2]
+
+    # geodeticCoordinates with the branches selected per position
+    a  = system.radi
+    e2 = GEODETIC_E2
+    e4 = e2*e2
+
+    xy = np.sqrt(x*x + y*y)
+    p = (xy/a)**2
+    q = (1 - e2)*(z/a)**2
+    r = (p + q - e4)/6
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        evolute = 8*r*r*r + e4*p*q
+        rad1 = np.sqrt(np.abs(evolute))
+        rad2 = np.sqrt(e4*p*q)
+        rad3 = np.cbrt((rad1 + rad2)**2)
+        outside = np.where(evolute > 10*e2,
+                           r + 0.5*rad3 + 2*r*r/rad3,
+                           r + 0.5*rad3 + 0.5*np.cbrt((rad1 - rad2)**2))
+        angle = 2*np.arctan2(rad2, rad1 + np.sqrt(np.abs(8*r*r*r)))/3
+        inside = -4*r*np.sin(angle)*np.cos(np.pi/6 + angle)
+        u = np.where(evolute > 0, outside, inside)
+
+        v = np.sqrt(u*u + e4*q)
+        w = e2*(u + v - q)/(2*v)
+        k = (u + v)/(np.sqrt(w*w + u + v) + w)
+        D = k*xy/(k + e2)
+        root = np.sqrt(D*D + z*z)
+
+        equatorial = q == 0.0
+        latitude = np.where(equatorial, 0.0, 2*np.arctan2(z, root + D))
+        altitude = np.where(equatorial, xy - a, (k + e2 - 1)*root/k)
+    longitude = (np.arctan2(y, x)*R2D - siderealAngle(system, np.asarray(times, dtype=float)) + 180) % 360 - 180
+
+    return np.stack((latitude*R2D, longitude, altitude/1e3), axis=-1)
+
+def siderealAngle(system: LEOSS, time):
+    return system.gmst + time*(360.98564724)/(24*3600)
+
+def wrapLongitude(longitude):
+    if longitude < 0:
+        longitude = (((longitude/360) - int(longitude/360)) * 360) + 360    
+    if longitude > 180:
+        longitude = -360 + longitude
+    return longitude
+
+class Environment():
+    '''
+    Position dependent quantities of a spacecraft at one instant: sidereal angle, ECI to ECEF rotation,
+    geodetic location, local NED frame, magnetic field and sun. Each is computed on first access and
+    then shared by the dynamics, the sensors and the controllers of the time step.
+    '''
+
+    def __init__(self, system: LEOSS, position: Vector, time):
+        self.system   = system
+        self.position = Vector(position.x, position.y, position.z)
+        self.time     = time
+
+    def matches(self, position: Vector, time):
+        return time == self.time and position.x == self.position.x \
+            and position.y == self.position.y and position.z == self.position.z
+
+    @functools.cached_property
+    def gmst(self):
+        return siderealAngle(self.system, self.time)
+
+    @functools.cached_property
+    def eciToEcef(self):
+        angle = self.gmst*D2R
+        cos = math.cos(angle)
+        sin = math.sin(angle)
+        return Matrix.fromcomponents(cos, -sin, 0.0, sin, cos, 0.0, 0.0, 0.0, 1.0)
+
+    @functools.cached_property
+    def spherical(self):
+        '''
+        Geocentric colatitude and right ascension (rad) of the position.
+        '''
+        position = self.position
+        theta = math.acos(position.z/position.magnitude())
+        psi   = math.atan2(position.y, position.x)
+        return theta, psi
 
-        mag = position.magnitude()
+    @functools.cached_property
+    def location(self):
+        '''
+        Geodetic latitude, longitude (deg) and altitude (km).
+        '''
+        position = self.position
+        theta, psi = self.spherical
 
-        theta = math.acos(position.z/mag)
-        psi   = math.atan2(position.y,position.x)
+        latitude, altitude = geodeticCoordinates(self.system, position.x, position.y, position.z)
+        longitude = wrapLongitude(psi*R2D - self.gmst)
 
-        latitude  = 90 - (theta*R2D)
-        longitude = psi*R2D
-        altitude  = (mag-self.radi)/1000
+        return Vector(latitude*R2D, longitude, altitude/1e3)
 
-        xy = math.sqrt(position.x**2+position.y**2)
+    @functools.cached_property
+    def nedToInertial(self):
+        theta, psi = self.spherical
+        RPY = Vector(0, (theta+math.pi)*R2D, psi*R2D)
+        return RPY.RPY_toYPR_quaternion().toMatrix().transpose()
 
-        gd_theta = latitude*D2R
-        C = 0
-        gd = 0
-        e2 = 0.006694385000
+    @functools.cached_property
+    def magneticFieldNED(self):
+        '''
+        IGRF field (T) in the NED frame, from the magnetic field model of the system.
+        '''
+        location = self.location
+        return self.system.magneticField.ned(location[0], location[1], location[2], self.system.fieldyear()) * 1e-9
 
-        while True:
-            C = self.radi/math.sqrt(1-e2*math.sin(gd_theta)*math.sin(gd_theta))
-            gd = math.atan2(position.z+C*e2*math.sin(gd_theta),xy)
-            if abs(gd-gd_theta) < 1e-6:
-                gd_theta = gd
-                break
-            gd_theta = gd
-        
-        h_ellp = ( xy/math.cos(gd_theta) ) - C  
-        
-        altitude = h_ellp/1e3
-        latitude = gd_theta*R2D
-
-        gmst_ = self.gmst + time*(360.98564724)/(24*3600) 
-        longitude = longitude - gmst_
-        if longitude < 0:
-            longitude = (((longitude/360) - int(longitude/360)) * 360) + 360    
-        if longitude > 180:
-            longitude = -360 + longitude
-        
-        location = Vector(latitude, longitude, altitude)
-        return location
+    @functools.cached_property
+    def magneticField(self):
+        '''
+        IGRF field (T) in the inertial frame.
+        '''
+        return self.nedToInertial*self.magneticFieldNED
+
+    @functools.cached_property
+    def sun(self):
+        if self.time == self.system.time:
+            return self.system.sunVector, self.system.sunLocation
+        return systemSun(self.system, self.time)
+
+    @property
+    def sunVector(self):
+        return self.sun[0]
 
+    @property
+    def sunLocation(self):
+        return self.sun[1]
 
-def systemGravity(system: LEOSS, mass, position, gravityTYPE):
+def systemGravity(system: LEOSS, mass, position, gravityTYPE, time=None):
 
     if gravityTYPE == "NONE" or "":
         return Vector(0.0, 0.0, 0.0)
@@ -1058,262 +3294,1512 @@ def systemGravity(system: LEOSS, mass, position, gravityTYPE):
         rho = position.magnitude()
         return -(system.mu*mass/(rho**3))*position
 
-def systemMagneticField(system: LEOSS, state, time, dipole, fieldTYPE):
+    if gravityTYPE == "J2":
+        '''
+        Two-body gravity with the J2 zonal term, the Earth's axis taken along the inertial z axis.
+        References:
+            [1] Orbital Mechanics for Engineering Students by Howard Curtis (2014) pp.516
+        '''
+        x = position.x
+        y = position.y
+        z = position.z
+        r2 = x*x + y*y + z*z
+        r  = math.sqrt(r2)
+        k  = 1.5*system.J2*system.radi**2/r2
+        s  = 5*z*z/r2
+        g  = -system.mu*mass/(r2*r)
+        return Vector(g*x*(1 + k*(1 - s)), g*y*(1 + k*(1 - s)), g*z*(1 + k*(3 - s)))
+
+    if gravityTYPE == "GEOPOTENTIAL":
+        if time is None:
+            time = system.time
+        rotation = system.geopotential.rotation(system, time)
+        ecef = rotation*position
+        perturbation = system.geopotential.accelerationPoint(ecef.x, ecef.y, ecef.z)
+        rho = position.magnitude()
+        return -(system.mu*mass/(rho**3))*position + mass*(rotation.transpose()*Vector(*perturbation))
+
+def systemThirdBody(system: LEOSS, mass, position, time, thirdbodyTYPE):
+    '''
+    -------------------------------------------------------------------------------------------------
+    Computes the third-body gravitational force of the sun and/or the moon on the spacecraft, the
+    difference of their attraction on the spacecraft and on the Earth as in [1].
+    The positions come from the Chebyshev segments of system.thirdBody.
+    -------------------------------------------------------------------------------------------------
+    References:
+        [1] Satellite Orbits by Oliver Montenbruck and Eberhard Gill (2000) pp.69
+    -------------------------------------------------------------------------------------------------
+    '''
+    if thirdbodyTYPE == "NONE":
+        return Vector(0.0, 0.0, 0.0)
+
+    n = daysSinceJ2000(system, time)
+    ax = ay = az = 0.0
+    for body, mu in system.thirdBody.bodies(thirdbodyTYPE):
+        sx, sy, sz = body.position(n)
+        dx, dy, dz = sx - position.x, sy - position.y, sz - position.z
+        d3 = (dx*dx + dy*dy + dz*dz)**1.5
+        s3 = (sx*sx + sy*sy + sz*sz)**1.5
+        ax += mu*(dx/d3 - sx/s3)
+        ay += mu*(dy/d3 - sy/s3)
+        az += mu*(dz/d3 - sz/s3)
+    return Vector(mass*ax, mass*ay, mass*az)
+
+class GeopotentialModel():
+    '''
+    -------------------------------------------------------------------------------------------------
+    Spherical harmonic gravity of degree 2 to degree, order up to order, from fully normalised
+    EGM-style coefficients (whitespace separated lines of n, m, Cnm, Snm, further columns ignored).
+    The default file holds EGM96 to degree and order 4.
+    The acceleration follows the Cunningham V/W recursion of [1] written for normalised functions,
+    its recursion constants are computed once per model.
+    -------------------------------------------------------------------------------------------------
+    References:
+        [1] Satellite Orbits by Oliver Montenbruck and Eberhard Gill (2000) pp.66-68
+    -------------------------------------------------------------------------------------------------
+    '''
+    def __init__(self, path=None, degree=4, order=None, mu=3.986004415e14, radius=6378136.3):
+        if path is None:
+            path = os.path.join(os.path.dirname(__file__), 'data', 'EGM96.txt')
+        if order is None:
+            order = degree
+        if not 2 <= degree or not 0 <= order <= degree:
+            raise ValueError("Degree should be at least 2 and order between 0 and degree")
+
+        self.path   = path
+        self.degree = degree
+        self.order  = order
+        self.mu     = mu
+        self.radius = radius
+
+        L = degree + 1
+        self.C = np.zeros((L, L))
+        self.S = np.zeros((L, L))
+        maxDegree = 0
+        with open(path) as file:
+            for line in file:
+                fields = line.replace('D', 'E').replace('d', 'e').split()
+                if len(fields) < 4 or fields[0].startswith('#'):
+                    continue
+                n, m = int(fields[0]), int(fields[1])
+                maxDegree = max(maxDegree, n)
+                if 2 <= n <= degree and m <= order:
+                    self.C[n,m] = float(fields[2])
+                    self.S[n,m] = float(fields[3])
+        if maxDegree < degree:
+            raise ValueError(f"The coefficient file only goes up to degree {maxDegree}")
+
+        # recursion constants of the normalised V/W functions up to degree + 1
+        n = np.arange(L + 1, dtype=float)[:,None]
+        m = np.arange(L + 1, dtype=float)[None,:]
+        lower = m < n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.alpha = np.where(lower, np.sqrt((2*n + 1)*(2*n - 1)/((n - m)*(n + m))), 0.0)
+            self.beta  = np.where(lower & (n >= 2), np.sqrt((2*n + 1)*(n + m - 1)*(n - m - 1)/((2*n - 3)*(n + m)*(n - m))), 0.0)
+        self.sectoral = [ math.sqrt(3) ] + [ math.sqrt((2*k + 1)/(2*k)) for k in range(2, L + 1) ]
+
+        # factors of the acceleration terms, C and S folded in
+        n = np.arange(L, dtype=float)[:,None]
+        m = np.arange(L, dtype=float)[None,:]
+        plus  = np.where(m == 0, np.sqrt((2*n + 1)*(n + 1)*(n + 2)/(2*(2*n + 3))),
+                                 0.5*np.sqrt((2*n + 1)*(n + m + 1)*(n + m + 2)/(2*n + 3)))
+        with np.errstate(invalid='ignore'):
+            minus = np.where(m == 0, 0.0,
+                                     0.5*np.sqrt(np.where(m == 1, 2.0, 1.0)*(2*n + 1)*(n - m + 2)*(n - m + 1)/(2*n + 3)))
+            zonal = np.sqrt((2*n + 1)*(n + m + 1)*(n - m + 1)/(2*n + 3))
+        zero = np.zeros((L, L))
+        CMinus, SMinus = np.nan_to_num(self.C*minus), np.nan_to_num(self.S*minus)
+        CZonal, SZonal = np.nan_to_num(self.C*zonal), np.nan_to_num(self.S*zonal)
+        # rows match the stacked V(n+1, m+1), V(n+1, m-1) and V(n+1, m) terms of acceleration, and the same for W
+        self.termsV = np.concatenate((
+            np.stack((-self.C*plus,  self.S*plus,  zero), axis=-1).reshape(-1, 3),
+            np.stack(( CMinus,       SMinus,       zero), axis=-1).reshape(-1, 3),
+            np.stack(( zero,         zero,       -CZonal), axis=-1).reshape(-1, 3)))*(mu/radius**2)
+        self.termsW = np.concatenate((
+            np.stack((-self.S*plus, -self.C*plus,  zero), axis=-1).reshape(-1, 3),
+            np.stack(( SMinus,      -CMinus,       zero), axis=-1).reshape(-1, 3),
+            np.stack(( zero,         zero,       -SZonal), axis=-1).reshape(-1, 3)))*(mu/radius**2)
+
+        # the same constants as plain floats for accelerationPoint
+        self.alphaRows = self.alpha.tolist()
+        self.betaRows  = self.beta.tolist()
+        factors = np.stack((self.C*plus, self.S*plus, CMinus, SMinus, CZonal, SZonal), axis=-1).tolist()
+        self.pointTerms = [ (n, m, *factors[n][m]) for n in range(2, L) for m in range(min(n, order) + 1) ]
+
+        self.rotationTime = None
+        self.rotationMatrix = None
+
+    def rotation(self, system: LEOSS, time):
+        '''
+        ECI to ECEF rotation at time, kept for the stages and spacecraft that share the time.
+        '''
+        if time != self.rotationTime or self.rotationMatrix is None:
+            angle = siderealAngle(system, time)*D2R
+            cos = math.cos(angle)
+            sin = math.sin(angle)
+            self.rotationMatrix = Matrix.fromcomponents(cos, -sin, 0.0, sin, cos, 0.0, 0.0, 0.0, 1.0)
+            self.rotationTime = time
+        return self.rotationMatrix
+
+    def functions(self, positions):
+        '''
+        Normalised V and W functions of (N, 3) ECEF positions (m) as one complex array V + iW,
+        (N, degree + 2, degree + 3) with the last column left at zero so that order -1 reads as zero.
+        '''
+        N = len(positions)
+        L = self.degree + 1
+        x, y, z = positions[:,0], positions[:,1], positions[:,2]
+        r2 = x*x + y*y + z*z
+        rho = self.radius/r2
+        xy, z0, rr = ((x + 1j*y)*rho)[:,None], (z*rho)[:,None], (self.radius*rho)[:,None]
+
+        VW = np.zeros((N, L + 1, L + 2), dtype=complex)
+        VW[:,0,0] = self.radius/np.sqrt(r2)
+        for n in range(1, L + 1):
+            # zonal and tesseral terms of degree n from degrees n - 1 and n - 2, all orders at once
+            VW[:,n,:n] = self.alpha[n,:n]*z0*VW[:,n-1,:n]
+            if n >= 2:
+                VW[:,n,:n] -= self.beta[n,:n]*rr*VW[:,n-2,:n]
+            VW[:,n,n] = self.sectoral[n-1]*xy[:,0]*VW[:,n-1,n-1]
+        return VW
+
+    def accelerationPoint(self, x, y, z):
+        '''
+        acceleration for a single ECEF position with plain floats, faster than the arrays for one spacecraft.
+        '''
+        radius = self.radius
+        r2  = x*x + y*y + z*z
+        rho = radius/r2
+        xy, z0, rr = complex(x*rho, y*rho), z*rho, radius*rho
+
+        rows = [ [ complex(radius/math.sqrt(r2)) ] ]
+        for n in range(1, self.degree + 2):
+            alpha = self.alphaRows[n]
+            row1  = rows[n-1]
+            row = [ alpha[m]*z0*row1[m] for m in range(n) ]
+            if n >= 2:
+                beta = self.betaRows[n]
+                row2 = rows[n-2]
+                for m in range(n - 1):
+                    row[m] -= beta[m]*rr*row2[m]
+            row.append(self.sectoral[n-1]*xy*row1[n-1])
+            rows.append(row)
+
+        ax = ay = az = 0.0
+        for n, m, CPlus, SPlus, CMinus, SMinus, CZonal, SZonal in self.pointTerms:
+            row = rows[n+1]
+            plus  = row[m+1]
+            zonal = row[m]
+            ax -= CPlus*plus.real + SPlus*plus.imag
+            ay += SPlus*plus.real - CPlus*plus.imag
+            az -= CZonal*zonal.real + SZonal*zonal.imag
+            if m > 0:
+                minus = row[m-1]
+                ax += CMinus*minus.real + SMinus*minus.imag
+                ay += SMinus*minus.real - CMinus*minus.imag
+
+        k = self.mu/radius**2
+        return k*ax, k*ay, k*az
+
+    def acceleration(self, positions):
+        '''
+        Acceleration (N, 3) of the harmonics of degree 2 and above at (N, 3) ECEF positions (m), in the ECEF frame.
+        '''
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        N = len(positions)
+        L = self.degree + 1
+
+        VW = self.functions(positions)[:,1:]
+        VW = np.concatenate((VW[:,:,1:L+1], VW[:,:,np.arange(L)-1], VW[:,:,:L]), axis=1).reshape(N, -1)
+        return VW.real @ self.termsV + VW.imag @ self.termsW
+
+def keplerPropagate(system: LEOSS, position, velocity, deltaTimes, secularJ2=False):
+    '''
+    Analytic two-body propagation of an elliptic orbit to all deltaTimes at once (seconds from the initial
+    position and velocity), returned as (T, 3) position and velocity arrays. Kepler's equation is solved
+    in the eccentric anomaly change with the Lagrange f and g functions, which holds for circular orbits.
+    With secularJ2 the node, the argument of perigee and the mean anomaly drift at their first order J2
+    secular rates, the initial osculating elements being taken as mean elements. The velocities are the
+    time derivative of the drifting positions: the in-plane motion at the corrected mean motion plus the
+    rotation of the perigee and of the node.
+    '''
+    mu = system.mu
+    r0 = np.array([position.x, position.y, position.z], dtype=float)
+    v0 = np.array([velocity.x, velocity.y, velocity.z], dtype=float)
+    dt = np.asarray(deltaTimes, dtype=float)
+
+    rho0  = np.sqrt(r0 @ r0)
+    alpha = 2/rho0 - (v0 @ v0)/mu
+    if not alpha > 0:
+        raise ValueError("Analytic propagation needs an elliptic orbit")
+    a = 1/alpha
+    n = math.sqrt(mu*alpha**3)
+
+    h = np.cross(r0, v0)
+    if secularJ2 == True:
+        e2 = 1 - (h @ h)/(mu*a)
+        p  = a*(1 - e2)
+        cosi = h[2]/math.sqrt(h @ h)
+        k = 0.75*n*system.J2*(system.radi/p)**2
+        rateNode    = -2*k*cosi
+        ratePerigee = k*(5*cosi**2 - 1)
+        rateAnomaly = k*math.sqrt(max(0.0, 1 - e2))*(3*cosi**2 - 1)
+    else:
+        rateNode = ratePerigee = rateAnomaly = 0.0
+
+    # Kepler's equation in the eccentric anomaly change E: M = E + c(1 - cos E) - s sin E
+    M = (n + rateAnomaly)*dt
+    c = (r0 @ v0)/math.sqrt(mu*a)
+    s = 1 - rho0/a
+    E = M.copy()
+    for _ in range(50):
+        sinE = np.sin(E)
+        cosE = np.cos(E)
+        step = (E + c*(1 - cosE) - s*sinE - M)/(1 + c*sinE - s*cosE)
+        E -= step
+        if np.max(np.abs(step), initial=0.0) < 1e-12:
+            break
+    sinE = np.sin(E)
+    cosE = np.cos(E)
+
+    rho  = a*(1 - s*cosE + c*sinE)
+    f    = 1 - (a/rho0)*(1 - cosE)
+    g    = (M - E + sinE)/n
+    fdot = -math.sqrt(mu*a)*sinE/(rho*rho0)
+    gdot = 1 - (a/rho)*(1 - cosE)
+
+    positions  = f[:,None]*r0 + g[:,None]*v0
+    velocities = fdot[:,None]*r0 + gdot[:,None]*v0
+
+    if secularJ2 == True:
+        # E runs at the corrected mean motion, so the in-plane velocity scales with it
+        velocities = velocities*((n + rateAnomaly)/n)
+        normal = h/math.sqrt(h @ h)
+        polar  = np.array([0.0, 0.0, 1.0])
+        positions  = rotateAbout(positions, normal, ratePerigee*dt)
+        velocities = rotateAbout(velocities, normal, ratePerigee*dt)
+        positions  = rotateAbout(positions, polar, rateNode*dt)
+        velocities = rotateAbout(velocities, polar, rateNode*dt)
+        normals    = rotateAbout(np.tile(normal, (len(dt), 1)), polar, rateNode*dt)
+        velocities = velocities + ratePerigee*np.cross(normals, positions) + rateNode*np.cross(polar, positions)
+
+    return positions, velocities
+
+def rotateAbout(vectors, axis, angles):
+    '''
+    Rodrigues rotation of the (T, 3) vectors about the unit axis by the (T,) angles.
+    '''
+    cos = np.cos(angles)[:,None]
+    sin = np.sin(angles)[:,None]
+    return vectors*cos + np.cross(axis, vectors)*sin + np.outer(vectors @ axis, axis)*(1 - cos)
+
+def systemMagneticFieldInertial(system: LEOSS, position, time, fieldTYPE):
     
-    if fieldTYPE == "NONE" or "":
+    if fieldTYPE in ("NONE", ""):
         return Vector(0.0, 0.0, 0.0)
     
     if fieldTYPE == "EARTH":
-        position = state.position
-        mag = position.magnitude()
+        return Environment(system, position, time).magneticField
 
-        theta = math.acos(position.z/mag)
-        psi   = math.atan2(position.y,position.x)
+def systemMagneticField(system: LEOSS, state, time, dipole, fieldTYPE, magfield_inertial_vector=None):
+    
+    if fieldTYPE in ("NONE", ""):
+        return Vector(0.0, 0.0, 0.0)
+    
+    if fieldTYPE == "EARTH":
+        if magfield_inertial_vector is None:
+            magfield_inertial_vector = systemMagneticFieldInertial(system, state.position, time, fieldTYPE)
 
-        latitude  = 90 - (theta*R2D)
-        longitude = psi*R2D
-        altitude  = (mag-system.radi)/1000
+        quaternion = state.quaternion
+        magfield_body_vector = quaternion.toMatrix()*magfield_inertial_vector
 
-        xy = math.sqrt(position.x**2+position.y**2)
+        disturbance_torque = dipole.cross(magfield_body_vector)
 
-        gd_theta = latitude*D2R
-        C = 0
-        gd = 0
-        e2 = 0.006694385000
+        return disturbance_torque
 
-        while True:
-            C = system.radi/math.sqrt(1-e2*math.sin(gd_theta)*math.sin(gd_theta))
-            gd = math.atan2(position.z+C*e2*math.sin(gd_theta),xy)
-            if abs(gd-gd_theta) < 1e-6:
-                gd_theta = gd
-                break
-            gd_theta = gd
-        
-        h_ellp = ( xy/math.cos(gd_theta) ) - C  
-        
-        altitude = h_ellp/1e3
-        latitude = gd_theta*R2D
-
-        gmst_ = system.gmst + time*(360.98564724)/(24*3600) 
-        longitude = longitude - gmst_
-        if longitude < 0:
-            longitude = (((longitude/360) - int(longitude/360)) * 360) + 360    
-        if longitude > 180:
-            longitude = -360 + longitude
-            
-        location = Vector(latitude, longitude, altitude)
-        magfield = IGRF.igrf_value(location[0], location[1], location[2], system.datenow().year)[3:6]
-        magfield_NED_vector = Vector(magfield[0], magfield[1], magfield[2]) * 1e-9
+class IGRFModel():
+    '''
+    Vectorized IGRF spherical harmonic synthesis.
+    The Schmidt semi-normalised coefficients of a decimal year are interpolated from the pyIGRF
+    coefficient table once and kept (the last maxSets years), the associated Legendre functions are
+    built by recursion over the degree for all orders and all points at once.
+    '''
 
-        R = position.magnitude()
-        theta = math.acos(position.z/R)
-        psi   = math.atan2(position.y, position.x)
-        RPY = Vector(0, (theta+math.pi)*R2D, psi*R2D)
+    REFERENCE_RADIUS = 6371.2
+    WGS84_A2 = 40680631.6
+    WGS84_B2 = 40408296.0
 
-        magfield_inertial_vector = RPY.RPY_toYPR_quaternion().toMatrix().transpose()*magfield_NED_vector
+    def __init__(self, maxSets=16):
+        self.coefficientSets = {}
+        self.maxSets = maxSets
 
-        quaternion = state.quaternion
-        magfield_body_vector = quaternion.toMatrix()*magfield_inertial_vector
+    @staticmethod
+    def tableCoefficients(year):
+        '''
+        Schmidt semi-normalised g, h of a decimal year, linear between the five-yearly models and
+        along the secular variation past the last one. pyIGRF has no public accessor for its table,
+        this is the only place reaching into pyIGRF.loadCoeffs.
+        '''
+        if not 1900.0 <= year <= 2030.0:
+            raise ValueError("IGRF coefficients are only defined from 1900 to 2030")
+        return IGRF.loadCoeffs.get_coeffs(year)
+
+    def coefficients(self, year):
+        if year not in self.coefficientSets:
+            g, h = self.tableCoefficients(year)
+            if len(self.coefficientSets) >= self.maxSets:
+                self.coefficientSets.clear()
+            nmax = len(g) - 1
+            G = np.zeros((nmax+1, nmax+1))
+            H = np.zeros((nmax+1, nmax+1))
+            for n in range(1, nmax+1):
+                G[n,:n+1] = g[n]
+                H[n,1:n+1] = h[n][1:]
+
+            n = np.arange(nmax+1)[:,None].astype(float)
+            m = np.arange(nmax+1)[None,:].astype(float)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                root = np.sqrt(n**2 - m**2)
+                A = np.where(m < n, (2*n - 1)/root, 0.0)
+                B = np.where(m < n - 1, np.sqrt(np.maximum((n - 1)**2 - m**2, 0.0))/root, 0.0)
+            C = np.sqrt(1 - 0.5/np.maximum(n[:,0], 1))
+            C[1] = 1.0
+
+            self.coefficientSets[year] = (nmax, G, H, A, B, C, (G.tolist(), H.tolist(), A.tolist(), B.tolist(), C.tolist()))
+        return self.coefficientSets[year]
+
+    def geocentric(self, colatitude, altitude, lib):
+        '''
+        Geocentric colatitude cosine and sine, rotation to the geodetic frame and radius (km)
+        of geodetic colatitudes and altitudes, lib being math for floats or numpy for arrays.
+        '''
+        ct = lib.cos(colatitude)
+        st = lib.sin(colatitude)
+        one = self.WGS84_A2*st*st
+        two = self.WGS84_B2*ct*ct
+        three = one + two
+        rho = lib.sqrt(three)
+        r  = lib.sqrt(altitude*(altitude + 2.0*rho) + (self.WGS84_A2*one + self.WGS84_B2*two)/three)
+        cd = (altitude + rho)/r
+        sd = (self.WGS84_A2 - self.WGS84_B2)/rho*ct*st/r
+        return ct*cd - st*sd, st*cd + ct*sd, cd, sd, r
+
+    def nedPoint(self, latitude, longitude, altitude, year):
+        '''
+        NED field (nT) at a single location as an (X, Y, Z) tuple, the same synthesis in plain floats.
+        '''
+        nmax, _, _, _, _, _, (G, H, A, B, C) = self.coefficients(year)
+
+        ct, st, cd, sd, r = self.geocentric((90 - latitude)*D2R, altitude, math)
+
+        phi = longitude*D2R
+        cosm = [ math.cos(m*phi) for m in range(nmax+1) ]
+        sinm = [ math.sin(m*phi) for m in range(nmax+1) ]
+        ratio = self.REFERENCE_RADIUS/r
+
+        X = Y = Z = Ypole = 0.0
+        P0, dP0 = [1.0], [0.0]
+        P1, dP1 = [], []
+        rr = ratio*ratio
+        for n in range(1, nmax+1):
+            An, Bn, Gn, Hn = A[n], B[n], G[n], H[n]
+            P  = [0.0]*(n+1)
+            dP = [0.0]*(n+1)
+            for m in range(n):
+                if m < n - 1:
+                    P[m]  = An[m]*ct*P0[m] - Bn[m]*P1[m]
+                    dP[m] = An[m]*(ct*dP0[m] - st*P0[m]) - Bn[m]*dP1[m]
+                else:
+                    P[m]  = An[m]*ct*P0[m]
+                    dP[m] = An[m]*(ct*dP0[m] - st*P0[m])
+            P[n]  = C[n]*st*P0[n-1]
+            dP[n] = C[n]*(st*dP0[n-1] + ct*P0[n-1])
+            P1, dP1, P0, dP0 = P0, dP0, P, dP
+
+            rr = rr*ratio
+            for m in range(n+1):
+                gh = Gn[m]*cosm[m] + Hn[m]*sinm[m]
+                hg = Gn[m]*sinm[m] - Hn[m]*cosm[m]
+                X += rr*gh*dP[m]
+                Z -= (n + 1)*rr*gh*P[m]
+                Y += rr*hg*m*P[m]
+                Ypole += rr*hg*dP[m]*ct
+
+        Y = Ypole if st == 0.0 else Y/st
+
+        return X*cd + Z*sd, Y, Z*cd - X*sd
+
+    def ned(self, latitude, longitude, altitude, year):
+        '''
+        NED field (nT) at geodetic latitudes and longitudes (deg) and altitudes (km), scalars or arrays,
+        returned as an array of shape (..., 3).
+        '''
+        latitude  = np.asarray(latitude, dtype=float)
+        longitude = np.asarray(longitude, dtype=float)
+        altitude  = np.asarray(altitude, dtype=float)
+        shape = np.broadcast(latitude, longitude, altitude).shape
+        latitude, longitude, altitude = [ np.broadcast_to(item, shape).ravel() for item in (latitude, longitude, altitude) ]
+
+        nmax, G, H, A, B, C, _ = self.coefficients(year)
+
+        # geodetic to geocentric colatitude and radius on the WGS84 spheroid
+        ct, st, cd, sd, r = self.geocentric((90 - latitude)*D2R, altitude, np)
+
+        phi = longitude*D2R
+        orders = np.arange(nmax+1)[:,None]
+        cosm = np.cos(orders*phi)
+        sinm = np.sin(orders*phi)
+        ratio = self.REFERENCE_RADIUS/r
+
+        X = np.zeros_like(r)
+        Y = np.zeros_like(r)
+        Z = np.zeros_like(r)
+        Ypole = np.zeros_like(r)
+        P0  = np.zeros((nmax+1, len(r)))
+        dP0 = np.zeros((nmax+1, len(r)))
+        P0[0] = 1.0
+        P1, dP1 = np.zeros_like(P0), np.zeros_like(P0)
+        rr = ratio*ratio
+        for n in range(1, nmax+1):
+            # P0 holds degree n-1 and P1 degree n-2, overwritten by degree n
+            P1[:n]  = A[n,:n,None]*ct*P0[:n] - B[n,:n,None]*P1[:n]
+            dP1[:n] = A[n,:n,None]*(ct*dP0[:n] - st*P0[:n]) - B[n,:n,None]*dP1[:n]
+            P1[n]   = C[n]*st*P0[n-1]
+            dP1[n]  = C[n]*(st*dP0[n-1] + ct*P0[n-1])
+            P0, P1, dP0, dP1 = P1, P0, dP1, dP0
+
+            rr = rr*ratio
+            gh = G[n,:n+1,None]*cosm[:n+1] + H[n,:n+1,None]*sinm[:n+1]
+            hg = (G[n,:n+1,None]*sinm[:n+1] - H[n,:n+1,None]*cosm[:n+1])*orders[:n+1]
+            X += rr*np.sum(gh*dP0[:n+1], axis=0)
+            Z -= (n + 1)*rr*np.sum(gh*P0[:n+1], axis=0)
+            Y += rr*np.sum(hg*P0[:n+1], axis=0)
+            Ypole += rr*ct*np.sum(hg/np.maximum(orders[:n+1], 1)*dP0[:n+1], axis=0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Y = np.where(st == 0.0, Ypole, Y/st)
+
+        # back to the geodetic frame
+        X, Z = X*cd + Z*sd, Z*cd - X*sd
+
+        return np.stack((X, Y, Z), axis=-1).reshape(shape + (3,))
+
+IGRF_MODEL = IGRFModel()
+
+def systemMagneticFieldArray(system: LEOSS, positions, times):
+    '''
+    IGRF field along a trajectory or over a fleet: positions (N, 3) in m (ECI) at times (N,) or a
+    scalar time in seconds. Returns the geodetic NED field in nT and the inertial field in T, both (N, 3).
+    '''
+    positions = np.asarray(positions, dtype=float)
+    x, y, z = positions[:,0], positions[:,1], positions[:,2]
+
+    location = geodeticArray(system, positions, times)
+    ned = system.magneticField.nedArray(location[:,0], location[:,1], location[:,2], system.fieldyear())
+
+    R = np.sqrt(x**2 + y**2 + z**2)
+    theta = np.arccos(z/R)
+    psi   = np.arctan2(y, x)
+
+    # NED axes of the geocentric frame above each position, in the inertial frame
+    ct, st = np.cos(theta), np.sin(theta)
+    cp, sp = np.cos(psi), np.sin(psi)
+    north = np.stack((-ct*cp, -ct*sp, st), axis=-1)
+    east  = np.stack((-sp, cp, np.zeros_like(sp)), axis=-1)
+    down  = np.stack((-st*cp, -st*sp, -ct), axis=-1)
+    inertial = (ned[:,0:1]*north + ned[:,1:2]*east + ned[:,2:3]*down)*1e-9
+
+    return ned, inertial
+
+class IGRFField():
+    '''
+    Exact IGRF field, a full spherical harmonic synthesis on every call.
+    ned(latitude, longitude, altitude, year) takes geodetic degrees and km and returns the NED field in nT,
+    nedArray does the same for arrays of locations.
+    '''
 
-        disturbance_torque = dipole.cross(magfield_body_vector)
+    def __init__(self):
+        self.evaluations = 0
+
+    def ned(self, latitude, longitude, altitude, year):
+        self.evaluations = self.evaluations + 1
+        magfield = IGRF_MODEL.nedPoint(latitude, longitude, altitude, year)
+        return Vector(magfield[0], magfield[1], magfield[2])
+
+    def nedArray(self, latitudes, longitudes, altitudes, year):
+        self.evaluations = self.evaluations + len(latitudes)
+        return IGRF_MODEL.ned(latitudes, longitudes, altitudes, year)
+
+class MemoizedIGRFField(IGRFField):
+    '''
+    Exact IGRF field memoized by location quantized to latitudeQuantum, longitudeQuantum (deg) and
+    altitudeQuantum (km), about a metre by default. The RK4 stages, the sensors and the recorders
+    re-evaluate the field at (nearly) the same location within a step and share one synthesis.
+    The memo is dropped once it holds maxSize locations. Every call returns a new Vector.
+    '''
+
+    def __init__(self, latitudeQuantum=1e-5, longitudeQuantum=1e-5, altitudeQuantum=1e-3, maxSize=4096):
+        super().__init__()
+        self.quantum = (latitudeQuantum, longitudeQuantum, altitudeQuantum)
+        self.maxSize = maxSize
+        self.memo = {}
+        self.hits = 0
+
+    def ned(self, latitude, longitude, altitude, year):
+        key = (round(latitude/self.quantum[0]), round(longitude/self.quantum[1]), round(altitude/self.quantum[2]), year)
+        field = self.memo.get(key)
+        if field is not None:
+            self.hits = self.hits + 1
+            return Vector(*field)
+        if len(self.memo) >= self.maxSize:
+            self.memo.clear()
+        field = super().ned(latitude, longitude, altitude, year)
+        self.memo[key] = (field.x, field.y, field.z)
+        return field
+
+    def nedArray(self, latitudes, longitudes, altitudes, year):
+        fields = [ self.ned(latitude, longitude, altitude, year) for latitude, longitude, altitude
+                   in zip(np.ravel(latitudes).tolist(), np.ravel(longitudes).tolist(), np.ravel(altitudes).tolist()) ]
+        return np.array([ [field.x, field.y, field.z] for field in fields ]).reshape(-1, 3)
+
+class GriddedIGRFField(IGRFField):
+    '''
+    IGRF field precomputed at a decimal year on a latitude/longitude/altitude grid and interpolated trilinearly.
+    resolution is the (latitude deg, longitude deg, altitude km) spacing of the grid over altitudeRange (km),
+    outside of which the field is evaluated exactly. The grid is built on the first call with a vectorized synthesis
+    of all its nodes, blockSize nodes at a time, at the year of the call, and built again once a call is more than
+    yearTolerance years away from it. With an errorBound (nT) the grid is refined, halving every step and keeping
+    the nodes already synthesised, until the largest interpolation error at the cell centres, all of them or
+    maxSamples spread over them, is below it. The measured error, kept in self.error, is an
+    empirical estimate: the error peaks near the cell centres but is not bounded by its value there.
+    '''
+
+    def __init__(self, resolution=(10.0, 10.0, 100.0), altitudeRange=(200.0, 1000.0), errorBound=None, maxRefinements=3,
+                 yearTolerance=0.1, maxSamples=100000, blockSize=100000):
+        super().__init__()
+        self.resolution     = tuple(float(step) for step in resolution)
+        self.altitudeRange  = altitudeRange
+        self.errorBound     = errorBound
+        self.maxRefinements = maxRefinements
+        self.yearTolerance  = yearTolerance
+        self.maxSamples     = maxSamples
+        self.blockSize      = blockSize
+        self.year  = None
+        self.grid  = None
+        self.error = None
+
+    def build(self, year):
+        latitudeStep, longitudeStep, altitudeStep = self.resolution
+        counts = (math.ceil(180.0/latitudeStep) + 1, math.ceil(360.0/longitudeStep) + 1,
+                  math.ceil((self.altitudeRange[1] - self.altitudeRange[0])/altitudeStep) + 1)
+        coarse = None
+        for _ in range(self.maxRefinements + 1):
+            self.latitudes  = np.linspace(-90.0, 90.0, counts[0])
+            self.longitudes = np.linspace(-180.0, 180.0, counts[1])
+            self.altitudes  = np.linspace(self.altitudeRange[0], self.altitudeRange[1], counts[2])
+            self.steps = (self.latitudes[1] - self.latitudes[0], self.longitudes[1] - self.longitudes[0], self.altitudes[1] - self.altitudes[0])
+
+            # a refined grid halves every step, the nodes of the coarser grid are its even nodes
+            grid  = np.empty(counts + (3,))
+            fresh = np.ones(counts, dtype=bool)
+            if coarse is not None:
+                grid[::2,::2,::2]  = coarse
+                fresh[::2,::2,::2] = False
+            i, j, k = np.nonzero(fresh)
+            grid[i,j,k] = self.nodes(self.latitudes[i], self.longitudes[j], self.altitudes[k], year)
+            self.grid = grid
+            self.year = year
+
+            if self.errorBound is None:
+                return
+            self.error = self.measureError(year)
+            if self.error <= self.errorBound:
+                return
+            coarse = grid
+            counts = tuple(2*count - 1 for count in counts)
+            self.resolution = tuple(step/2 for step in self.resolution)
+
+        raise ValueError(f"Grid error {self.error} nT is above the bound after {self.maxRefinements} refinements")
+
+    def nodes(self, latitudes, longitudes, altitudes, year):
+        '''
+        Exact field (nT) at the given nodes, synthesised blockSize nodes at a time to bound the memory of the synthesis.
+        '''
+        fields = np.empty((len(latitudes), 3))
+        for start in range(0, len(latitudes), self.blockSize):
+            block = slice(start, start + self.blockSize)
+            fields[block] = IGRFField.nedArray(self, latitudes[block], longitudes[block], altitudes[block], year)
+        return fields
 
-        return disturbance_torque
+    def measureError(self, year):
+        '''
+        Largest interpolation error (nT) at the cell centres, every cell or maxSamples cells spread over the grid.
+        '''
+        cells = len(self.latitudes) - 1, len(self.longitudes) - 1, len(self.altitudes) - 1
+        count = cells[0]*cells[1]*cells[2]
+        index = np.arange(count) if count <= self.maxSamples else np.linspace(0, count - 1, self.maxSamples).astype(int)
+        i, j, k = np.unravel_index(index, cells)
+        latitudes  = self.latitudes[i]  + self.steps[0]/2
+        longitudes = self.longitudes[j] + self.steps[1]/2
+        altitudes  = self.altitudes[k]  + self.steps[2]/2
+        difference = self.nedArray(latitudes, longitudes, altitudes, year) - IGRFField.nedArray(self, latitudes, longitudes, altitudes, year)
+        return float(np.sqrt((difference**2).sum(axis=1)).max())
+
+    def interpolate(self, latitude, longitude, altitude):
+        u = (latitude  + 90.0)/self.steps[0]
+        v = (longitude + 180.0)/self.steps[1]
+        w = (altitude  - self.altitudes[0])/self.steps[2]
+        i = min(int(u), len(self.latitudes) - 2)
+        j = min(int(v), len(self.longitudes) - 2)
+        k = min(int(w), len(self.altitudes) - 2)
+        u, v, w = u - i, v - j, w - k
+
+        corners = self.grid[i:i+2, j:j+2, k:k+2].tolist()
+        field = [0.0, 0.0, 0.0]
+        for di, a in ((0, 1 - u), (1, u)):
+            for dj, b in ((0, 1 - v), (1, v)):
+                row = corners[di][dj]
+                for dk, c in ((0, 1 - w), (1, w)):
+                    weight = a*b*c
+                    node = row[dk]
+                    field[0] += weight*node[0]
+                    field[1] += weight*node[1]
+                    field[2] += weight*node[2]
+        return Vector(field[0], field[1], field[2])
+
+    def ned(self, latitude, longitude, altitude, year):
+        if not (self.altitudeRange[0] <= altitude <= self.altitudeRange[1]):
+            return super().ned(latitude, longitude, altitude, year)
+        if self.year is None or abs(year - self.year) > self.yearTolerance:
+            self.build(year)
+        return self.interpolate(latitude, longitude, altitude)
+
+    def nedArray(self, latitudes, longitudes, altitudes, year):
+        latitudes  = np.ravel(latitudes).astype(float)
+        longitudes = np.ravel(longitudes).astype(float)
+        altitudes  = np.ravel(altitudes).astype(float)
+
+        fields = np.empty((len(latitudes), 3))
+        inside = (altitudes >= self.altitudeRange[0]) & (altitudes <= self.altitudeRange[1])
+        if not np.all(inside):
+            fields[~inside] = super().nedArray(latitudes[~inside], longitudes[~inside], altitudes[~inside], year)
+        if not np.any(inside):
+            return fields
+        if self.year is None or abs(year - self.year) > self.yearTolerance:
+            self.build(year)
+
+        u = (latitudes[inside]  + 90.0)/self.steps[0]
+        v = (longitudes[inside] + 180.0)/self.steps[1]
+        w = (altitudes[inside]  - self.altitudes[0])/self.steps[2]
+        i = np.minimum(u.astype(int), len(self.latitudes) - 2)
+        j = np.minimum(v.astype(int), len(self.longitudes) - 2)
+        k = np.minimum(w.astype(int), len(self.altitudes) - 2)
+        u, v, w = (u - i)[:,None], (v - j)[:,None], (w - k)[:,None]
+
+        interpolated = np.zeros((len(u), 3))
+        for di, a in ((0, 1 - u), (1, u)):
+            for dj, b in ((0, 1 - v), (1, v)):
+                for dk, c in ((0, 1 - w), (1, w)):
+                    interpolated += a*b*c*self.grid[i + di, j + dj, k + dk]
+        fields[inside] = interpolated
+        return fields
 
 def systemAtmosphere(system: LEOSS, state, dimension, atmosphereTYPE):
-
+    '''
+    -----------------------------------------------------------------------------------------
+    Computes the atmospheric drag force on the spacecraft with the density of the selected
+    model of ATMOSPHERE_MODELS.
+    -----------------------------------------------------------------------------------------
+    Algorithm for drag force is based from [2]
+    The drag coefficeint is assumed to be the standard 2.2 as in [1]
+    The reference area of the spacecraft A is the mean surface area as in [1]
+    -----------------------------------------------------------------------------------------
+    References: 
+        [1] https://digitalcommons.usu.edu/cgi/viewcontent.cgi?article=1144&context=smallsat
+        [2] Orbital Mechanics for Engineering Students by Howard Curtis (2014) pp.658
+    -----------------------------------------------------------------------------------------
+    '''
     if atmosphereTYPE == "NONE":
         return Vector(0.0, 0.0, 0.0)
-    
-    if atmosphereTYPE == "CIRA12":
-        '''
-        -------------------------------------------------------------------------------------------------
-        Computes the atmospheric drag force on the spacecraft in moderate solar and geomagnetic activity.
-        This follows the (latest) CIRA-2012 Earth's Atmosphere Model
-            This is based from JB2008 model (Jacchia-Bowman) based on Jacchia model heritage
-            (Note that CIRA-2012 has four semi-empirical models, JB2008 is the one recommended 
-            for use in determining drag in LEO above 120 km)
-        Applicable only from 180 to 900 km
-        -------------------------------------------------------------------------------------------------
-        The atmospheric model is polyfitted (order=4) based from [2] using [1]
-        Algorithm for drag force is based from [4]
-        The drag coefficeint is assumed to be the standard 2.2 as in [3]
-        The reference area of the spacecraft A is the mean surface area as in [3]
-        -------------------------------------------------------------------------------------------------
-        References: 
-            [1] COSPAR Internation Reference Atmosphere Model (CIRA-2012) pp.20-25
-            [2] Bare Electrodynamic Tether Mission Analysis (BETsMA) ResearchGate (2014) pp.14
-            [3] https://digitalcommons.usu.edu/cgi/viewcontent.cgi?article=1144&context=smallsat
-            [4] Orbital Mechanics for Engineering Students by Howard Curtis (2014) pp.658
-        -------------------------------------------------------------------------------------------------
-        '''
-        # moderate solar and geomagnetic activities - JB2008
-        # F10.7 avg = 140 solar proxy 
-        # S10.7 avg = 125 solar index
-        # M10.7 avg = 125 solar proxy 
-        # Y10.7 avg = 125 solar index
-        # Ap        = 15  daily planetary geomagnetic index
-        # Dst       = -15 hourly disturbance storm time ring geomagnetic index
-        # x = np.arange(100,920,20)
-        # y = [ 5.47e-07, 2.40e-08, 3.98e-09, 1.36e-09, 6.15e-10, 3.17e-10, 1.77e-10, 1.05e-10, 6.47e-11, 4.12e-11,
-        #        2.69e-11, 1.80e-11, 1.23e-11, 8.48e-12, 5.95e-12, 4.22e-12, 3.02e-12, 2.18e-12, 1.59e-12, 1.17e-12,
-        #        8.60e-13, 6.39e-13, 4.77e-13, 3.58e-13, 2.71e-13, 2.06e-13, 1.57e-13, 1.20e-13, 9.28e-14, 7.19e-14,
-        #        5.60e-14, 4.40e-14, 3.48e-14, 2.79e-14, 2.26e-14, 1.85e-14, 1.53e-14, 1.28e-14, 1.08e-14, 9.27e-15,
-        #        8.01e-15 ]
-        
-        # z = np.polyfit(x[4:],np.log10(y[4:]),15)
-        # p = np.poly1d(z)
-        # xp = np.arange(180,900,1)
-        # plt.plot(x[4:],y[4:],'r-')
-        # plt.plot(xp,10**p(xp),'g.-')
-        # plt.plot(x[4:],np.log10(y[4:]),'r-')
-        # plt.plot(xp,p(xp),'g.-')
-        # plt.plot(x[4:],10**p(x[4:])-y[4:],'r-')
-        # plt.show()
-        
-        # JB2008 (moderate)
-        pn = [ 1.99771025e-11, -4.73018227e-08, 4.41628966e-05, -2.50878092e-02, -5.89884573e+00]
-        
-        def f(input):
-            return  pn[0]*input**(4) \
-                    +  pn[1]*input**(3) \
-                    +  pn[2]*input**(2) \
-                    +  pn[3]*input**(1) \
-                    +  pn[4]  
-        
-        pos = state.position
-        rho = pos.magnitude() - system.radi
-        z   = rho/1000
-        
-        if z >= 900:
-            z = 900
-        elif z <= 180:
-            z = 180
-        
-        p = 10**f(z)
-        
-        D = 2.2
-        dim = dimension
-        A = ( dim.x*dim.y + dim.x*dim.z + dim.y*dim.z ) / 3
-        # w_earth = 360.98564724*D2R/(24*60*60) * np.array([0.0, 0.0, 1.0])
-        w = Vector(0.0, 0.0, 7.29211585e-05)
-
-        v_sc  = state.velocity
-        v_atm = w.cross(pos)
-        v_rel = v_sc - v_atm
-        
-        vr    = math.sqrt(v_rel.x**2+v_rel.y**2+v_rel.z**2)
-        unit_vr = v_rel/vr
-        
-        drag = (-0.5*p*D*A*vr*vr)*unit_vr
-
-        return drag
-
-    if atmosphereTYPE == "US76":
-        '''
-        -----------------------------------------------------------------------------------------
-        Computes the atmospheric drag force on the spacecraft.
-        This follows the Exponential Atmospheric Model which uses the..
-            U.S. Standard Atmosphere 1976 (USSA76) for 0 km
-            COSPAR International Reference Atmosphere 1972 (CIRA72) for 25-500 km
-            CIRA72 with exospheric temperature T = 1000K for 500-1000 km
-        Applicable only from altitude of 0 to 1000 km. 
-        -----------------------------------------------------------------------------------------
-        Algorithm for atmosphere density is based from [1]
-        Algorithm for drag force is based from [3]
-        The drag coefficeint is assumed to be the standard 2.2 as in [2]
-        The reference area of the spacecraft A is the mean surface area as in [2]
-        -----------------------------------------------------------------------------------------
-        References: 
-            [1] Fundamentals of Astrodynamics and Applications by David Vallado (2013) pp.567
-            [2] https://digitalcommons.usu.edu/cgi/viewcontent.cgi?article=1144&context=smallsat
-            [3] Orbital Mechanics for Engineering Students by Howard Curtis (2014) pp.658
-        -----------------------------------------------------------------------------------------
-        '''
-        pos = state.position
-        rho = pos.magnitude() - system.radi
-        z   = rho/1000
 
-        h = [  0,  25,  30,  40,  50,  60,  70, 
-            80,  90, 100, 110, 120, 130, 140,
-            150, 180, 200, 250, 300, 350, 400,
-            450, 500, 600, 700, 800, 900, 1000 ]
-        
-        p0 = [     1.225,  3.899e-2,  1.774e-2,  3.972e-3,  1.057e-3,  3.206e-4,  8.770e-5,
-                1.905e-5,  3.396e-6,  5.297e-7,  9.661e-8,  2.438e-8,  8.484e-9, 3.8345e-9,
-                2.070e-9, 5.464e-10, 2.789e-10, 7.248e-11, 2.418e-11, 9.518e-12, 3.725e-12,
-            1.585e-12, 6.967e-13, 1.454e-13, 3.614e-14, 1.170e-14, 5.245e-15, 3.019e-15 ]
-        
-        H = [  7.249,  6.349,  6.682,   7.554,   8.382,   7.714,  6.549, 
-            5.799,  5.382,  5.877,   7.263,   9.473,  12.636, 16.149,
-            22.523, 29.740, 37.105,  45.546,  53.628,  53.298, 58.515,
-            60.828, 63.822, 71.835,  88.667, 124.640, 181.050, 268.00 ]
-        
-        if z > 1000:
-            z = 1000
-        elif z < 0:
-            z = 0
-        
-        i = 0
-        ### interpolation interval
-        jlist = [ 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10,
-                11, 12, 13, 14, 15, 16, 17, 18, 19, 20,
-                21, 22, 23, 24, 25, 26, 27 ]
-        for j in jlist:
-            if z >= h[j] and z < h[j+1]:
-                i = j
-                break
-            
-        if z == 1000:
-            i = 27
-            
-        ### exponential interpolation
-        p = p0[i]*math.exp(-(z-h[i])/H[i])
-        
-        D = 2.2
-        dim = dimension
-        A = ( dim.x*dim.y + dim.x*dim.z + dim.y*dim.z ) / 3
-        # w_earth = 360.98564724*D2R/(24*60*60) * np.array([0.0, 0.0, 1.0])
-        w = Vector(0.0, 0.0, 7.29211585e-05)
-
-        v_sc  = state.velocity
-        v_atm = w.cross(pos)
-        v_rel = v_sc - v_atm
-        
-        vr    = math.sqrt(v_rel.x**2+v_rel.y**2+v_rel.z**2)
-        unit_vr = v_rel/vr
-        
-        drag = (-0.5*p*D*A*vr*vr)*unit_vr
+    pos = state.position
+    z   = (pos.magnitude() - system.radi)/1000
+    p   = atmosphereDensity(system, atmosphereTYPE, z)
 
-        return drag
+    D = 2.2
+    dim = dimension
+    A = ( dim.x*dim.y + dim.x*dim.z + dim.y*dim.z ) / 3
+    # w_earth = 360.98564724*D2R/(24*60*60) * np.array([0.0, 0.0, 1.0])
+    w = Vector(0.0, 0.0, 7.29211585e-05)
 
-def systemSun(system: LEOSS):
-    # AU = 149597870.691
+    v_sc  = state.velocity
+    v_atm = w.cross(pos)
+    v_rel = v_sc - v_atm
     
-    date = system.datenow()
-    second = date.second
-    minute = date.minute
-    hour   = date.hour
-    day    = date.day
-    month  = date.month
-    year   = date.year
-
-    C = ((((second/60) + minute)/60) + hour)/24
-    jdate = 367*year - int((7*(year + int(month+9)/12))/4) + int(275*month/9) + day + 1721013.5 + C
+    vr    = math.sqrt(v_rel.x**2+v_rel.y**2+v_rel.z**2)
+    unit_vr = v_rel/vr
     
-    n  = jdate - 2451545
+    drag = (-0.5*p*D*A*vr*vr)*unit_vr
+
+    return drag
+
+def systemAtmosphereArray(system: LEOSS, positions, velocities, dimension, atmosphereTYPE, times=None):
+    '''
+    Drag forces (N, 3) along a trajectory of (N, 3) positions and velocities (m, m/s, ECI),
+    the vectorized systemAtmosphere. times (N,) in seconds since the epoch date the solar
+    activity of the space weather models, the current time if not given.
+    '''
+    positions  = np.asarray(positions, dtype=float).reshape(-1, 3)
+    velocities = np.asarray(velocities, dtype=float).reshape(-1, 3)
+    area  = np.full(len(positions), meanArea(dimension))
+    types = np.full(len(positions), atmosphereTYPE)
+    return fleetAtmosphere(system, positions, velocities, area, types, times)
+
+def atmosphereDensity(system: LEOSS, atmosphereTYPE, altitude, time=None):
+    '''
+    Density (kg/m^3) of the atmosphere model at altitude (km), space weather models at the
+    solar activity of system.spaceWeather on the day of time (the current time if not given).
+    '''
+    density = ATMOSPHERE_MODELS[atmosphereTYPE]
+    if atmosphereTYPE in ACTIVITY_MODELS:
+        f107, ap = system.spaceWeather.indices(daysSinceJ2000(system, system.time if time is None else time))
+        return float(density(altitude, f107, ap))
+    return float(density(altitude))
+
+US76_ALTITUDE = np.array([  0,  25,  30,  40,  50,  60,  70, 
+                             80,  90, 100, 110, 120, 130, 140,
+                            150, 180, 200, 250, 300, 350, 400,
+                            450, 500, 600, 700, 800, 900, 1000 ], dtype=float)
+
+US76_DENSITY = np.array([     1.225,  3.899e-2,  1.774e-2,  3.972e-3,  1.057e-3,  3.206e-4,  8.770e-5,
+                           1.905e-5,  3.396e-6,  5.297e-7,  9.661e-8,  2.438e-8,  8.484e-9, 3.8345e-9,
+                           2.070e-9, 5.464e-10, 2.789e-10, 7.248e-11, 2.418e-11, 9.518e-12, 3.725e-12,
+                          1.585e-12, 6.967e-13, 1.454e-13, 3.614e-14, 1.170e-14, 5.245e-15, 3.019e-15 ])
+
+US76_SCALEHEIGHT = np.array([  7.249,  6.349,  6.682,   7.554,   8.382,   7.714,  6.549, 
+                               5.799,  5.382,  5.877,   7.263,   9.473,  12.636, 16.149,
+                              22.523, 29.740, 37.105,  45.546,  53.628,  53.298, 58.515,
+                              60.828, 63.822, 71.835,  88.667, 124.640, 181.050, 268.00 ])
+
+# the same table as plain floats for the scalar path
+US76_BANDS = list(zip(US76_ALTITUDE.tolist(), US76_DENSITY.tolist(), US76_SCALEHEIGHT.tolist()))
+US76_ALTITUDE_LIST = US76_ALTITUDE.tolist()
+
+CIRA12_POLYNOMIAL = np.array([ 1.99771025e-11, -4.73018227e-08, 4.41628966e-05, -2.50878092e-02, -5.89884573e+00])
+CIRA12_COEFFICIENTS = CIRA12_POLYNOMIAL.tolist()
+
+def us76Density(altitude):
+    '''
+    -----------------------------------------------------------------------------------------
+    Atmospheric density (kg/m^3) at altitude (km), a float or an array.
+    This follows the Exponential Atmospheric Model which uses the..
+        U.S. Standard Atmosphere 1976 (USSA76) for 0 km
+        COSPAR International Reference Atmosphere 1972 (CIRA72) for 25-500 km
+        CIRA72 with exospheric temperature T = 1000K for 500-1000 km
+    Applicable only from altitude of 0 to 1000 km, clamped outside.
+    -----------------------------------------------------------------------------------------
+    Algorithm for atmosphere density is based from [1]
+    References: 
+        [1] Fundamentals of Astrodynamics and Applications by David Vallado (2013) pp.567
+    -----------------------------------------------------------------------------------------
+    '''
+    if isinstance(altitude, (int, float)):
+        z = min(max(altitude, 0.0), 1000.0)
+        # bisection over the band floors, 1000 km falls in the last band
+        i = min(bisect.bisect_right(US76_ALTITUDE_LIST, z) - 1, len(US76_BANDS) - 1)
+        h, p0, H = US76_BANDS[i]
+        return p0*math.exp(-(z-h)/H)
+
+    z = np.clip(altitude, 0, 1000)
+    i = np.clip(np.searchsorted(US76_ALTITUDE, z, side='right') - 1, 0, len(US76_ALTITUDE)-1)
+    return US76_DENSITY[i]*np.exp(-(z-US76_ALTITUDE[i])/US76_SCALEHEIGHT[i])
+
+def cira12Density(altitude):
+    '''
+    -------------------------------------------------------------------------------------------------
+    Atmospheric density (kg/m^3) at altitude (km), a float or an array, in moderate solar and
+    geomagnetic activity. This follows the (latest) CIRA-2012 Earth's Atmosphere Model
+        This is based from JB2008 model (Jacchia-Bowman) based on Jacchia model heritage
+        (Note that CIRA-2012 has four semi-empirical models, JB2008 is the one recommended 
+        for use in determining drag in LEO above 120 km)
+    Applicable only from 180 to 900 km, clamped outside.
+    -------------------------------------------------------------------------------------------------
+    The atmospheric model is polyfitted (order=4) based from [2] using [1]
+    References: 
+        [1] COSPAR Internation Reference Atmosphere Model (CIRA-2012) pp.20-25
+        [2] Bare Electrodynamic Tether Mission Analysis (BETsMA) ResearchGate (2014) pp.14
+    -------------------------------------------------------------------------------------------------
+    '''
+    # moderate solar and geomagnetic activities - JB2008
+    # F10.7 avg = 140 solar proxy 
+    # S10.7 avg = 125 solar index
+    # M10.7 avg = 125 solar proxy 
+    # Y10.7 avg = 125 solar index
+    # Ap        = 15  daily planetary geomagnetic index
+    # Dst       = -15 hourly disturbance storm time ring geomagnetic index
+    # x = np.arange(100,920,20)
+    # y = [ 5.47e-07, 2.40e-08, 3.98e-09, 1.36e-09, 6.15e-10, 3.17e-10, 1.77e-10, 1.05e-10, 6.47e-11, 4.12e-11,
+    #        2.69e-11, 1.80e-11, 1.23e-11, 8.48e-12, 5.95e-12, 4.22e-12, 3.02e-12, 2.18e-12, 1.59e-12, 1.17e-12,
+    #        8.60e-13, 6.39e-13, 4.77e-13, 3.58e-13, 2.71e-13, 2.06e-13, 1.57e-13, 1.20e-13, 9.28e-14, 7.19e-14,
+    #        5.60e-14, 4.40e-14, 3.48e-14, 2.79e-14, 2.26e-14, 1.85e-14, 1.53e-14, 1.28e-14, 1.08e-14, 9.27e-15,
+    #        8.01e-15 ]
+    # z = np.polyfit(x[4:],np.log10(y[4:]),4)
+    if isinstance(altitude, (int, float)):
+        z = min(max(altitude, 180.0), 900.0)
+        c0, c1, c2, c3, c4 = CIRA12_COEFFICIENTS
+        return 10**((((c0*z + c1)*z + c2)*z + c3)*z + c4)
+
+    z = np.clip(altitude, 180, 900)
+    return 10**np.polyval(CIRA12_POLYNOMIAL, z)
+
+def spaceWeatherDensity(altitude, f107=140.0, ap=15.0):
+    '''
+    -------------------------------------------------------------------------------------------------
+    Atmospheric density (kg/m^3) at altitude (km), a float or an array, driven by the daily
+    solar flux F10.7 (sfu) and the geomagnetic index Ap as in [1]:
+        T = 900 + 2.5*(F10.7 - 70) + 1.5*Ap       exospheric temperature (K)
+        m = 27 - 0.012*(h - 200)                  effective molecular mass
+        H = T/m                                   scale height (km)
+        rho = 6e-10*exp(-(h - 175)/H)
+    Applicable from 180 to 500 km, clamped below and extrapolated above with the scale height at 500 km.
+    -------------------------------------------------------------------------------------------------
+    References:
+        [1] Satellite Orbital Decay Calculations, IPS Radio and Space Services (1999) pp.2
+    -------------------------------------------------------------------------------------------------
+    '''
+    T = 900 + 2.5*(f107 - 70) + 1.5*ap
+    top = (500 - 175)*(27 - 0.012*(500 - 200))/T
+    if isinstance(altitude, (int, float)):
+        if altitude > 500.0:
+            return 6e-10*math.exp(-top - (altitude - 500)*(27 - 0.012*(500 - 200))/T)
+        z = max(altitude, 180.0)
+        return 6e-10*math.exp(-(z - 175)*(27 - 0.012*(z - 200))/T)
+
+    altitude = np.asarray(altitude, dtype=float)
+    z = np.clip(altitude, 180, 500)
+    exponent = np.where(altitude > 500, top + (altitude - 500)*(27 - 0.012*(500 - 200))/T, (z - 175)*(27 - 0.012*(z - 200))/T)
+    return 6e-10*np.exp(-exponent)
+
+ATMOSPHERE_MODELS = { "US76": us76Density, "CIRA12": cira12Density, "SPACEWEATHER": spaceWeatherDensity }
+
+# models that also take the daily F10.7 and Ap of system.spaceWeather
+ACTIVITY_MODELS = { "SPACEWEATHER" }
+
+def registerAtmosphereModel(name, density, activity=False):
+    '''
+    Adds a density model, a function of altitude (km, a float or an array) returning kg/m^3,
+    selectable by name with Spacecraft.setAtmosphereModel. With activity=True the function is
+    called as density(altitude, f107, ap) with the indices of system.spaceWeather.
+    '''
+    if not isinstance(name, str) or name == "NONE":
+        raise ValueError("Atmosphere model name should be a str other than 'NONE'")
+    if not callable(density):
+        raise TypeError("Operand should be callable")
+    ATMOSPHERE_MODELS[name] = density
+    if activity:
+        ACTIVITY_MODELS.add(name)
+    else:
+        ACTIVITY_MODELS.discard(name)
+
+class SpaceWeather():
+    '''
+    -------------------------------------------------------------------------------------------------
+    Daily solar flux F10.7 (sfu) and geomagnetic index Ap from space weather CSV files, history and
+    forecast, with a header row naming a DATE column (YYYY-MM-DD) and the F10.7 and Ap columns
+    (F10.7_OBS or F10.7, AP_AVG or AP, as in the CelesTrak SW-All.csv files of [1]).
+    The files are converted once into a binary table of one row per day, saved next to the first
+    file as .npy (or at cache, with .npy appended if missing) and memory-mapped on later runs, the conversion redone when a CSV file is newer.
+    The paths of the files are kept beside the table in a .sources file, the conversion also redone when they differ.
+    Days missing from the files repeat the previous day, an earlier file takes precedence over a
+    later one on the same day, and days outside the table take its first or last row.
+    Without files the activity is the moderate F10.7 = 140 and Ap = 15.
+    -------------------------------------------------------------------------------------------------
+    References:
+        [1] https://celestrak.org/SpaceData/SpaceWeather-Format.php
+    -------------------------------------------------------------------------------------------------
+    '''
+    F107_COLUMNS = ("F10.7_OBS", "F10.7", "F107")
+    AP_COLUMNS   = ("AP_AVG", "AP")
+
+    def __init__(self, *paths, cache=None, f107=140.0, ap=15.0):
+        self.paths = paths
+        self.cache = cache
+        self.sources = None
+        self.start = 0.0
+        self.table = np.array([[f107, ap]])
+        self.day   = None
+        self.value = (float(f107), float(ap))
+
+        if len(paths) > 0:
+            if self.cache is None:
+                self.cache = os.path.splitext(paths[0])[0] + '.npy'
+            elif not self.cache.endswith('.npy'):
+                # np.save appends the suffix to any other name
+                self.cache = self.cache + '.npy'
+            self.sources = os.path.splitext(self.cache)[0] + '.sources'
+            self.load()
+
+    def load(self):
+        paths = [ os.path.abspath(path) for path in self.paths ]
+        stale = not os.path.exists(self.cache) or not os.path.exists(self.sources) \
+             or any(os.path.getmtime(path) > os.path.getmtime(self.cache) for path in self.paths)
+        if not stale:
+            with open(self.sources, 'r') as file:
+                stale = file.read().splitlines() != paths
+        if stale:
+            np.save(self.cache, self.convert())
+            with open(self.sources, 'w') as file:
+                file.write('\n'.join(paths) + '\n')
+        table = np.load(self.cache, mmap_mode='r')
+        # first row holds the day of the second row, days since J2000 at 0h UT
+        self.start = float(table[0,0])
+        self.table = table[1:]
+        self.day   = None
+
+    def convert(self):
+        days = {}
+        for path in self.paths:
+            with open(path, 'r', newline='') as file:
+                reader = csv.reader(file)
+                header = [ name.strip().upper() for name in next(reader) ]
+                date = header.index("DATE")
+                f107 = next((header.index(name) for name in self.F107_COLUMNS if name in header), None)
+                ap   = next((header.index(name) for name in self.AP_COLUMNS if name in header), None)
+                if f107 is None or ap is None:
+                    raise ValueError(f"{path} has no F10.7 or Ap column")
+                for row in reader:
+                    if len(row) <= max(date, f107, ap) or row[date].strip() == "":
+                        continue
+                    day = datetime.date.fromisoformat(row[date].strip()[:10]).toordinal()
+                    values = [ float(row[i]) if row[i].strip() != "" else math.nan for i in (f107, ap) ]
+                    if day not in days:
+                        days[day] = values
+                    else:
+                        days[day] = [ old if not math.isnan(old) else new for old, new in zip(days[day], values) ]
+        if len(days) == 0:
+            raise ValueError("Space weather files have no rows")
+
+        first = min(days)
+        table = np.full((max(days) - first + 2, 2), math.nan)
+        for day, values in days.items():
+            table[day - first + 1] = values
+        for column in range(2):
+            values = table[1:,column]
+            known  = np.flatnonzero(~np.isnan(values))
+            if len(known) == 0:
+                raise ValueError("Space weather files have no F10.7 or Ap values")
+            # repeat the previous known day, the first known one before it
+            previous = np.maximum.accumulate(np.where(np.isnan(values), 0, np.arange(len(values))))
+            previous = np.where(np.isnan(values[previous]), known[0], previous)
+            table[1:,column] = values[previous]
+        table[0] = (first - datetime.date(2000,1,1).toordinal() - 0.5, 0.0)
+        return table
+
+    def indices(self, n):
+        '''
+        F10.7 and Ap of the day of n days since J2000, read once per day.
+        '''
+        day = math.floor(n - self.start)
+        if day != self.day:
+            i = min(max(day, 0), len(self.table) - 1)
+            self.value = tuple(self.table[i].tolist())
+            self.day = day
+        return self.value
+
+    def indicesArray(self, n):
+        '''
+        F10.7 and Ap arrays (N,) of the days of n (N,) days since J2000.
+        '''
+        i = np.clip(np.floor(np.asarray(n, dtype=float) - self.start).astype(int), 0, len(self.table) - 1)
+        rows = np.asarray(self.table)[i]
+        return rows[...,0], rows[...,1]
+
+def daysSinceJ2000(system: LEOSS, time):
+    '''
+    Days since J2000 (JD 2451545) of a time, or an array of times, in seconds since the epoch.
+    '''
+    return system.jdateEpoch - 2451545 + time/86400
+
+def solarSeries(n):
+    '''
+    Sun unit vector in the inertial frame from the low precision solar series, n days since J2000.
+    '''
+    # AU = 149597870.691
     # cy = n/36525
-    M  = 57.528 + 0.9856003*n
+    M  = 357.528 + 0.9856003*n
     M  = M % 360
     L  = 280.460 + 0.98564736*n
     L  = L % 360
     Lamda = L + 1.915*math.sin(M*D2R) + 0.020*math.sin(2*M*D2R)
     Lamda = Lamda % 360
     eps   = 23.439 - 0.0000004*n
-    u   = Vector( math.cos(Lamda*D2R) , math.sin(Lamda*D2R)*math.cos(eps*D2R), math.sin(Lamda*D2R)*math.sin(eps*D2R) )
     # rS  = (1.00014 - 0.01671*math.cos(M*D2R) - 0.000140*math.cos(2*M*D2R))*AU
     # r_S = rS * u
+    return Vector( math.cos(Lamda*D2R) , math.sin(Lamda*D2R)*math.cos(eps*D2R), math.sin(Lamda*D2R)*math.sin(eps*D2R) )
+
+def solarSeriesArray(n):
+    '''
+    Vectorized solarSeries, (N, 3) sun unit vectors for n (N,) days since J2000.
+    '''
+    n = np.asarray(n, dtype=float)
+    M = np.radians((357.528 + 0.9856003*n) % 360)
+    L = (280.460 + 0.98564736*n) % 360
+    Lamda = np.radians((L + 1.915*np.sin(M) + 0.020*np.sin(2*M)) % 360)
+    eps   = np.radians(23.439 - 0.0000004*n)
+    return np.stack((np.cos(Lamda), np.sin(Lamda)*np.cos(eps), np.sin(Lamda)*np.sin(eps)), axis=-1)
+
+def sunPositionArray(n):
+    '''
+    Sun positions (N, 3) in m in the inertial frame for n (N,) days since J2000, the solar series
+    direction at the series distance.
+    '''
+    n = np.asarray(n, dtype=float)
+    M = np.radians((357.528 + 0.9856003*n) % 360)
+    rS = (1.00014 - 0.01671*np.cos(M) - 0.000140*np.cos(2*M))*AU
+    return solarSeriesArray(n)*rS[...,None]
+
+def moonPositionArray(n):
+    '''
+    -------------------------------------------------------------------------------------------------
+    Moon positions (N, 3) in m in the inertial frame for n (N,) days since J2000, from the low
+    precision lunar series of the Astronomical Almanac (about 0.3 deg and 1000 km) as given in [1].
+    -------------------------------------------------------------------------------------------------
+    References:
+        [1] Fundamentals of Astrodynamics and Applications by David Vallado (2013) pp.288
+    -------------------------------------------------------------------------------------------------
+    '''
+    T = np.asarray(n, dtype=float)/36525
+
+    def sin(a, b):
+        return np.sin(np.radians(a + b*T))
+
+    def cos(a, b):
+        return np.cos(np.radians(a + b*T))
+
+    longitude = np.radians(218.32 + 481267.8813*T + 6.29*sin(134.9, 477198.85) - 1.27*sin(259.2, -413335.38)
+                           + 0.66*sin(235.7, 890534.23) + 0.21*sin(269.9, 954397.70)
+                           - 0.19*sin(357.5, 35999.05) - 0.11*sin(186.6, 966404.05))
+    latitude  = np.radians(5.13*sin(93.3, 483202.03) + 0.28*sin(228.2, 960400.87)
+                           - 0.28*sin(318.3, 6003.18) - 0.17*sin(217.6, -407332.20))
+    parallax  = np.radians(0.9508 + 0.0518*cos(134.9, 477198.85) + 0.0095*cos(259.2, -413335.38)
+                           + 0.0078*cos(235.7, 890534.23) + 0.0028*cos(269.9, 954397.70))
+    eps = np.radians(23.439291 - 0.0130042*T)
+
+    r = 6378.137e3/np.sin(parallax)
+    x = np.cos(latitude)*np.cos(longitude)
+    y = np.cos(eps)*np.cos(latitude)*np.sin(longitude) - np.sin(eps)*np.sin(latitude)
+    z = np.sin(eps)*np.cos(latitude)*np.sin(longitude) + np.cos(eps)*np.sin(latitude)
+    return np.stack((x, y, z), axis=-1)*r[...,None]
+
+class ChebyshevEphemeris():
+    '''
+    Chebyshev fit of a position series, a vectorized function of days since J2000 returning (N, 3),
+    on consecutive segments of segmentDays. Segments are fitted once, on first use or with prepare.
+    '''
+    def __init__(self, function, segmentDays, degree):
+        self.function    = function
+        self.segmentDays = segmentDays
+        self.degree      = degree
+        self.segments    = {}
+        self.last        = (None, None)
+
+        K = degree + 1
+        self.nodes  = np.cos(np.pi*(np.arange(K) + 0.5)/K)
+        self.matrix = (2/K)*np.cos(np.pi*np.arange(K)[:,None]*(np.arange(K) + 0.5)[None,:]/K)
+        self.matrix[0] /= 2
+
+    def segment(self, k):
+        if k not in self.segments:
+            half = self.segmentDays/2
+            values = self.function((k*self.segmentDays + half) + half*self.nodes)
+            coefficients = self.matrix @ values
+            self.segments[k] = (coefficients, coefficients.tolist())
+        return self.segments[k]
+
+    def prepare(self, day0, day1):
+        for k in range(math.floor(day0/self.segmentDays), math.floor(day1/self.segmentDays) + 1):
+            self.segment(k)
+
+    def position(self, n):
+        '''
+        Position at n days since J2000 as plain floats, by Clenshaw's recurrence.
+        The last position is kept for the other spacecraft at the same stage time.
+        '''
+        if n == self.last[0]:
+            return self.last[1]
+        k = math.floor(n/self.segmentDays)
+        _, coefficients = self.segment(k)
+        t = 2*(n/self.segmentDays - k) - 1
+        bx1 = by1 = bz1 = bx2 = by2 = bz2 = 0.0
+        for cx, cy, cz in coefficients[:0:-1]:
+            bx1, bx2 = 2*t*bx1 - bx2 + cx, bx1
+            by1, by2 = 2*t*by1 - by2 + cy, by1
+            bz1, bz2 = 2*t*bz1 - bz2 + cz, bz1
+        cx, cy, cz = coefficients[0]
+        position = (t*bx1 - bx2 + cx, t*by1 - by2 + cy, t*bz1 - bz2 + cz)
+        self.last = (n, position)
+        return position
+
+    def positions(self, n):
+        '''
+        Positions (N, 3) at n (N,) days since J2000.
+        '''
+        n = np.asarray(n, dtype=float).reshape(-1)
+        k = np.floor(n/self.segmentDays).astype(int)
+        coefficients = np.empty((self.degree + 1, len(n), 3))
+        for segment in np.unique(k).tolist():
+            coefficients[:, k == segment] = self.segment(segment)[0][:,None,:]
+        t = (2*(n/self.segmentDays - k) - 1)[:,None]
+        b1 = np.zeros((len(n), 3))
+        b2 = np.zeros((len(n), 3))
+        for c in coefficients[:0:-1]:
+            b1, b2 = 2*t*b1 - b2 + c, b1
+        return t*b1 - b2 + coefficients[0]
+
+class ThirdBodyEphemeris():
+    '''
+    Sun and moon positions from Chebyshev segments of the solar and lunar series, and their gravitational parameters.
+    '''
+    def __init__(self, sunSegmentDays=16.0, moonSegmentDays=2.0, degree=12):
+        self.sun  = ChebyshevEphemeris(sunPositionArray, sunSegmentDays, degree)
+        self.moon = ChebyshevEphemeris(moonPositionArray, moonSegmentDays, degree)
+        self.muSun  = 1.32712440018e20
+        self.muMoon = 4.9028e12
+
+    def prepare(self, day0, day1):
+        self.sun.prepare(day0, day1)
+        self.moon.prepare(day0, day1)
+
+    def bodies(self, thirdbodyTYPE):
+        bodies = []
+        if thirdbodyTYPE in ("SUN", "SUNMOON"):
+            bodies.append((self.sun, self.muSun))
+        if thirdbodyTYPE in ("MOON", "SUNMOON"):
+            bodies.append((self.moon, self.muMoon))
+        return bodies
+
+class SunEphemeris():
+    '''
+    Sun unit vector, declination and right ascension (deg) from the solar series, evaluated on every call.
+    '''
+    def __init__(self):
+        self.evaluations = 0
+
+    def prepare(self, day0, day1):
+        pass
+
+    def direction(self, n):
+        self.evaluations += 1
+        u = solarSeries(n)
+        return u, math.asin(max(-1.0, min(1.0, u.z)))*R2D, math.atan2(u.y, u.x)*R2D
+
+    def vectors(self, n):
+        n = np.asarray(n, dtype=float)
+        self.evaluations += n.size
+        return solarSeriesArray(n)
+
+class SunTable(SunEphemeris):
+    '''
+    Sun unit vector, declination and right ascension tabulated every step seconds and linearly interpolated,
+    the vector renormalized. The table covers the run window (at least span seconds) and is rebuilt
+    when a query leaves it.
+    '''
+    def __init__(self, step=60.0, span=86400.0):
+        super().__init__()
+        self.step  = step
+        self.span  = span
+        self.start = 0.0
+        self.last  = -1
+        self.table = None
+        self.rows  = None
+
+    def prepare(self, day0, day1):
+        rate = 86400/self.step
+        if (day0 - self.start)*rate >= 0 and (day1 - self.start)*rate < self.last:
+            return
+        first = math.floor(day0*rate)
+        count = max(math.floor(day1*rate) - first + 1, math.ceil(self.span/self.step))
+        self.start = first/rate
+        vectors = super().vectors(self.start + np.arange(count + 1)/rate)
+        declination    = np.degrees(np.arcsin(np.clip(vectors[:,2], -1, 1)))
+        rightAscension = np.degrees(np.unwrap(np.arctan2(vectors[:,1], vectors[:,0])))
+        self.table = np.column_stack((vectors, declination, rightAscension))
+        self.rows  = self.table.tolist()
+        self.last  = count
+
+    def direction(self, n):
+        index = (n - self.start)*86400/self.step
+        if index < 0 or index >= self.last:
+            self.prepare(n, n)
+            index = (n - self.start)*86400/self.step
+        i = int(index)
+        s = index - i
+        r0 = self.rows[i]
+        r1 = self.rows[i+1]
+        x = r0[0] + s*(r1[0] - r0[0])
+        y = r0[1] + s*(r1[1] - r0[1])
+        z = r0[2] + s*(r1[2] - r0[2])
+        r = math.sqrt(x*x + y*y + z*z)
+        return Vector(x/r, y/r, z/r), r0[3] + s*(r1[3] - r0[3]), r0[4] + s*(r1[4] - r0[4])
+
+    def vectors(self, n):
+        n = np.asarray(n, dtype=float)
+        if n.size == 0:
+            return np.zeros((0, 3))
+        self.prepare(n.min(), n.max())
+        index = (n - self.start)*86400/self.step
+        i = np.minimum(index.astype(int), self.last - 1)
+        s = (index - i)[:,None]
+        u = self.table[i,:3] + s*(self.table[i+1,:3] - self.table[i,:3])
+        return u/np.linalg.norm(u, axis=1)[:,None]
+
+def systemSun(system: LEOSS, time=None):
+
+    if time is None:
+        time = system.time
+
+    sun_unitVector, declination, rightAscension = system.sunEphemeris.direction(daysSinceJ2000(system, time))
+    sun_LatLon = Vector(declination, wrapLongitude(rightAscension - siderealAngle(system, time)), 0)
+
+    return sun_unitVector, sun_LatLon
+
+def systemSunArray(system: LEOSS, times):
+    '''
+    Sun unit vectors (N, 3) in the inertial frame and subsolar points (N, 3), latitude and longitude (deg),
+    at times (N,) in seconds since the epoch, the vectorized systemSun.
+    '''
+    times = np.asarray(times, dtype=float).reshape(-1)
+    vectors = system.sunEphemeris.vectors(daysSinceJ2000(system, times))
+
+    latitude  = np.degrees(np.arcsin(np.clip(vectors[:,2], -1, 1)))
+    longitude = np.degrees(np.arctan2(vectors[:,1], vectors[:,0])) - siderealAngle(system, times)
+    longitude = (longitude + 180) % 360 - 180
+    return vectors, np.stack((latitude, longitude, np.zeros_like(latitude)), axis=-1)
+
+def shadowFunction(system: LEOSS, position, sunVector, shadowTYPE):
+    '''
+    -------------------------------------------------------------------------------------------------
+    Fraction of the solar disk seen from the spacecraft, 0 in umbra and 1 in sunlight.
+    CYLINDRICAL -- the Earth's shadow is a cylinder of the Earth's radius behind the Earth
+    CONICAL     -- umbra and penumbra from the apparent radii of the sun and the Earth as in [1]
+    The sun is taken at 1 AU along the sun unit vector of the time step.
+    -------------------------------------------------------------------------------------------------
+    References:
+        [1] Satellite Orbits by Oliver Montenbruck and Eberhard Gill (2000) pp.80
+    -------------------------------------------------------------------------------------------------
+    '''
+    x, y, z = position.x, position.y, position.z
+    ux, uy, uz = sunVector.x, sunVector.y, sunVector.z
+    r2 = x*x + y*y + z*z
+    p  = x*ux + y*uy + z*uz
+
+    if shadowTYPE == "CYLINDRICAL":
+        if p < 0 and r2 - p*p < system.radi**2:
+            return 0.0
+        return 1.0
+
+    if shadowTYPE == "CONICAL":
+        dx, dy, dz = AU*ux - x, AU*uy - y, AU*uz - z
+        d = math.sqrt(dx*dx + dy*dy + dz*dz)
+        r = math.sqrt(r2)
+        a = math.asin(SUN_RADIUS/d)
+        b = math.asin(system.radi/r)
+        c = math.acos(max(-1.0, min(1.0, -(x*dx + y*dy + z*dz)/(r*d))))
+        if c >= a + b:
+            return 1.0
+        if c <= b - a:
+            return 0.0
+        if c <= a - b:
+            return 1.0 - b*b/(a*a)
+        u = (c*c + a*a - b*b)/(2*c)
+        v = math.sqrt(max(a*a - u*u, 0.0))
+        area = a*a*math.acos(u/a) + b*b*math.acos((c - u)/b) - c*v
+        return 1.0 - area/(math.pi*a*a)
+
+    raise ValueError("Input str is not a valid ShadowModel")
+
+def shadowFunctionArray(system: LEOSS, positions, sunVectors, shadowTYPE):
+    '''
+    Illumination fractions (N,) of (N, 3) positions (m, ECI) with the sun along (N, 3) or (3,) unit vectors,
+    the vectorized shadowFunction.
+    '''
+    positions  = np.asarray(positions, dtype=float).reshape(-1, 3)
+    sunVectors = np.broadcast_to(np.asarray(sunVectors, dtype=float), positions.shape)
+    r2 = np.sum(positions**2, axis=1)
+    p  = np.sum(positions*sunVectors, axis=1)
+
+    if shadowTYPE == "CYLINDRICAL":
+        return np.where((p < 0) & (r2 - p*p < system.radi**2), 0.0, 1.0)
+
+    if shadowTYPE == "CONICAL":
+        delta = AU*sunVectors - positions
+        d = np.sqrt(np.sum(delta**2, axis=1))
+        r = np.sqrt(r2)
+        a = np.arcsin(SUN_RADIUS/d)
+        b = np.arcsin(system.radi/r)
+        c = np.arccos(np.clip(-np.sum(positions*delta, axis=1)/(r*d), -1, 1))
+
+        u = (c*c + a*a - b*b)/(2*np.maximum(c, 1e-300))
+        v = np.sqrt(np.maximum(a*a - u*u, 0.0))
+        area = a*a*np.arccos(np.clip(u/a, -1, 1)) + b*b*np.arccos(np.clip((c - u)/b, -1, 1)) - c*v
+        illumination = 1.0 - area/(np.pi*a*a)
+        illumination = np.where(c <= a - b, 1.0 - b*b/(a*a), illumination)
+        illumination = np.where(c <= b - a, 0.0, illumination)
+        return np.where(c >= a + b, 1.0, illumination)
+
+    raise ValueError("Input str is not a valid ShadowModel")
+
+def systemSolarPressure(system: LEOSS, state, dimension, reflectivity, srpTYPE, shadowTYPE, illumination=None):
+    '''
+    -------------------------------------------------------------------------------------------------
+    Computes the solar radiation pressure force on the spacecraft with the cannonball model of [1],
+    F = -nu*P*Cr*A*s, nu the illumination of shadowFunction (or the one given), P the solar pressure
+    at 1 AU, Cr the reflectivity coefficient, A the mean surface area and s the sun unit vector of the time step.
+    -------------------------------------------------------------------------------------------------
+    References:
+        [1] Satellite Orbits by Oliver Montenbruck and Eberhard Gill (2000) pp.77
+    -------------------------------------------------------------------------------------------------
+    '''
+    if srpTYPE == "NONE":
+        return Vector(0.0, 0.0, 0.0)
+
+    sun = system.sunVector
+    if illumination is None:
+        illumination = shadowFunction(system, state.position, sun, shadowTYPE)
+    if illumination == 0.0:
+        return Vector(0.0, 0.0, 0.0)
+    return (-illumination*SOLAR_PRESSURE*reflectivity*meanArea(dimension))*sun
+
+def systemSolarPressureTorque(system: LEOSS, state, dimension, reflectivity, pressureCenter, srpTYPE, shadowTYPE, illumination=None):
+    '''
+    Torque (N m, body frame) of the solar radiation pressure force applied at the centre of pressure.
+    '''
+    if srpTYPE == "NONE" or (pressureCenter.x == 0 and pressureCenter.y == 0 and pressureCenter.z == 0):
+        return Vector(0.0, 0.0, 0.0)
+
+    force = systemSolarPressure(system, state, dimension, reflectivity, srpTYPE, shadowTYPE, illumination)
+    return pressureCenter.cross(state.quaternion.toMatrix()*force)
+
+def systemSolarPressureArray(system: LEOSS, positions, times, dimension, reflectivity, shadowTYPE):
+    '''
+    Solar radiation pressure forces (N, 3) and illumination fractions (N,) along a trajectory of (N, 3)
+    positions (m, ECI) at times (N,) in seconds since the epoch, the vectorized systemSolarPressure.
+    '''
+    sunVectors, _ = systemSunArray(system, times)
+    illumination = shadowFunctionArray(system, positions, sunVectors, shadowTYPE)
+    force = (-illumination*SOLAR_PRESSURE*reflectivity*meanArea(dimension))[:,None]*sunVectors
+    return force, illumination
+
+class FaceTable():
+    '''
+    -------------------------------------------------------------------------------------------------
+    Spacecraft surface as a table of flat faces in the body frame: areas (F,) m^2, outward unit
+    normals (F, 3) and centres of pressure (F, 3) m from the centre of mass.
+    A face takes the flow or the sunlight in proportion to its projected area A*max(0, n.d) as in [1],
+    the drag on the ram facing faces with the coefficient 2.2 and the SRP with the reflectivity Cr.
+    -------------------------------------------------------------------------------------------------
+    References:
+        [1] Spacecraft Attitude Determination and Control by James Wertz (1978) pp.570
+    -------------------------------------------------------------------------------------------------
+    '''
+    def __init__(self, areas, normals, centers):
+        areas   = np.asarray(areas, dtype=float).reshape(-1)
+        normals = np.asarray(normals, dtype=float).reshape(-1, 3)
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        if not len(areas) == len(normals) == len(centers):
+            raise ValueError("Face areas, normals and centers should have the same length")
+
+        self.areas   = areas
+        self.normals = normals/np.linalg.norm(normals, axis=1)[:,None]
+        self.centers = centers
+
+    @classmethod
+    def box(cls, size: Vector):
+        '''
+        The six faces of a box of the given size centred at the centre of mass.
+        '''
+        Lx, Ly, Lz = size.x, size.y, size.z
+        areas   = [Ly*Lz, Ly*Lz, Lx*Lz, Lx*Lz, Lx*Ly, Lx*Ly]
+        normals = [[1,0,0], [-1,0,0], [0,1,0], [0,-1,0], [0,0,1], [0,0,-1]]
+        centers = np.array(normals)*0.5*np.array([Lx, Ly, Lz])
+        return cls(areas, normals, centers)
+
+    def __len__(self):
+        return len(self.areas)
+
+    def projectedArea(self, directions):
+        '''
+        Areas (N,) seen along (N, 3) body-frame unit vectors.
+        '''
+        directions = np.asarray(directions, dtype=float).reshape(-1, 3)
+        return np.maximum(directions @ self.normals.T, 0.0) @ self.areas
+
+    def kinetics(self, wind, windPressure, sun, sunPressure):
+        '''
+        Force and torque (N, 3) in the body frame from the (N, 3) unit relative wind and sun vectors
+        in the body frame, windPressure = 0.5*rho*Cd*v^2 and sunPressure = nu*P*Cr (N,).
+        '''
+        return panelKinetics(self.areas[None], self.normals[None], self.centers[None], wind, windPressure, sun, sunPressure)
+
+    def kineticsPoint(self, wind: Vector, windPressure, sun: Vector, sunPressure):
+        '''
+        kinetics for one spacecraft with Vector directions, returning the body-frame force and torque as Vectors.
+        '''
+        directions = np.array([[wind.x, sun.x], [wind.y, sun.y], [wind.z, sun.z]])
+        weights = np.maximum(self.normals @ directions, 0.0)*self.areas[:,None]*(windPressure, sunPressure)
+        (a, b), ((mx, my, mz), (nx, ny, nz)) = weights.sum(axis=0).tolist(), (weights.T @ self.centers).tolist()
+
+        force  = Vector(-a*wind.x - b*sun.x, -a*wind.y - b*sun.y, -a*wind.z - b*sun.z)
+        torque = Vector(wind.y*mz - wind.z*my + sun.y*nz - sun.z*ny,
+                        wind.z*mx - wind.x*mz + sun.z*nx - sun.x*nz,
+                        wind.x*my - wind.y*mx + sun.x*ny - sun.y*nx)
+        return force, torque
+
+def panelKinetics(areas, normals, centers, wind, windPressure, sun, sunPressure):
+    '''
+    Face forces summed in one pass over (N, F) face tables, the wind and the sun as the two directions
+    of each row. Rows with fewer faces are padded with zero areas.
+    '''
+    directions = np.stack((wind, sun), axis=1)
+    pressures  = np.stack((windPressure, sunPressure), axis=1)
+
+    # (N, F, 2) pressure times projected area of each face for each direction
+    weights = areas[...,None]*np.maximum(np.matmul(normals, directions.transpose(0,2,1)), 0.0)*pressures[:,None,:]
+
+    # sum over the faces of c x (-w d) = (sum of w c) x (-d)
+    moments = np.matmul(weights.transpose(0,2,1), centers)
+    force   = -np.sum(np.sum(weights, axis=1)[...,None]*directions, axis=1)
+    torque  = -np.sum(np.cross(moments, directions), axis=1)
+    return force, torque
+
+def systemPanels(system: LEOSS, state, faces: FaceTable, atmosphereTYPE, srpTYPE, shadowTYPE, reflectivity):
+    '''
+    Drag and SRP force (N, inertial) and their torque (N m, body frame) on the faces of the spacecraft,
+    the attitude dependent counterpart of systemAtmosphere, systemSolarPressure and systemSolarPressureTorque.
+    '''
+    rotation = state.quaternion.toMatrix()
+    wind = Vector(0.0, 0.0, 0.0); windPressure = 0.0
+    sun  = Vector(0.0, 0.0, 0.0); sunPressure  = 0.0
+
+    if atmosphereTYPE != "NONE":
+        pos = state.position
+        z   = (pos.magnitude() - system.radi)/1000
+        p   = atmosphereDensity(system, atmosphereTYPE, z)
+        v_rel = state.velocity - Vector(0.0, 0.0, 7.29211585e-05).cross(pos)
+        vr    = v_rel.magnitude()
+        if vr > 0:
+            wind = rotation*(v_rel/vr)
+            windPressure = 0.5*p*2.2*vr*vr
+
+    if srpTYPE != "NONE":
+        illumination = shadowFunction(system, state.position, system.sunVector, shadowTYPE)
+        sun = rotation*system.sunVector
+        sunPressure = illumination*SOLAR_PRESSURE*reflectivity
 
-    sun_unitVector = u
+    force, torque = faces.kineticsPoint(wind, windPressure, sun, sunPressure)
+    return rotation.transpose()*force, torque
+
+def subsolarPoint(system: LEOSS, sun_unitVector, time):
 
     mag = sun_unitVector.magnitude()
 
@@ -1323,44 +4809,635 @@ def systemSun(system: LEOSS):
     latitude  = 90 - (theta*R2D)
     longitude = psi*R2D
 
-    gmst_ = system.gmst + system.time*(360.98564724)/(24*3600) 
-    longitude = longitude - gmst_
-    if longitude < 0:
-        longitude = (((longitude/360) - int(longitude/360)) * 360) + 360    
-    if longitude > 180:
-        longitude = -360 + longitude
+    longitude = wrapLongitude(longitude - siderealAngle(system, time))
 
     sun_LatLon = Vector( latitude, longitude, 0)
 
-    return sun_unitVector, sun_LatLon
+    return sun_LatLon
+
+def runggeKutta4(derivative, state, time, deltaTime, dense=False):
+    # stage states share one scratch buffer, updated in place (axpy) between stages
+    y     = state.array
+    stage = State.fromarray(np.empty(STATE_SIZE))
+    ys    = stage.array
+    k     = np.empty(STATE_SIZE)
+    kk    = np.empty(STATE_SIZE)
+
+    k1 = derivative(state, time).array
+    np.multiply(k1, deltaTime, out=ys); ys /= 2; ys += y
+    k2 = derivative(stage, time + deltaTime/2).array
+    np.multiply(k2, deltaTime, out=ys); ys /= 2; ys += y
+    k3 = derivative(stage, time + deltaTime/2).array
+    np.multiply(k3, deltaTime, out=ys); ys += y
+    k4 = derivative(stage, time + deltaTime).array
+
+    np.multiply(k2, 2, out=k); k += k1
+    np.multiply(k3, 2, out=kk); k += kk
+    k += k4
+    k *= 1/6
+    k *= deltaTime
+    k += y
+
+    if dense == True:
+        def arrayDerivative(array, time):
+            return derivative(State.fromarray(array), time).array
+        return State.fromarray(k), HermiteInterpolant(arrayDerivative, y, k1, k, time, deltaTime)
+
+    return State.fromarray(k)
+
+def runggeKutta4Fleet(derivative, states, time, deltaTime, dense=False):
+    y  = states
+    ys = np.empty_like(y)
+    k  = np.empty_like(y)
+    kk = np.empty_like(y)
+
+    k1 = derivative(y, time)
+    np.multiply(k1, deltaTime, out=ys); ys /= 2; ys += y
+    k2 = derivative(ys, time + deltaTime/2)
+    np.multiply(k2, deltaTime, out=ys); ys /= 2; ys += y
+    k3 = derivative(ys, time + deltaTime/2)
+    np.multiply(k3, deltaTime, out=ys); ys += y
+    k4 = derivative(ys, time + deltaTime)
+
+    np.multiply(k2, 2, out=k); k += k1
+    np.multiply(k3, 2, out=kk); k += kk
+    k += k4
+    k *= 1/6
+    k *= deltaTime
+    k += y
+
+    if dense == True:
+        return k, HermiteInterpolant(derivative, y, k1, k, time, deltaTime)
+
+    return k
+
+class HermiteInterpolant():
+    '''
+    Continuous output of a fixed step: cubic Hermite interpolation between the states and
+    derivatives at both ends of the step (3rd order, C1 across steps). The derivative at the
+    end of the step is only evaluated when the interpolant is first used.
+    '''
+
+    def __init__(self, derivative, states0, deltaStates0, states1, time, deltaTime):
+        self.derivative   = derivative
+        self.states0      = states0.copy()
+        self.deltaStates0 = deltaStates0
+        self.states1      = states1.copy()
+        self.deltaStates1 = None
+        self.time         = time
+        self.deltaTime    = deltaTime
+
+    def __call__(self, time):
+        if self.deltaStates1 is None:
+            self.deltaStates1 = self.derivative(self.states1, self.time + self.deltaTime)
+        states, _ = hermiteInterpolate(self.states0, self.deltaStates0, self.states1, self.deltaStates1, self.deltaTime, (time - self.time)/self.deltaTime)
+        return states
+
+class Fleet():
+    '''
+    Batched dynamics of a list of spacecraft whose states are stacked into an (N, STATE_SIZE) array.
+    Per-spacecraft constants (area, inertia, model selections) are gathered once per time step.
+    '''
+
+    def __init__(self, system: LEOSS, spacecrafts: list):
+        self.system      = system
+        self.spacecrafts = spacecrafts
+
+        N = len(spacecrafts)
+        self.gravityTYPE    = np.array([ spacecraft.gravityTYPE for spacecraft in spacecrafts ])
+        self.atmosphereTYPE = np.array([ spacecraft.atmosphereTYPE for spacecraft in spacecrafts ])
+        self.thirdbodyTYPE  = np.array([ spacecraft.thirdbodyTYPE for spacecraft in spacecrafts ])
+        self.srpTYPE        = np.array([ spacecraft.srpTYPE for spacecraft in spacecrafts ])
+        self.shadowTYPE     = np.array([ spacecraft.shadowTYPE for spacecraft in spacecrafts ])
+        self.area = np.array([ meanArea(spacecraft.size) for spacecraft in spacecrafts ])
+        self.reflectivity   = np.array([ float(spacecraft.reflectivity) for spacecraft in spacecrafts ])
+        self.pressureCenter = np.array([ [spacecraft.pressureCenter.x, spacecraft.pressureCenter.y, spacecraft.pressureCenter.z] for spacecraft in spacecrafts ]).reshape(-1, 3)
+
+        # panel spacecraft take their drag and SRP from fleetPanels instead of the mean area
+        self.panels = [ i for i, spacecraft in enumerate(spacecrafts) if spacecraft.geometryTYPE == "PANELS" ]
+        self.area[self.panels] = 0.0
+        faces = [ spacecrafts[i].getfaces() for i in self.panels ]
+        F = max([ len(face) for face in faces ], default=0)
+        self.faceAreas   = np.zeros((len(faces), F))
+        self.faceNormals = np.zeros((len(faces), F, 3))
+        self.faceCenters = np.zeros((len(faces), F, 3))
+        for j, face in enumerate(faces):
+            self.faceAreas[j,:len(face)]   = face.areas
+            self.faceNormals[j,:len(face)] = face.normals
+            self.faceCenters[j,:len(face)] = face.centers
+
+        self.inertia = np.zeros((N,3,3))
+        self.inverseInertia = np.zeros((N,3,3))
+        for i, spacecraft in enumerate(spacecrafts):
+            self.inertia[i] = matrixToArray(spacecraft.getinertia())
+            if system.orbitPropOnly == False:
+                self.inverseInertia[i] = matrixToArray(spacecraft.getinverseInertia())
+
+        self.fallback = [ i for i, spacecraft in enumerate(spacecrafts) if spacecraft.needsFallback() ]
+        self.magnetic = [ i for i, spacecraft in enumerate(spacecrafts) if spacecraft.magnetfieldTYPE == "EARTH" ]
+        self.dipole   = np.array([ [spacecrafts[i].dipole.x, spacecrafts[i].dipole.y, spacecrafts[i].dipole.z] for i in self.magnetic ]).reshape(-1, 3)
+
+        self.netforce    = np.zeros((N,3))
+        self.nettorque   = np.zeros((N,3))
+        self.netmomentum = np.zeros((N,3))
+
+    def derivative(self, states, time):
+        deltaStates = self.orbitDerivative(states, time)
 
-def runggeKutta4(derivative, state, time, deltaTime):
-    k1 = derivative(state, time)
-    k2 = derivative(state + k1*deltaTime/2, time + deltaTime/2)
-    k3 = derivative(state + k2*deltaTime/2, time + deltaTime/2)
-    k4 = derivative(state + k3*deltaTime, time + deltaTime)
-    k  = (1/6)*(k1 + 2*k2 + 2*k3 + k4)*deltaTime
-    return state + k
+        if self.system.orbitPropOnly == False:
+            self.attitudeDerivative(states, time, deltaStates)
+        else:
+            # same as the default State() derivative of the per-spacecraft path
+            deltaStates[:,7] = 1.0
 
-def simulate(system: LEOSS, timeEnd, timeStep=1/32, orbitPropOnly = False):
+        return deltaStates
 
-    system.orbitPropOnly = orbitPropOnly
+    def orbitDerivative(self, states, time, deltaStates=None):
+        '''
+        Translational part of the derivative of the stacked states, the attitude derivatives left at zero.
+        Alone it is the orbit step of multi-rate integration.
+        '''
+        system = self.system
+
+        mass     = states[:,0]
+        position = states[:,1:4]
+        velocity = states[:,4:7]
+
+        if deltaStates is None:
+            deltaStates = np.zeros_like(states)
+        deltaStates[:,1:4] = velocity
+
+        force = fleetGravity(system, mass, position, self.gravityTYPE, time) \
+              + fleetAtmosphere(system, position, velocity, self.area, self.atmosphereTYPE) \
+              + fleetThirdBody(system, mass, position, time, self.thirdbodyTYPE)
+
+        # kept for attitudeDerivative on the same stage
+        self.solarPressure = fleetSolarPressure(system, position, self.area, self.reflectivity, self.srpTYPE, self.shadowTYPE)
+        self.surfaceTorque = np.zeros_like(position)
+        force += self.solarPressure
+
+        if len(self.panels) > 0:
+            rows = self.panels
+            panelForce, panelTorque = fleetPanels(system, states[rows], self.faceAreas, self.faceNormals, self.faceCenters,
+                                                  self.atmosphereTYPE[rows], self.srpTYPE[rows], self.shadowTYPE[rows], self.reflectivity[rows])
+            force[rows] += panelForce
+            self.surfaceTorque[rows] = panelTorque
+
+        deltaStates[:,4:7] = force/mass[:,None]
+
+        self.netforce = force
+        return deltaStates
+
+    def attitudeDerivative(self, states, time, deltaStates):
+        '''
+        Rotational part of the derivative of the stacked states, after orbitDerivative on the same stage.
+        The fallback force of a spacecraft is added to its velocity derivative.
+        '''
+        system = self.system
+
+        torque = self.surfaceTorque
+        rows = np.any(self.pressureCenter != 0, axis=1) & (self.srpTYPE != "NONE")
+        if rows.any():
+            body = np.einsum('nij,nj->ni', fleetRotationMatrix(states[rows,7:11]), self.solarPressure[rows])
+            torque[rows] += np.cross(self.pressureCenter[rows], body)
+        if len(self.magnetic) > 0:
+            torque[self.magnetic] += fleetMagneticTorque(system, states[self.magnetic], time, self.dipole)
+        for i in self.fallback:
+            extraforce, extratorque = self.spacecrafts[i].fallbackKinetics(State.fromarray(states[i]), time)
+            self.netforce[i] += (extraforce.x, extraforce.y, extraforce.z)
+            deltaStates[i,4:7] = self.netforce[i]/states[i,0]
+            torque[i] += (extratorque.x, extratorque.y, extratorque.z)
+
+        quaternion = states[:,7:11]
+        bodyrate   = states[:,11:14]
+        deltaStates[:,7:11] = fleetQuaternionDerivative(bodyrate, quaternion)
+
+        momentum = np.einsum('nij,nj->ni', self.inertia, bodyrate)
+        deltaStates[:,11:14] = np.einsum('nij,nj->ni', self.inverseInertia, torque - np.cross(bodyrate, momentum))
+
+        self.netmomentum = momentum
+        self.nettorque   = torque
+        return deltaStates
+
+def fleetGravity(system: LEOSS, mass, position, gravityTYPE, time=None):
+    force = np.zeros_like(position)
+
+    rows = gravityTYPE != "NONE"
+    if rows.any():
+        rho = np.sqrt(np.sum(position[rows]**2, axis=1))
+        force[rows] = -(system.mu*mass[rows]/(rho**3))[:,None]*position[rows]
+
+    rows = gravityTYPE == "J2"
+    if rows.any():
+        pos = position[rows]
+        r2  = np.sum(pos**2, axis=1)
+        k   = 1.5*system.J2*system.radi**2/r2
+        s   = 5*pos[:,2]**2/r2
+        force[rows] *= np.stack((1 + k*(1 - s), 1 + k*(1 - s), 1 + k*(3 - s)), axis=-1)
+
+    rows = gravityTYPE == "GEOPOTENTIAL"
+    if rows.any():
+        if time is None:
+            time = system.time
+        rotation = matrixToArray(system.geopotential.rotation(system, time))
+        perturbation = system.geopotential.acceleration(position[rows] @ rotation.T) @ rotation
+        force[rows] += mass[rows][:,None]*perturbation
+
+    return force
+
+def fleetThirdBody(system: LEOSS, mass, position, time, thirdbodyTYPE):
+    force = np.zeros_like(position)
+
+    rows = thirdbodyTYPE != "NONE"
+    if not rows.any():
+        return force
+
+    n = daysSinceJ2000(system, time)
+    thirdBody = system.thirdBody
+    for name, body, mu in (("SUN", thirdBody.sun, thirdBody.muSun), ("MOON", thirdBody.moon, thirdBody.muMoon)):
+        rows = (thirdbodyTYPE == name) | (thirdbodyTYPE == "SUNMOON")
+        if not rows.any():
+            continue
+        s = np.array(body.position(n))
+        d = s - position[rows]
+        d3 = np.sum(d**2, axis=1)**1.5
+        force[rows] += mass[rows][:,None]*mu*(d/d3[:,None] - s/np.sum(s**2)**1.5)
+
+    return force
+
+def fleetSolarPressure(system: LEOSS, position, area, reflectivity, srpTYPE, shadowTYPE):
+    force = np.zeros_like(position)
+
+    rows = srpTYPE != "NONE"
+    if not rows.any():
+        return force
+
+    sun = np.array([system.sunVector.x, system.sunVector.y, system.sunVector.z])
+    illumination = np.zeros(len(position))
+    for name in np.unique(shadowTYPE[rows]).tolist():
+        model = rows & (shadowTYPE == name)
+        illumination[model] = shadowFunctionArray(system, position[model], sun, name)
+
+    force[rows] = -(illumination*SOLAR_PRESSURE*reflectivity*area)[rows][:,None]*sun
+    return force
+
+def fleetPanels(system: LEOSS, states, areas, normals, centers, atmosphereTYPE, srpTYPE, shadowTYPE, reflectivity):
+    '''
+    Drag and SRP force (N, 3, inertial) and torque (N, 3, body) on (N, F) padded face tables, the batched systemPanels.
+    '''
+    position = states[:,1:4]
+    rotation = fleetRotationMatrix(states[:,7:11])
+    N = len(states)
+
+    wind = np.zeros((N,3)); windPressure = np.zeros(N)
+    rows = atmosphereTYPE != "NONE"
+    if rows.any():
+        pos   = position[rows]
+        p     = fleetDensity(system, pos, atmosphereTYPE[rows])
+        v_rel = states[rows,4:7] - np.cross(np.array([0.0, 0.0, 7.29211585e-05]), pos)
+        vr    = np.sqrt(np.sum(v_rel**2, axis=1))
+        wind[rows] = np.einsum('nij,nj->ni', rotation[rows], v_rel)/np.maximum(vr, 1e-300)[:,None]
+        windPressure[rows] = 0.5*p*2.2*vr*vr
+
+    sun = np.zeros((N,3)); sunPressure = np.zeros(N)
+    rows = srpTYPE != "NONE"
+    if rows.any():
+        vector = np.array([system.sunVector.x, system.sunVector.y, system.sunVector.z])
+        illumination = np.zeros(N)
+        for name in np.unique(shadowTYPE[rows]).tolist():
+            model = rows & (shadowTYPE == name)
+            illumination[model] = shadowFunctionArray(system, position[model], vector, name)
+        sun[rows] = rotation[rows] @ vector
+        sunPressure[rows] = (illumination*SOLAR_PRESSURE*reflectivity)[rows]
+
+    force, torque = panelKinetics(areas, normals, centers, wind, windPressure, sun, sunPressure)
+    return np.einsum('nji,nj->ni', rotation, force), torque
+
+def fleetDensity(system: LEOSS, position, atmosphereTYPE, times=None):
+    '''
+    Densities (N,) at (N, 3) positions, each with its model of ATMOSPHERE_MODELS,
+    the space weather models at times (N,) or the current time.
+    '''
+    z = (np.sqrt(np.sum(position**2, axis=1)) - system.radi)/1000
+
+    p = np.zeros(len(z))
+    for name in np.unique(atmosphereTYPE).tolist():
+        model = atmosphereTYPE == name
+        if name in ACTIVITY_MODELS:
+            if times is None:
+                f107, ap = system.spaceWeather.indices(daysSinceJ2000(system, system.time))
+            else:
+                f107, ap = system.spaceWeather.indicesArray(daysSinceJ2000(system, np.asarray(times, dtype=float)[model]))
+            p[model] = ATMOSPHERE_MODELS[name](z[model], f107, ap)
+        else:
+            p[model] = ATMOSPHERE_MODELS[name](z[model])
+    return p
+
+def fleetAtmosphere(system: LEOSS, position, velocity, area, atmosphereTYPE, times=None):
+    force = np.zeros_like(position)
+
+    rows = atmosphereTYPE != "NONE"
+    if not rows.any():
+        return force
+
+    pos = position[rows]
+    p   = fleetDensity(system, pos, atmosphereTYPE[rows], None if times is None else np.asarray(times, dtype=float)[rows])
+
+    D = 2.2
+    w = np.array([0.0, 0.0, 7.29211585e-05])
+
+    v_rel = velocity[rows] - np.cross(w, pos)
+    vr    = np.sqrt(np.sum(v_rel**2, axis=1))
+
+    force[rows] = (-0.5*p*D*area[rows]*vr)[:,None]*v_rel
+    return force
+
+def fleetMagneticTorque(system: LEOSS, states, time, dipole):
+    _, inertial = systemMagneticFieldArray(system, states[:,1:4], time)
+    body = np.einsum('nij,nj->ni', fleetRotationMatrix(states[:,7:11]), inertial)
+    return np.cross(dipole, body)
+
+def fleetRotationMatrix(quat):
+    '''
+    (N, 3, 3) arrays of Quaternion.toMatrix for (N, 4) quaternions.
+    '''
+    w = quat[:,0]; x = quat[:,1]; y = quat[:,2]; z = quat[:,3]
+    matrix = np.empty((len(quat), 3, 3))
+    matrix[:,0,0] = 1 - 2*(y**2 + z**2)
+    matrix[:,1,0] = 2*x*y - 2*w*z
+    matrix[:,2,0] = 2*w*y + 2*x*z
+    matrix[:,0,1] = 2*x*y + 2*w*z
+    matrix[:,1,1] = 1 - 2*(x**2+z**2)
+    matrix[:,2,1] = -2*w*x + 2*y*z
+    matrix[:,0,2] = -2*w*y + 2*x*z
+    matrix[:,1,2] = 2*w*x + 2*y*z
+    matrix[:,2,2] = 1 - 2*(x**2 + y**2)
+    return matrix
+
+def fleetQuaternionDerivative(omega, quat):
+    ox = omega[:,0]; oy = omega[:,1]; oz = omega[:,2]
+    qw = quat[:,0]; qx = quat[:,1]; qy = quat[:,2]; qz = quat[:,3]
+    qdot = np.empty_like(quat)
+    qdot[:,0] = (- ox*qx - oy*qy - oz*qz)/2
+    qdot[:,1] = (ox*qw + oz*qy - oy*qz)/2
+    qdot[:,2] = (oy*qw - oz*qx + ox*qz)/2
+    qdot[:,3] = (oz*qw + oy*qx - ox*qy)/2
+    return qdot
+
+DP45_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1, 1])
+
+DP45_A = [ [],
+           [1/5],
+           [3/40, 9/40],
+           [44/45, -56/15, 32/9],
+           [19372/6561, -25360/2187, 64448/6561, -212/729],
+           [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+           [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84] ]
+
+DP45_E = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40])
+
+def dormandPrince45(derivative, states, time, deltaTime, k1=None, dense=False):
+    '''
+    One Dormand-Prince 5(4) step of the stacked states.
+    Returns the 5th order solution, the last stage (derivative at the new states, FSAL)
+    and the embedded error estimate, followed by the continuous interpolant of the step if dense.
+    '''
+    if k1 is None:
+        k1 = derivative(states, time)
+
+    k = [k1]
+    stage = np.empty_like(states)
+    for i in range(1, 7):
+        np.copyto(stage, states)
+        for j, a in enumerate(DP45_A[i]):
+            if a != 0:
+                stage += (deltaTime*a)*k[j]
+        if i == 6:
+            newstates = stage.copy()
+        k.append(derivative(stage, time + DP45_C[i]*deltaTime))
+
+    error = np.zeros_like(states)
+    for j, e in enumerate(DP45_E):
+        if e != 0:
+            error += (deltaTime*e)*k[j]
+
+    if dense == True:
+        return newstates, k[6], error, DormandPrinceInterpolant(states, newstates, k, time, deltaTime)
+
+    return newstates, k[6], error
+
+# coefficients of the 4th order continuous extension of Dormand-Prince 5(4) (Hairer, Norsett & Wanner)
+DP45_D = (-12715105075/11282082432, 0.0, 87487479700/32700410799, -10690763975/1880347072,
+          701980252875/199316789632, -1453857185/822651844, 69997945/29380423)
+
+class DormandPrinceInterpolant():
+    '''
+    Native dense output of a Dormand-Prince 5(4) step, a 4th order polynomial in the
+    step fraction built from the seven stages without further derivative evaluations.
+    '''
+
+    def __init__(self, states0, states1, k, time, deltaTime):
+        self.states0   = states0.copy()
+        self.states1   = states1.copy()
+        self.k         = k
+        self.time      = time
+        self.deltaTime = deltaTime
+        self.rcont     = None
+
+    def coefficients(self):
+        h = self.deltaTime
+        rcont2 = self.states1 - self.states0
+        rcont3 = h*self.k[0] - rcont2
+        rcont4 = rcont2 - h*self.k[6] - rcont3
+        rcont5 = np.zeros_like(self.states0)
+        for j, d in enumerate(DP45_D):
+            if d != 0:
+                rcont5 += (h*d)*self.k[j]
+        return rcont2, rcont3, rcont4, rcont5
+
+    def __call__(self, time):
+        if self.rcont is None:
+            self.rcont = self.coefficients()
+        rcont2, rcont3, rcont4, rcont5 = self.rcont
+
+        s  = (time - self.time)/self.deltaTime
+        s1 = 1.0 - s
+        return self.states0 + s*(rcont2 + s1*(rcont3 + s*(rcont4 + s1*rcont5)))
+
+class DormandPrince():
+    '''
+    Adaptive step integration of a LEOSS system with the Dormand-Prince 5(4) pair.
+    The step is controlled on the stacked states of all spacecraft with the mixed error test
+        |error| <= atol + rtol*|state|
+    and the last stage of an accepted step is reused as the first stage of the next one (FSAL).
+    Recorders are updated every outputStep seconds (or on their own schedule, see Recorder.setOutput)
+    from the dense output of the steps, so the step size is free of the output instants.
+    Each output sample evaluates the derivative once for its kinetics, so the output step defaults to
+    defaultOutputStep rather than the initial step, which would cost more evaluations than the integration.
+    '''
+    defaultOutputStep = 1.0
+
+    def __init__(self, system: LEOSS, timeStep, outputStep=None, rtol=1e-8, atol=1e-6, maxStep=math.inf, minStep=1e-9):
+        self.system     = system
+        self.step       = timeStep
+        self.outputStep = outputStep if outputStep != None else self.defaultOutputStep
+        self.rtol       = rtol
+        self.atol       = atol
+        self.maxStep    = maxStep
+        self.minStep    = minStep
+
+        self.outputTime0 = system.time
+        self.outputCount = 0
+        self.k1 = None
+
+        self.accepted = 0
+        self.rejected = 0
+        self.evaluations = 0
+
+    def nextOutput(self):
+        return self.outputTime0 + self.outputCount*self.outputStep
+
+    def advance(self, timeEnd):
+        system = self.system
+        spacecrafts = system.numericalSpacecraft()
+        if len(spacecrafts) == 0:
+            system.time = timeEnd
+            return
+
+        system.sunVector, system.sunLocation = systemSun(system)
+
+        for spacecraft in spacecrafts:
+            unixTime = spacecraft.unixTime
+            system.updateEnvironment(spacecraft, system.time)
+            spacecraft.updateUnixTime()
+            if spacecraft.unixTime != unixTime:
+                # components were updated, the derivative is not the one of the last stage anymore
+                self.k1 = None
+
+        time = system.time
+        target = timeEnd
+
+        derivative, fleet = system.stackedDerivative()
+        states = system.stackStates()
+        if self.k1 is None:
+            self.k1 = derivative(states, time)
+            self.evaluations = self.evaluations + 1
+
+        while True:
+            deltaTime = min(self.step, target - time)
+            newstates, k7, error, interpolant = dormandPrince45(derivative, states, time, deltaTime, self.k1, dense=True)
+            self.evaluations = self.evaluations + 6
+
+            scale = self.atol + self.rtol*np.maximum(np.abs(states), np.abs(newstates))
+            errorNorm = np.max(np.abs(error)/scale)
+
+            if errorNorm <= 1.0:
+                break
+
+            self.rejected = self.rejected + 1
+            if deltaTime <= self.minStep:
+                raise RuntimeError(f"Step size fell below {self.minStep} s at t = {time} s")
+            self.step = max(deltaTime*max(0.2, 0.9*errorNorm**-0.2), self.minStep)
+
+        self.accepted = self.accepted + 1
+        factor = 5.0 if errorNorm == 0 else min(5.0, max(0.2, 0.9*errorNorm**-0.2))
+        if deltaTime < self.step:
+            # shortened to land on the end time, keep the controller's step
+            self.step = min(max(self.step, deltaTime*factor), self.maxStep)
+        else:
+            self.step = min(deltaTime*factor, self.maxStep)
+
+        time1 = target if deltaTime == target - time else time + deltaTime
+
+        outputs = []
+        while self.nextOutput() < time1 - 1e-9*max(1.0, abs(time1)):
+            outputs.append(self.nextOutput())
+            self.outputCount = self.outputCount + 1
+
+        system.commitStates(newstates, fleet, record=False)
+        # quaternion renormalisation only moves the state by the truncation error, k7 stays valid
+        self.k1 = k7
+
+        for i, spacecraft in enumerate(spacecrafts):
+            recorder = system.recorderObjects[spacecraft.name]
+            times = recorder.dueTimes(time, time1) if recorder.scheduled() else outputs
+            system.recordDense(spacecraft, interpolant, times, i)
 
-    while system.time < timeEnd:
-        system.advance1timestep(timeStep)
+        system.time = time1
 
-def simulateProgress(system: LEOSS, timeEnd, timeStep=1/32, orbitPropOnly = False):
+def simulate(system: LEOSS, timeEnd, timeStep=1/32, orbitPropOnly = False, integrator='rk4', rtol=1e-8, atol=1e-6, outputStep=None, orbitStep=1.0):
 
     system.orbitPropOnly = orbitPropOnly
 
-    print("\nRun Simulation (from "+str(system.time)+" to "+str(timeEnd)+", step="+str(timeStep)+")")
+    if integrator not in ('rk4', 'rk45', 'multirate'):
+        raise ValueError("Integrator should be either 'rk4', 'rk45' or 'multirate'")
+
+    day0, day1 = daysSinceJ2000(system, system.time), daysSinceJ2000(system, timeEnd)
+    system.sunEphemeris.prepare(day0, day1)
+    if any(spacecraft.thirdbodyTYPE != "NONE" for spacecraft in system.spacecraftObjects):
+        system.thirdBody.prepare(day0, day1)
+    recordStep = timeStep
+    if integrator == 'rk45':
+        recordStep = outputStep if outputStep != None else DormandPrince.defaultOutputStep
+    for recorder in system.recorderObjects.values():
+        recorder.reserve(system.time, timeEnd, recordStep)
+
+    if orbitPropOnly == True:
+        system.propagateAnalytic(timeEnd, recordStep)
+        if len(system.numericalSpacecraft()) == 0:
+            system.time = max(system.time, timeEnd)
+
+    if integrator == 'rk4':
+        while system.time < timeEnd:
+            system.advance1timestep(timeStep)
+    elif integrator == 'rk45':
+        stepper = DormandPrince(system, timeStep, outputStep, rtol, atol)
+        while system.time < timeEnd:
+            stepper.advance(timeEnd)
+    elif integrator == 'multirate':
+        while system.time < timeEnd:
+            system.advanceMultirate(min(orbitStep, timeEnd - system.time), timeStep)
+
+def simulateProgress(system: LEOSS, timeEnd, timeStep=1/32, orbitPropOnly = False, integrator='rk4', rtol=1e-8, atol=1e-6, outputStep=None, orbitStep=1.0):
+
+    system.orbitPropOnly = orbitPropOnly
+
+    if integrator not in ('rk4', 'rk45', 'multirate'):
+        raise ValueError("Integrator should be either 'rk4', 'rk45' or 'multirate'")
+
+    day0, day1 = daysSinceJ2000(system, system.time), daysSinceJ2000(system, timeEnd)
+    system.sunEphemeris.prepare(day0, day1)
+    if any(spacecraft.thirdbodyTYPE != "NONE" for spacecraft in system.spacecraftObjects):
+        system.thirdBody.prepare(day0, day1)
+    recordStep = timeStep
+    if integrator == 'rk45':
+        recordStep = outputStep if outputStep != None else DormandPrince.defaultOutputStep
+    for recorder in system.recorderObjects.values():
+        recorder.reserve(system.time, timeEnd, recordStep)
+
+    if integrator == 'rk4':
+        print("\nRun Simulation (from "+str(system.time)+" to "+str(timeEnd)+", step="+str(timeStep)+")")
+        advance = lambda: system.advance1timestep(timeStep)
+    elif integrator == 'rk45':
+        stepper = DormandPrince(system, timeStep, outputStep, rtol, atol)
+        print("\nRun Simulation (from "+str(system.time)+" to "+str(timeEnd)+", rk45, rtol="+str(rtol)+", atol="+str(atol)+", output="+str(stepper.outputStep)+")")
+        advance = lambda: stepper.advance(timeEnd)
+    elif integrator == 'multirate':
+        print("\nRun Simulation (from "+str(system.time)+" to "+str(timeEnd)+", step="+str(timeStep)+", orbit step="+str(orbitStep)+")")
+        advance = lambda: system.advanceMultirate(min(orbitStep, timeEnd - system.time), timeStep)
+
     t0 = clock.time()
 
+    if orbitPropOnly == True:
+        system.propagateAnalytic(timeEnd, recordStep)
+        if len(system.numericalSpacecraft()) == 0:
+            system.time = max(system.time, timeEnd)
+
     pbar = tqdm(total=timeEnd-system.time, position=0, desc='Simulating', bar_format='{l_bar}{bar:25}{r_bar}{bar:-25b}')
     
     while(system.time < timeEnd):
         prev_time = system.time
-        system.advance1timestep(timeStep)        
+        advance()
         pbar.update(system.time - prev_time)
     pbar.close()
 
@@ -1378,20 +5455,53 @@ def PRVtoQuaternion(PRV: Vector, Angle, unit='deg'):
         raise ValueError("Unit should be either in 'deg' or 'rad'")
     
 def quaternionDerivative(omega: Vector, quat: Quaternion):
-    qdotW =       0*quat.w - omega.x*quat.x - omega.y*quat.y - omega.z*quat.z
-    qdotX = omega.x*quat.w +       0*quat.x + omega.z*quat.y - omega.y*quat.z
-    qdotY = omega.y*quat.w - omega.z*quat.x +       0*quat.y + omega.x*quat.z
-    qdotZ = omega.z*quat.w + omega.y*quat.x - omega.x*quat.y +       0*quat.z
-    return Quaternion( qdotW/2, qdotX/2, qdotY/2, qdotZ/2 )
+    # halving omega first is exact and saves the four divisions; the zero terms are dropped
+    ox = 0.5*omega.x; oy = 0.5*omega.y; oz = 0.5*omega.z
+    qw = quat.w; qx = quat.x; qy = quat.y; qz = quat.z
+    return Quaternion( -ox*qx - oy*qy - oz*qz,
+                        ox*qw + oz*qy - oy*qz,
+                        oy*qw - oz*qx + ox*qz,
+                        oz*qw + oy*qx - ox*qy )
 
 def rectbodyInertia(size: Vector, mass):
     Lx = size.x
     Ly = size.y
     Lz = size.z
-    x = Vector(Ly**2+Lz**2, 0, 0)
-    y = Vector(0, Lx**2+Lz**2, 0)
-    z = Vector(0, 0, Lx**2+Ly**2)
-    return (mass/12.0) * Matrix(x,y,z)
+    k = mass/12.0
+    return Matrix.fromcomponents((Ly**2+Lz**2)*k, 0*k, 0*k,
+                                 0*k, (Lx**2+Lz**2)*k, 0*k,
+                                 0*k, 0*k, (Lx**2+Ly**2)*k)
+
+def meanArea(size: Vector):
+    return ( size.x*size.y + size.x*size.z + size.y*size.z ) / 3
+
+def matrixToArray(matrix: Matrix):
+    return np.array([[matrix.xx, matrix.yx, matrix.zx],
+                     [matrix.xy, matrix.yy, matrix.zy],
+                     [matrix.xz, matrix.yz, matrix.zz]])
+
+def lerp(a, b, s):
+    return a + (b - a)*s
+
+def hermiteInterpolate(position0, velocity0, position1, velocity1, deltaTime, s):
+    '''
+    Cubic Hermite interpolation of a position and velocity pair over a step deltaTime, s in [0, 1].
+    '''
+    s2 = s*s
+    s3 = s2*s
+    h00 = 2*s3 - 3*s2 + 1
+    h10 = s3 - 2*s2 + s
+    h01 = -2*s3 + 3*s2
+    h11 = s3 - s2
+    d00 = 6*s2 - 6*s
+    d10 = 3*s2 - 4*s + 1
+    d01 = -6*s2 + 6*s
+    d11 = 3*s2 - 2*s
+
+    position = position0*h00 + velocity0*(h10*deltaTime) + position1*h01 + velocity1*(h11*deltaTime)
+    velocity = (position0*d00 + position1*d01)/deltaTime + velocity0*d10 + velocity1*d11
+
+    return position, velocity
 
 def hamiltonProduct(q1: Quaternion, q2: Quaternion):
 
@@ -1403,17 +5513,7 @@ def hamiltonProduct(q1: Quaternion, q2: Quaternion):
     return Quaternion(W, X, Y, Z)
 
 def magnetometer_function(spacecraft: Spacecraft, args):
-    location = spacecraft.location
-    magfield = IGRF.igrf_value(location[0], location[1], location[2], spacecraft.system.datenow().year)[3:6]
-    magfield_NED_vector = Vector(magfield[0], magfield[1], magfield[2]) * 1e-9
-
-    position = spacecraft.state.position
-    R = position.magnitude()
-    theta = math.acos(position.z/R)
-    psi   = math.atan2(position.y, position.x)
-    RPY = Vector(0, (theta+math.pi)*R2D, psi*R2D)
-
-    magfield_inertial_vector = RPY.RPY_toYPR_quaternion().toMatrix().transpose()*magfield_NED_vector
+    magfield_inertial_vector = spacecraft.getEnvironment().magneticField
 
     quaternion = spacecraft.state.quaternion
     magfield_body_vector = quaternion.toMatrix()*magfield_inertial_vector
@@ -1422,20 +5522,21 @@ def magnetometer_function(spacecraft: Spacecraft, args):
 
 def bdotcontroller_function(spacecraft: Spacecraft, args):
     magfield_body_vector0 = Vector(0,0,0)
-    time0 = spacecraft.system.datetime0
+    time0 = 0.0
 
     control_moment = Vector(0,0,0)
 
-    if len(spacecraft.recorder['ideal_MTM']) > 2:
-        magfield_body_vector0 = spacecraft.recorder['ideal_MTM'][-1]
-        time0 = spacecraft.recorder['Datetime'][-1]
+    # the previous update, whether the recorder kept it or not
+    if spacecraft.recorder.seen('ideal_MTM') > 2:
+        magfield_body_vector0 = spacecraft.recorder.latest('ideal_MTM')
+        time0 = spacecraft.recorder.latestTime
 
-    if len(spacecraft.recorder['ideal_MTM']) > 1:
+    if spacecraft.recorder.seen('ideal_MTM') > 1:
         magfield_body_vector = spacecraft['ideal_MTM']
-        time = spacecraft.system.datenow()
+        time = spacecraft.system.time
         
         delta_magfield_body_vector = magfield_body_vector - magfield_body_vector0
-        delta_time = (time - time0).total_seconds()
+        delta_time = time - time0
 
         control_moment = -args[0] * (delta_magfield_body_vector/delta_time)
 
@@ -1454,6 +5555,11 @@ def sunsensor_function(spacecraft: Spacecraft, args):
     quaternion = spacecraft.state.quaternion
     sun_body_vector = quaternion.toMatrix() * spacecraft['Sunvector']
 
+    # no sun in the Earth's shadow, a dimmed one in penumbra
+    illumination = spacecraft.getillumination()
+    if illumination < 1.0:
+        sun_body_vector = illumination*sun_body_vector
+
     return sun_body_vector
 
 def LVLHqerror_function(spacecraft: Spacecraft, args):
@@ -1470,23 +5576,24 @@ def LVLHqerror_function(spacecraft: Spacecraft, args):
 
 def nadircontroller_function(spacecraft: Spacecraft, args):
     control_torques = Vector(0, 0, 0)
-    if len(spacecraft.recorder['State']) > 1:
+    if spacecraft.recorder.seen('State') > 1:
         qError = LVLHqerror_function(spacecraft, args)
 
+        state0 = spacecraft.recorder.latest('State')
         rate = spacecraft.state.velocity.magnitude()/spacecraft.state.position.magnitude()
-        rate0 = spacecraft.recorder['State'][-1].velocity.magnitude() / spacecraft.recorder['State'][-1].position.magnitude()
+        rate0 = state0.velocity.magnitude() / state0.position.magnitude()
 
-        time = spacecraft.system.datenow()
-        time0 = spacecraft.recorder['Datetime'][-1]
+        time = spacecraft.system.time
+        time0 = spacecraft.recorder.latestTime
 
         wRef = Vector(0, -1*rate, 0)
         wRef0 = Vector(0, -1*rate0, 0)
-        DwRef = (wRef - wRef0) / (time - time0).total_seconds()
+        DwRef = (wRef - wRef0) / (time - time0)
         w = spacecraft.state.bodyrate
         wError = w - wRef
 
         MRP = Vector(qError.x, qError.y, qError.z) / (1 + qError.w)
-        I = spacecraft.inertia
+        I = spacecraft.getinertia()
 
         if MRP.magnitude()**2 > 1:
             MRP = -1 * MRP / (MRP.magnitude()**2)
@@ -1502,18 +5609,13 @@ def elevationsensor_function(spacecraft: Spacecraft, args):
 
     station = args[0]
     system = spacecraft.system
-    gmst_ = system.gmst + system.time*(360.98564724)/(24*3600) 
+    gmst_ = spacecraft.getEnvironment().gmst
 
     latitude  = station.latitude
     longitude = station.longitude
     altitude  = station.altitude
 
-    longitude = longitude + gmst_
-
-    if longitude < 0:
-        longitude = (((longitude/360) - int(longitude/360)) * 360) + 360    
-    if longitude > 180:
-        longitude = -360 + longitude
+    longitude = wrapLongitude(longitude + gmst_)
 
     x = math.cos(longitude*D2R)*math.cos(latitude*D2R)
     y = math.sin(longitude*D2R)*math.cos(latitude*D2R)
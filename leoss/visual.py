@@ -25,13 +25,33 @@ from cartopy.geodesic import Geodesic
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 
 
+def recordedColumns(recorder: Recorder, items=None, sample: int = 0):
+    '''
+    Float columns of Recorder.to_arrays, every sample-th sample and the last one when sample > 0.
+    '''
+    arrays = recorder.to_arrays(items)
+    if sample > 0:
+        length = len(arrays['t'])
+        rows = np.append(np.arange(0, length, sample), length-1)
+        arrays = { name : column[rows] for name, column in arrays.items() }
+    return arrays
+
+def columnVectors(arrays, x, y, z, scale=1.0):
+    return [ Vector(*values) for values in zip((arrays[x]*scale).tolist(), (arrays[y]*scale).tolist(), (arrays[z]*scale).tolist()) ]
+
+def columnQuaternions(arrays, w, x, y, z):
+    return [ Quaternion(*values) for values in zip(arrays[w].tolist(), arrays[x].tolist(), arrays[y].tolist(), arrays[z].tolist()) ]
+
+def columnDatetimes(system: LEOSS, arrays):
+    return [ system.datetime0 + datetime.timedelta(seconds=time) for time in arrays['t'].tolist() ]
+
 def visual_check():
     s = LEOSS()
     return s
 
 def animatedAttitudeTrack(recorder: Recorder, sample: int = 0, saveas: str = "mp4", dpi: int = 300, frameRef: str = 'Inertial'):
 
-    df = pd.DataFrame.from_dict(recorder.dataDict)
+    arrays = recordedColumns(recorder, ['State'], sample)
 
     spacecraft = recorder.attachedTo
     system = spacecraft.system
@@ -42,21 +62,12 @@ def animatedAttitudeTrack(recorder: Recorder, sample: int = 0, saveas: str = "mp
 
     ratio = max(spacecraft.size)/min(spacecraft.size)
 
-    if sample > 0:
-        df1 = df.iloc[::sample,:]   
-        df2 = df.iloc[df.index[-1]:,:]
-        df1 = pd.concat([df1, df2], ignore_index=True, axis=0)
-    
-    elif sample == 0:
-        df1 = df
-
-    States      = [ item for item in df1['State'].values.tolist()[:] ]
-    Positions   = [ item.position for item in df1['State'].values.tolist()[:] ]
-    Velocities  = [ item.velocity for item in df1['State'].values.tolist()[:] ]
-    Quaternions = [ item.quaternion for item in df1['State'].values.tolist()[:] ]
-    Bodyrates   = [ item.bodyrate*R2D for item in df1['State'].values.tolist()[:] ]
-    Datetimes   = [ item for item in df1['Datetime'] ][:]
-    Times       = [ (item - system.datetime0).total_seconds() for item in df1['Datetime'][:] ]
+    Positions   = columnVectors(arrays, 'x', 'y', 'z')
+    Velocities  = columnVectors(arrays, 'xdot', 'ydot', 'zdot')
+    Quaternions = columnQuaternions(arrays, 'q0', 'q1', 'q2', 'q3')
+    Bodyrates   = columnVectors(arrays, 'p', 'q', 'r', R2D)
+    Datetimes   = columnDatetimes(system, arrays)
+    Times       = arrays['t'].tolist()
 
     fig = plt.figure(figsize=(18,9))
     fig.tight_layout()
@@ -68,13 +79,13 @@ def animatedAttitudeTrack(recorder: Recorder, sample: int = 0, saveas: str = "mp
     ax6 = fig.add_subplot(2,4,5, projection='3d')
     ax7 = fig.add_subplot(2,4,6, projection='3d')
 
-    QuatW = [ q.w for q in Quaternions ]
-    QuatX = [ q.x for q in Quaternions ]
-    QuatY = [ q.y for q in Quaternions ]
-    QuatZ = [ q.z for q in Quaternions ]
-    RateX = [ r.x for r in Bodyrates ]
-    RateY = [ r.y for r in Bodyrates ]
-    RateZ = [ r.z for r in Bodyrates ]
+    QuatW = arrays['q0'].tolist()
+    QuatX = arrays['q1'].tolist()
+    QuatY = arrays['q2'].tolist()
+    QuatZ = arrays['q3'].tolist()
+    RateX = (arrays['p']*R2D).tolist()
+    RateY = (arrays['q']*R2D).tolist()
+    RateZ = (arrays['r']*R2D).tolist()
 
     Eulers = [ q.YPR_toRPY_vector() for q in Quaternions ]
     Roll  = [ item.x*R2D for item in Eulers ]
@@ -176,7 +187,7 @@ def animatedAttitudeTrack(recorder: Recorder, sample: int = 0, saveas: str = "mp
         xaxis = Vector(1,0,0)
         yaxis = Vector(0,1,0)
         zaxis = Vector(0,0,1)
-        maxis = Matrices[frame] * spacecraft.inertia*Bodyrates[frame]
+        maxis = Matrices[frame] * spacecraft.getinertia()*Bodyrates[frame]
 
         Rotation = Matrices[frame]
         maxisLine = maxis.normalize() * ratio * 2
@@ -386,7 +397,7 @@ def sliderAttitudeTrack(recorder: Recorder, frameRef: str = 'Inertial'):
     global frame
     frame = 0
 
-    df = pd.DataFrame.from_dict(recorder.dataDict)
+    arrays = recorder.to_arrays(['State'])
 
     spacecraft = recorder.attachedTo
     system = spacecraft.system
@@ -397,13 +408,12 @@ def sliderAttitudeTrack(recorder: Recorder, frameRef: str = 'Inertial'):
 
     ratio = max(spacecraft.size)/min(spacecraft.size)
 
-    States      = [ item for item in df['State'].values.tolist()[:] ]
-    Positions   = [ item.position for item in df['State'].values.tolist()[:] ]
-    Velocities  = [ item.velocity for item in df['State'].values.tolist()[:] ]
-    Quaternions = [ item.quaternion for item in df['State'].values.tolist()[:] ]
-    Bodyrates   = [ item.bodyrate*R2D for item in df['State'].values.tolist()[:] ]
-    Datetimes   = [ item for item in df['Datetime'] ][:]
-    Times       = [ (item - system.datetime0).total_seconds() for item in df['Datetime'][:] ]
+    Positions   = columnVectors(arrays, 'x', 'y', 'z')
+    Velocities  = columnVectors(arrays, 'xdot', 'ydot', 'zdot')
+    Quaternions = columnQuaternions(arrays, 'q0', 'q1', 'q2', 'q3')
+    Bodyrates   = columnVectors(arrays, 'p', 'q', 'r', R2D)
+    Datetimes   = columnDatetimes(system, arrays)
+    Times       = arrays['t'].tolist()
 
     fig = plt.figure(figsize=(18,9))
     fig.tight_layout()
@@ -415,13 +425,13 @@ def sliderAttitudeTrack(recorder: Recorder, frameRef: str = 'Inertial'):
     ax6 = fig.add_subplot(2,4,5, projection='3d')
     ax7 = fig.add_subplot(2,4,6, projection='3d')
 
-    QuatW = [ q.w for q in Quaternions ]
-    QuatX = [ q.x for q in Quaternions ]
-    QuatY = [ q.y for q in Quaternions ]
-    QuatZ = [ q.z for q in Quaternions ]
-    RateX = [ r.x for r in Bodyrates ]
-    RateY = [ r.y for r in Bodyrates ]
-    RateZ = [ r.z for r in Bodyrates ]
+    QuatW = arrays['q0'].tolist()
+    QuatX = arrays['q1'].tolist()
+    QuatY = arrays['q2'].tolist()
+    QuatZ = arrays['q3'].tolist()
+    RateX = (arrays['p']*R2D).tolist()
+    RateY = (arrays['q']*R2D).tolist()
+    RateZ = (arrays['r']*R2D).tolist()
 
     Eulers = [ q.YPR_toRPY_vector() for q in Quaternions ]
     Roll  = [ item.x*R2D for item in Eulers ]
@@ -523,7 +533,7 @@ def sliderAttitudeTrack(recorder: Recorder, frameRef: str = 'Inertial'):
         xaxis = Vector(1,0,0)
         yaxis = Vector(0,1,0)
         zaxis = Vector(0,0,1)
-        maxis = Matrices[frame] * spacecraft.inertia*Bodyrates[frame]
+        maxis = Matrices[frame] * spacecraft.getinertia()*Bodyrates[frame]
 
         Rotation = Matrices[frame]
         maxisLine = maxis.normalize() * ratio * 2
@@ -749,28 +759,26 @@ def sliderAttitudeTrack(recorder: Recorder, frameRef: str = 'Inertial'):
 
 def attitudeTrack(recorder: Recorder):
 
-    df = pd.DataFrame.from_dict(recorder.dataDict)
+    arrays = recorder.to_arrays(['State'])
 
     spacecraft = recorder.attachedTo
     system     = spacecraft.system
 
-    Quaternions = [ item.quaternion for item in df['State'].values.tolist()[:] ]
-    Bodyrates   = [ item.bodyrate*R2D for item in df['State'].values.tolist()[:] ]
-    Datetimes   = [ item for item in df['Datetime'] ][:]
-    Times       = [ (item - system.datetime0).total_seconds() for item in df['Datetime'][:] ]
+    Quaternions = columnQuaternions(arrays, 'q0', 'q1', 'q2', 'q3')
+    Times       = arrays['t'].tolist()
 
     fig = plt.figure(figsize=(12,6))
     ax1 = fig.add_subplot(3,1,1)
     ax2 = fig.add_subplot(3,1,2)
     ax3 = fig.add_subplot(3,1,3)
 
-    QuatW = [ q.w for q in Quaternions ]
-    QuatX = [ q.x for q in Quaternions ]
-    QuatY = [ q.y for q in Quaternions ]
-    QuatZ = [ q.z for q in Quaternions ]
-    RateX = [ r.x for r in Bodyrates ]
-    RateY = [ r.y for r in Bodyrates ]
-    RateZ = [ r.z for r in Bodyrates ]
+    QuatW = arrays['q0'].tolist()
+    QuatX = arrays['q1'].tolist()
+    QuatY = arrays['q2'].tolist()
+    QuatZ = arrays['q3'].tolist()
+    RateX = (arrays['p']*R2D).tolist()
+    RateY = (arrays['q']*R2D).tolist()
+    RateZ = (arrays['r']*R2D).tolist()
 
     Eulers = [ q.YPR_toRPY_vector() for q in Quaternions ]
     Roll  = [ item.x*R2D for item in Eulers ]
@@ -801,26 +809,22 @@ def attitudeTrack(recorder: Recorder):
     ax3.set_title(f'Euler Angles (deg)', fontsize=10)
     ax3.set_xlabel("Time (s)")
 
-    plt.suptitle(f'{spacecraft.name}\n{Datetimes[-1]}', fontname='monospace')
+    plt.suptitle(f'{spacecraft.name}\n{system.datetime0 + datetime.timedelta(seconds=Times[-1])}', fontname='monospace')
     plt.subplots_adjust(hspace=0.4)   
     plt.show()
 
 def groundTrack(recorder: Recorder, dateTime = -1):
 
-    # get datadict from recorder as dataframe
-    df = pd.DataFrame.from_dict(recorder.dataDict)
-
     # variable for spacecraft and system
     spacecraft = recorder.attachedTo
     system     = spacecraft.system
 
-    # split data columns from recorder into components
-    SunLocation = [ item for item in df['Sunlocation'].values.tolist()[:] ]
-    Latitudes  = [ item[0] for item in df['Location'].values.tolist()[:] ]
-    Longitudes = [ item[1] for item in df['Location'].values.tolist()[:] ]
-    Altitudes  = [ item[2] for item in df['Location'].values.tolist()[:] ]
-    Datetimes  = [ item for item in df['Datetime'] ][:]
-    Times      = [ (item - system.datetime0).total_seconds() for item in df['Datetime'][:] ]
+    # split data columns from recorder into components, kept as float arrays
+    arrays = recorder.to_arrays(['Geodetic'])
+    Times      = arrays['t']
+    Latitudes  = arrays['lat']
+    Longitudes = arrays['lon']
+    Altitudes  = arrays['alt']
 
     # initialize figure and projection 
     fig = plt.figure(figsize=(12, 6))
@@ -863,7 +867,7 @@ def groundTrack(recorder: Recorder, dateTime = -1):
     # replace datetime input as a datetime object, from int or float
     currentTime = 0
     if isinstance(dateTime, datetime.datetime):
-        delta = (Datetimes[1] - Datetimes[0]).total_seconds()
+        delta = Times[1] - Times[0]
         currentTime = (dateTime - system.datetime0).total_seconds() - delta
     elif isinstance(dateTime, int) or isinstance(dateTime, float):
         if dateTime > Times[0] and dateTime <= Times[-1]:
@@ -878,17 +882,20 @@ def groundTrack(recorder: Recorder, dateTime = -1):
     plt.suptitle(f'{spacecraft.name}\n{dateTime}')
 
     # set the visibility of the track to only show the track from start time to the input time
-    plot.set_alpha([ item<=currentTime for item in Times])
+    alpha = np.zeros(len(Times))
+    alpha[recorder.between(Times[0], currentTime)] = 1
+    plot.set_alpha(alpha)
 
     # show the nightshade transition on the global map
     ax.add_feature(Nightshade(dateTime, alpha=0.3))
 
     # create a spot on the current location given the time
-    index = Times.index(currentTime)
+    index = recorder.nearest(currentTime)
     spot, = ax.plot(Longitudes[index], Latitudes[index] , marker='o', color='white', markersize=12,
             alpha=0.5, transform=ccrs.PlateCarree(), zorder=3.0)
     
-    sun, = ax.plot(SunLocation[index].y, SunLocation[index].x , marker='o', color='yellow', markersize=12,
+    SunLocation = recorder['Sunlocation'][index]
+    sun, = ax.plot(SunLocation.y, SunLocation.x , marker='o', color='yellow', markersize=12,
         alpha=1.0, transform=ccrs.PlateCarree(), zorder=3.0)
 
     
@@ -909,8 +916,8 @@ def groundTrack(recorder: Recorder, dateTime = -1):
 
 def passTrack(recorder: Recorder, groundstation: GroundStation, dateTime = -1):
 
-    # get datadict from recorder as dataframe
-    df = pd.DataFrame.from_dict(recorder.dataDict)
+    # get the float columns from recorder
+    arrays = recorder.to_arrays(['State', 'Sunlocation', 'Geodetic'])
 
     # variable for spacecraft and system
     spacecraft = recorder.attachedTo
@@ -918,13 +925,13 @@ def passTrack(recorder: Recorder, groundstation: GroundStation, dateTime = -1):
     station    = groundstation
 
     # split data columns from recorder into components
-    SunLocation = [ item for item in df['Sunlocation'].values.tolist()[:] ]
-    Positions   = [ item.position for item in df['State'].values.tolist()[:] ]
-    Latitudes   = [ item[0] for item in df['Location'].values.tolist()[:] ]
-    Longitudes  = [ item[1] for item in df['Location'].values.tolist()[:] ]
-    Altitudes   = [ item[2] for item in df['Location'].values.tolist()[:] ]
-    Datetimes   = [ item for item in df['Datetime'] ][:]
-    Times       = [ (item - system.datetime0).total_seconds() for item in df['Datetime'][:] ]
+    SunLocation = columnVectors(arrays, 'Sunlocation.x', 'Sunlocation.y', 'Sunlocation.z')
+    Positions   = columnVectors(arrays, 'x', 'y', 'z')
+    Latitudes   = arrays['lat'].tolist()
+    Longitudes  = arrays['lon'].tolist()
+    Altitudes   = arrays['alt'].tolist()
+    Datetimes   = columnDatetimes(system, arrays)
+    Times       = arrays['t'].tolist()
 
     Passes = []
     passing = False
@@ -935,18 +942,13 @@ def passTrack(recorder: Recorder, groundstation: GroundStation, dateTime = -1):
     for index in np.arange(0, len(Positions), 1):
         position = Positions[index]
         time = Times[index]
-        gmst_ = system.gmst + time*(360.98564724)/(24*3600) 
+        gmst_ = siderealAngle(system, time)
 
         latitude  = station.latitude
         longitude = station.longitude
         altitude  = station.altitude
 
-        longitude = longitude + gmst_
-
-        if longitude < 0:
-            longitude = (((longitude/360) - int(longitude/360)) * 360) + 360    
-        if longitude > 180:
-            longitude = -360 + longitude
+        longitude = wrapLongitude(longitude + gmst_)
 
         x = math.cos(longitude*D2R)*math.cos(latitude*D2R)
         y = math.sin(longitude*D2R)*math.cos(latitude*D2R)
@@ -1045,7 +1047,9 @@ def passTrack(recorder: Recorder, groundstation: GroundStation, dateTime = -1):
     startpass = (currentpass.AOS - system.datetime0).total_seconds()
     tcapass = (currentpass.TCA - system.datetime0).total_seconds()
     endpass = (currentpass.LOS - system.datetime0).total_seconds()
-    plot.set_alpha( [item>=startpass and item<=endpass for item in Times ])
+    alpha = np.zeros(len(Times))
+    alpha[recorder.between(startpass, endpass)] = 1
+    plot.set_alpha(alpha)
 
     # create a super title with name of spacecraft and datetime
     plt.suptitle(f'{spacecraft.name}\n{currentpass.TCA}')
@@ -1054,9 +1058,9 @@ def passTrack(recorder: Recorder, groundstation: GroundStation, dateTime = -1):
     passTrack.ns = ax.add_feature(Nightshade(currentpass.TCA, alpha=0.3))
 
     # create a spot on the current location given the time
-    startIndex = Times.index(startpass)
-    endIndex   = Times.index(endpass)
-    tcaIndex   = Times.index(tcapass)
+    startIndex = recorder.nearest(startpass)
+    endIndex   = recorder.nearest(endpass)
+    tcaIndex   = recorder.nearest(tcapass)
 
     # A = 1 + math.tan(station.min_elevation*D2R)**2
     # B = 2 * system.radi * math.tan(station.min_elevation*D2R)
@@ -1137,16 +1141,18 @@ def passTrack(recorder: Recorder, groundstation: GroundStation, dateTime = -1):
             startpass = (currentpass.AOS - system.datetime0).total_seconds()
             tcapass = (currentpass.TCA - system.datetime0).total_seconds()
             endpass = (currentpass.LOS - system.datetime0).total_seconds()
-            plot.set_alpha( [item>=startpass and item<=endpass for item in Times ])
+            alpha = np.zeros(len(Times))
+            alpha[recorder.between(startpass, endpass)] = 1
+            plot.set_alpha(alpha)
             plt.suptitle(f'{spacecraft.name}\n{currentpass.TCA}')
             passTrack.ns.set_visible(False)
             passTrack.ns = ax.add_feature(Nightshade(currentpass.TCA, alpha=0.3))
 
             ax.set_title(f'Pass #{self.ind+1}/{len(Passes)}, Ground Radius: {text_radius} km.')
 
-            startIndex = Times.index(startpass)
-            endIndex   = Times.index(endpass)
-            tcaIndex   = Times.index(tcapass)
+            startIndex = recorder.nearest(startpass)
+            endIndex   = recorder.nearest(endpass)
+            tcaIndex   = recorder.nearest(tcapass)
 
             startSpot.set_data([Longitudes[startIndex], Latitudes[startIndex]])
             tcaSpot.set_data([Longitudes[tcaIndex], Latitudes[tcaIndex]])
@@ -1184,16 +1190,18 @@ def passTrack(recorder: Recorder, groundstation: GroundStation, dateTime = -1):
             startpass = (currentpass.AOS - system.datetime0).total_seconds()
             tcapass = (currentpass.TCA - system.datetime0).total_seconds()
             endpass = (currentpass.LOS - system.datetime0).total_seconds()
-            plot.set_alpha( [item>=startpass and item<=endpass for item in Times ])
+            alpha = np.zeros(len(Times))
+            alpha[recorder.between(startpass, endpass)] = 1
+            plot.set_alpha(alpha)
             plt.suptitle(f'{spacecraft.name}\n{currentpass.TCA}')
             passTrack.ns.set_visible(False)
             passTrack.ns = ax.add_feature(Nightshade(currentpass.TCA, alpha=0.3))
             
             ax.set_title(f'Pass #{self.ind+1}/{len(Passes)}, Ground Radius: {text_radius} km.')
 
-            startIndex = Times.index(startpass)
-            endIndex   = Times.index(endpass)
-            tcaIndex   = Times.index(tcapass)
+            startIndex = recorder.nearest(startpass)
+            endIndex   = recorder.nearest(endpass)
+            tcaIndex   = recorder.nearest(tcapass)
 
             startSpot.set_data([Longitudes[startIndex], Latitudes[startIndex]])
             tcaSpot.set_data([Longitudes[tcaIndex], Latitudes[tcaIndex]])
@@ -1236,28 +1244,20 @@ def passTrack(recorder: Recorder, groundstation: GroundStation, dateTime = -1):
 
 def animatedGroundTrack(recorder: Recorder, sample: int = 0, saveas: str = 'mp4', dpi: int = 300):
 
-    # get datadict from recorder as dataframe
-    df = pd.DataFrame.from_dict(recorder.dataDict)
+    # get the float columns from recorder
+    arrays = recordedColumns(recorder, ['Sunlocation', 'Geodetic'], sample)
 
     # variable for spacecraft and system
     spacecraft = recorder.attachedTo
     system     = spacecraft.system
 
-    if sample > 0:
-        df1 = df.iloc[::sample,:]   
-        df2 = df.iloc[df.index[-1]:,:]
-        df1 = pd.concat([df1, df2], ignore_index=True, axis=0)
-        
-    elif sample == 0:
-        df1 = df
-
     # split data columns from recorder into components
-    SunLocation = [ item for item in df1['Sunlocation'].values.tolist()[:] ]
-    Latitudes  = [ item[0] for item in df1['Location'].values.tolist()[:] ]
-    Longitudes = [ item[1] for item in df1['Location'].values.tolist()[:] ]
-    Altitudes  = [ item[2] for item in df1['Location'].values.tolist()[:] ]
-    Datetimes  = [ item for item in df1['Datetime'] ][:]
-    Times      = [ (item - system.datetime0).total_seconds() for item in df1['Datetime'][:] ]
+    SunLocation = columnVectors(arrays, 'Sunlocation.x', 'Sunlocation.y', 'Sunlocation.z')
+    Latitudes  = arrays['lat'].tolist()
+    Longitudes = arrays['lon'].tolist()
+    Altitudes  = arrays['alt'].tolist()
+    Datetimes  = columnDatetimes(system, arrays)
+    Times      = arrays['t'].tolist()
 
     # initialize figure and projection 
     fig = plt.figure(figsize=(12, 6))
@@ -1354,25 +1354,18 @@ def animatedGroundTrack(recorder: Recorder, sample: int = 0, saveas: str = 'mp4'
     plt.close()
 
 def sensorTrack(recorder: Recorder, sensor: str):
-        
-    df = pd.DataFrame.from_dict(recorder.dataDict)
 
     spacecraft = recorder.attachedTo
     system     = spacecraft.system
 
-    df['Position']  = [ item.position for item in df['State'].values.tolist()[:] ]
-    df['Velocity']  = [ item.velocity for item in df['State'].values.tolist()[:] ]
-    df['Quaternion'] = [ item.quaternion for item in df['State'].values.tolist()[:] ]
-    df['Bodyrate']  = [ item.bodyrate for item in df['State'].values.tolist()[:] ]
-
-    SensorData = [ item for item in df[sensor].values.tolist()[:] ]
-    Datetimes  = [ item for item in df['Datetime'] ][:]
-    Times      = [ (item - system.datetime0).total_seconds() for item in df['Datetime'][:] ]
-
-    SensorX = [ item.x for item in SensorData ]
-    SensorY = [ item.y for item in SensorData ]
-    SensorZ = [ item.z for item in SensorData ]
-    SensorM = [ item.magnitude() for item in SensorData ]
+    # read the sensor data from the recorder chunk by chunk into float arrays, the plot holds all of them
+    blocks  = [ (np.array(times), np.array(values)) for times, values in recorder.chunks(sensor) ]
+    Times   = np.concatenate([ times for times, values in blocks ])
+    values  = np.concatenate([ values for times, values in blocks ])
+    SensorX = values[:,0]
+    SensorY = values[:,1]
+    SensorZ = values[:,2]
+    SensorM = np.linalg.norm(values, axis=1)
 
     fig = plt.figure(figsize=(12,6))
     ax1 = fig.add_subplot(2,2,1)
@@ -1398,7 +1391,7 @@ def sensorTrack(recorder: Recorder, sensor: str):
     ax2.set_xlabel("Time (s)")
     ax4.set_xlabel("Time (s)")
 
-    plt.suptitle(f'{spacecraft.name}: {sensor}\n{Datetimes[-1]}', fontname='monospace')
+    plt.suptitle(f'{spacecraft.name}: {sensor}\n{system.datetime0 + datetime.timedelta(seconds=Times[-1])}', fontname='monospace')
     plt.subplots_adjust(hspace=0.4)  
 
     cursor1 = Cursor(ax1, horizOn=True, vertOn=True, useblit=True, color='gray',linewidth=1, linestyle='--')
@@ -1426,24 +1419,23 @@ def sensorTrack(recorder: Recorder, sensor: str):
 
     def axesToAnnot(axes):
         if axes == ax1:
-            return annot1, SensorX
+            return annot1, lambda values: values[0]
         if axes == ax2:
-            return annot2, SensorY
+            return annot2, lambda values: values[1]
         if axes == ax3:
-            return annot3, SensorZ
+            return annot3, lambda values: values[2]
         if axes == ax4:
-            return annot4, SensorM
+            return annot4, lambda values: np.linalg.norm(values)
 
     def onclick(event):
         if event.button == 1 and event.inaxes != None:
             x = event.xdata
-            if x < 0:
-                x = 0
+            if x < Times[0]:
+                x = Times[0]
 
             annot, func = axesToAnnot(event.inaxes)
-            filtered = [ time for time in Times if time <= x ]
-            closestX = filtered[-1]
-            closestY = func[Times.index(closestX)]
+            closestX = float(recorder.timesOf(sensor).nearest(x)[0])
+            closestY = float(func(recorder[sensor].nearest(x)))
 
             annot.xy = (closestX, closestY)    
             text = "(" + str( '%.2F'% closestX) + ", " + str( '%+.4E' % closestY) +")"
@@ -1464,38 +1456,25 @@ def sensorTrack(recorder: Recorder, sensor: str):
 
 def animatedSensorTrack(recorder: Recorder, sensor: str, sample: int = 0, saveas: str = 'mp4', dpi: int = 300):
 
-    # get datadict from recorder as dataframe
-    df = pd.DataFrame.from_dict(recorder.dataDict)
+    # get the float columns from recorder
+    arrays = recordedColumns(recorder, ['Sunlocation', sensor, 'Geodetic'], sample)
 
     # variable for spacecraft and system
     spacecraft = recorder.attachedTo
     system     = spacecraft.system
 
-    df['Position']  = [ item.position for item in df['State'].values.tolist()[:] ]
-    df['Velocity']  = [ item.velocity for item in df['State'].values.tolist()[:] ]
-    df['Quaternion'] = [ item.quaternion for item in df['State'].values.tolist()[:] ]
-    df['Bodyrate']  = [ item.bodyrate for item in df['State'].values.tolist()[:] ]
-
-    if sample > 0:
-        df1 = df.iloc[::sample,:]   
-        df2 = df.iloc[df.index[-1]:,:]
-        df1 = pd.concat([df1, df2], ignore_index=True, axis=0)
-
-    elif sample == 0:
-        df1 = df
-
     # split data columns from recorder into components
-    SunLocation = [ item for item in df1['Sunlocation'].values.tolist()[:] ]
-    SensorData = [ item for item in df1[sensor].values.tolist()[:] ]
-    Latitudes  = [ item[0] for item in df1['Location'].values.tolist()[:] ]
-    Longitudes = [ item[1] for item in df1['Location'].values.tolist()[:] ]
-    Altitudes  = [ item[2] for item in df1['Location'].values.tolist()[:] ]
-    Datetimes  = [ item for item in df1['Datetime'] ][:]
-    Times      = [ (item - system.datetime0).total_seconds() for item in df1['Datetime'][:] ]
-
-    SensorX = [ item.x for item in SensorData ]
-    SensorY = [ item.y for item in SensorData ]
-    SensorZ = [ item.z for item in SensorData ]
+    SunLocation = columnVectors(arrays, 'Sunlocation.x', 'Sunlocation.y', 'Sunlocation.z')
+    SensorData = columnVectors(arrays, sensor+'.x', sensor+'.y', sensor+'.z')
+    Latitudes  = arrays['lat'].tolist()
+    Longitudes = arrays['lon'].tolist()
+    Altitudes  = arrays['alt'].tolist()
+    Datetimes  = columnDatetimes(system, arrays)
+    Times      = arrays['t'].tolist()
+
+    SensorX = arrays[sensor+'.x'].tolist()
+    SensorY = arrays[sensor+'.y'].tolist()
+    SensorZ = arrays[sensor+'.z'].tolist()
 
     # initialize figure and projection 
     # plt.style.use("seaborn-v0_8")
@@ -1629,58 +1608,32 @@ def animatedSensorTrack(recorder: Recorder, sensor: str, sample: int = 0, saveas
 
 def export(recorder: Recorder, tStart: int = 0, tEnd: int = -1, filename='data'):
 
-    n      = 4
-    method = 'linear'
-    order  = 5
-
-    df = pd.DataFrame.from_dict(recorder.dataDict)
-
-    spacecraft = recorder.attachedTo
-    system = spacecraft.system
+    n = 4
 
-    Positions   = [ item.position for item in df['State'].values.tolist()[:] ]
-    Velocities  = [ item.velocity for item in df['State'].values.tolist()[:] ]
-    Quaternions = [ item.quaternion for item in df['State'].values.tolist()[:] ]
-    Bodyrates   = [ item.bodyrate for item in df['State'].values.tolist()[:] ]
-    Datetimes   = [ item for item in df['Datetime'] ][:]
-    Times       = [ (item - system.datetime0).total_seconds() for item in df['Datetime'][:] ]
+    columns = ['t', 'x', 'y', 'z', 'xdot', 'ydot', 'zdot', 'q0', 'q1', 'q2', 'q3', 'p', 'q', 'r']
 
     if tEnd < 0:
-        tEnd = Times[-1]
-
-    out = pd.DataFrame()
-
-    out['t'] = pd.DataFrame( Times )
-    out['x'] = pd.DataFrame( [ item.x for item in Positions ] )
-    out['y'] = pd.DataFrame( [ item.y for item in Positions ] )
-    out['z'] = pd.DataFrame( [ item.z for item in Positions ] )
-    out['xdot'] = pd.DataFrame( [ item.x for item in Velocities ] )
-    out['ydot'] = pd.DataFrame( [ item.y for item in Velocities ] )
-    out['zdot'] = pd.DataFrame( [ item.z for item in Velocities ] )
-    out['q0'] = pd.DataFrame( [ item.w for item in Quaternions ] )
-    out['q1'] = pd.DataFrame( [ item.x for item in Quaternions ] )
-    out['q2'] = pd.DataFrame( [ item.y for item in Quaternions ] )
-    out['q3'] = pd.DataFrame( [ item.z for item in Quaternions ] )
-    out['p'] = pd.DataFrame( [ item.x for item in Bodyrates ] )
-    out['q'] = pd.DataFrame( [ item.y for item in Bodyrates ] )
-    out['r'] = pd.DataFrame( [ item.z for item in Bodyrates ] )
-    
-    outcopy = out.copy()
-
-    new_index = outcopy.index
-    new_out = outcopy.copy()
-
-    new_out['index'] = new_index*n
-    new_out = new_out.set_index('index')
-
-    new_index2 = pd.RangeIndex(start=0, stop=(len(new_index)*n)-(n-1), step=1)
-    new_out = new_out.reindex(new_index2)
-
-    new_out = new_out.interpolate(method=method, order=order)
-    
-    clipped_out = new_out[new_out['t']>=tStart]
-    clipped_out = clipped_out[clipped_out['t']<=tEnd]
-    
-    clipped_out.to_csv(filename+".csv",index=False)
+        tEnd = recorder.times[-1]
+
+    # linear interpolation of n-1 samples between the recorded ones, written chunk by chunk
+    # with the last sample of a chunk carried over to the next one
+    header = True
+    previous = None
+    with open(filename+".csv", 'w', newline='') as file:
+        for times, states in recorder.chunks('State'):
+            block = np.column_stack((times, states[:,1:STATE_SIZE]))
+            if previous is not None:
+                block = np.vstack((previous, block))
+            index = np.arange((len(block)-1)*n + 1)/n
+            new_out = np.column_stack([ np.interp(index, np.arange(len(block)), column) for column in block.T ])
+            if previous is not None:
+                new_out = new_out[1:]
+            previous = block[-1:]
+
+            clipped_out = pd.DataFrame(new_out, columns=columns)
+            clipped_out = clipped_out[clipped_out['t']>=tStart]
+            clipped_out = clipped_out[clipped_out['t']<=tEnd]
+            clipped_out.to_csv(file, index=False, header=header)
+            header = False
 
     print("\n\t"+"Filename: "+filename+".csv EXPORTED!")
\ No newline at end of file
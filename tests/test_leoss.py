@@ -1,6 +1,138 @@
+import os
+
 from leoss import __version__
 from leoss import *
 
+POSITION = 1e3*Vector(4395.079058029986, 3631.5889348004957, -3712.575674067216)
+VELOCITY = 1e3*Vector(-5.76886641743168, 2.5823185921356733, -4.310210403510053)
+
+def newSystem(count=1, fleetMode=False, mass=4, size=(0.1,0.1,0.3), bodyrate=None, dipole=None, recordList=[]):
+    '''
+    LEOSS system at the test epoch with count spacecraft on the DIWATA orbit,
+    named "DIWATA" when alone and "SAT-<i>" otherwise.
+    '''
+    system = LEOSS()
+    system.epoch(2023,9,26,3,11,18,0)
+    system.setFleetMode(fleetMode)
+    for i in range(count):
+        system.addSpacecraft("DIWATA" if count == 1 else f"SAT-{i}", recordList)
+        system[i].setmass(mass)
+        system[i].setsize(Vector(*size))
+        system[i].setposition(POSITION)
+        system[i].setvelocity(VELOCITY)
+        if bodyrate is not None:
+            system[i].setbodyrate(Vector(*bodyrate))
+        if dipole is not None:
+            system[i].magnetfieldTYPE = "EARTH"
+            system[i].dipole = Vector(*dipole)
+    return system
+
+def simulatePair(build, timeEnd, timeStep=1/32, **options):
+    '''
+    The system of build(fleetMode) simulated per spacecraft and in fleet mode.
+    '''
+    single, fleet = build(False), build(True)
+    simulate(single, timeEnd, timeStep, **options)
+    simulate(fleet, timeEnd, timeStep, **options)
+    return single, fleet
+
+def mixedFleet(fleetMode):
+    system = newSystem(3, fleetMode, size=(0.1,0.2,0.3))
+    for i in range(3):
+        system[i].setmass(50+i)
+        system[i].setposition(POSITION + Vector(1e3*i,0,0))
+        system[i].setbodyrate(Vector(5,-4,3+i))
+        system[i].setorientation(Vector(10,20,30))
+    system[0].setAtmosphereModel("US76")
+    system[1].setAtmosphereModel("CIRA12")
+    system[2].magnetfieldTYPE = "EARTH"
+    system[2].dipole = Vector(0.1,0,0)
+    return system
+
+def magneticSystem(model):
+    system = newSystem(bodyrate=(5,-4,3), dipole=(0.05,0.02,0.01))
+    system.setMagneticFieldModel(model)
+    return system
+
+def inertiaSystem(fleetMode, tensor):
+    system = newSystem(2, fleetMode, size=(0.1,0.2,0.3), bodyrate=(5,-4,3))
+    for i in range(2):
+        system[i].setposition(POSITION + Vector(1e5*i,0,0))
+        if tensor is not None:
+            system[i].setinertia(tensor)
+    return system
+
+def srpSystem(fleetMode):
+    system = newSystem(3, fleetMode, recordList=["Illumination"])
+    for spacecraft, srpTYPE in zip(system.spacecraftObjects, ["NONE", "CANNONBALL", "CANNONBALL"]):
+        spacecraft.setposition(-1*POSITION)
+        spacecraft.setvelocity(-1*VELOCITY)
+        spacecraft.setSRPModel(srpTYPE)
+    system[2].setShadowModel("CYLINDRICAL")
+    system[2].setpressureCenter(Vector(0.0, 0.0, 0.05))
+    return system
+
+def panelSystem(fleetMode):
+    system = newSystem(3, fleetMode)
+    for spacecraft, geometryTYPE in zip(system.spacecraftObjects, ["MEANAREA", "PANELS", "PANELS"]):
+        spacecraft.setposition(-1*POSITION)
+        spacecraft.setvelocity(-1*VELOCITY)
+        spacecraft.setorientation(Vector(20,30,40))
+        spacecraft.setAtmosphereModel("US76")
+        spacecraft.setSRPModel("CANNONBALL")
+        spacecraft.setGeometryModel(geometryTYPE)
+    box = system[2].getfaces()
+    system[2].setfaces(FaceTable(box.areas.tolist() + [0.06], box.normals.tolist() + [[0,1,0]], box.centers.tolist() + [[0,0.2,0]]))
+    return system
+
+def spaceWeatherFiles(folder):
+    history  = os.path.join(folder, "SW-history.csv")
+    forecast = os.path.join(folder, "SW-forecast.csv")
+    with open(history, "w") as file:
+        file.write("DATE,BSRN,AP_AVG,F10.7_OBS\n")
+        file.write("2023-09-25,2591,10,150.0\n")
+        file.write("2023-09-26,2591,40,\n")
+        file.write("2023-09-28,2591,5,120.0\n")
+    with open(forecast, "w") as file:
+        file.write("DATE,F10.7,AP\n")
+        file.write("2023-09-28,999.0,999\n")
+        file.write("2023-09-30,200.0,80\n")
+    return history, forecast
+
+def recordedSystem():
+    system = newSystem(recordList=["Illumination"])
+    magnetometer = Sensor("MTM")
+    magnetometer.setMethod(magnetometer_function)
+    magnetometer.power = True
+    system[0].addSensor(magnetometer)
+    simulate(system, 10, 1/4)
+    return system, magnetometer
+
+def detumbledRecorder(policy):
+    system = newSystem(bodyrate=(5,-5,5))
+    spacecraft = system[0]
+    spacecraft.magnetfieldTYPE = "EARTH"
+    for component, add in ((ideal_magnetometer, spacecraft.addSensor), (ideal_bdotcontroller, spacecraft.addController), (ideal_magnetorquer, spacecraft.addActuator)):
+        component.power = True
+        add(component)
+    system.getRecorders()["DIWATA"].setPolicy(policy)
+    simulate(system, 20, 1/4)
+    for component in (ideal_magnetometer, ideal_bdotcontroller, ideal_magnetorquer):
+        component.power = False
+    return system.getRecorders()["DIWATA"], spacecraft.state.bodyrate
+
+def streamedRecorder(sink):
+    system = newSystem()
+    recorder = system.getRecorders()["DIWATA"]
+    recorder.setSink(sink)
+    simulate(system, 250, 1)
+    gyroscope = Sensor("GYRO")
+    gyroscope.setMethod(lambda spacecraft, args: spacecraft.state.bodyrate)
+    gyroscope.power = True
+    system[0].addSensor(gyroscope)
+    simulate(system, 500, 1)
+    return recorder
+
 
 def test_version():
     assert __version__ == "0.2.20"
@@ -395,12 +527,12 @@ def test_14():
     assert str(datetime0) == '2023-09-26 03:11:18.031250'
     assert statedata0.position == Vector(4394898.778238248, 3631669.6300121024, -3712710.365847866)
     assert statedata0.velocity == Vector(-5769.040252603422, 2582.1749501580102, -4310.063557192801)
-    assert location0 == Vector(-33.23762159989866, -12.932703716557796, 431.80805538907555)
+    assert location0 == Vector(-33.23762161392392, -12.932703716557796, 431.8080553890765)
     assert netforce0 == Vector(-278.11913958517897, -229.83480648340282, 234.9668751720585)
     assert str(datetimef) == '2023-09-26 03:53:16.968750'
     assert statedataf.position == Vector(-5725429.518467132, -2767128.121674426, 2382521.4362371108)
     assert statedataf.velocity == Vector(4028.4864460075523, -3694.449056195037, 5373.066456593324)
-    assert locationf == Vector(20.658246279489802, 142.76949414474478, 415.2313183538606)
+    assert locationf == Vector(20.658246299374547, 142.76949414474478, 415.2313183538626)
     assert netforcef == Vector(364.382790906085, 176.1192072581338, -151.64453269308962) 
 
 def test_15():
@@ -600,6 +732,9 @@ def test_17():
     spacecraft["DIWATA"].addSensor(gyroscope)
     spacecraft["DIWATA"].addSensor(gps)
 
+    gyroscope.power = True
+    gps.power       = True
+
     sensors = spacecraft["DIWATA"].getSensors()
 
     assert sensors['gyro'] == gyroscope
@@ -611,10 +746,1738 @@ def test_17():
 
     time = 60
 
-    simulate(system, time)
+    simulate(system, time, 1)
 
     assert recorder["DIWATA"]['State'][-1].bodyrate == sensors['gyro'].data
     assert recorder["DIWATA"]['Location'][-1] == sensors['gps'].data
     assert recorder['DIWATA']['gps'][-1] == sensors['gps'].data
     assert recorder['DIWATA']['gps'][-1] == sensors['gps'].data
     assert recorder['DIWATA']['State'][1].bodyrate == recorder['DIWATA']['gyro'][1]
+
+def test_18():
+    '''
+    Test array-backed State Class Implementation.
+    array attribute -- one contiguous float64 buffer of STATE_SIZE values
+    position, velocity, quaternion and bodyrate are views into the buffer
+    assigning a field detaches the view handed out before
+    State arithmetic operates on the buffer and matches the element wise results
+    runggeKutta4 -- in place stage updates give the same step as the State arithmetic
+    '''
+    state = State(4.5, Vector(100,60,80), Vector(5,3,4), Quaternion(1,0,0,0), Vector(0.1,0.2,0.3))
+
+    assert len(state.array) == STATE_SIZE
+    assert list(state.array) == [4.5, 100, 60, 80, 5, 3, 4, 1, 0, 0, 0, 0.1, 0.2, 0.3]
+
+    position = state.position
+    position.x = 7
+    assert state.array[1] == 7
+    state.position = Vector(1,2,3)
+    assert position == Vector(7,60,80)
+    position.x = 8
+    assert state.position == Vector(1,2,3)
+
+    state.quaternion.w = 0.5
+    assert state.array[7] == 0.5
+    quaternion = state.quaternion
+    state.normalizeQuaternion()
+    assert quaternion.w == 0.5
+
+    other = state.copy()
+    other.velocity = Vector(0,0,0)
+    assert state.velocity == Vector(5,3,4)
+
+    assert (state + other).velocity == Vector(5,3,4)
+    assert (2 * state).position == Vector(2,4,6)
+    assert (state / 2).mass == 2.25
+
+    def derivative(state, time):
+        deltaState = State()
+        deltaState.position = state.velocity
+        deltaState.velocity = -1 * state.position
+        return deltaState
+
+    deltaTime = 0.1
+    k1 = derivative(state, 0)
+    k2 = derivative(state + k1*deltaTime/2, deltaTime/2)
+    k3 = derivative(state + k2*deltaTime/2, deltaTime/2)
+    k4 = derivative(state + k3*deltaTime, deltaTime)
+    expected = state + (1/6)*(k1 + 2*k2 + 2*k3 + k4)*deltaTime
+
+    assert list(runggeKutta4(derivative, state, 0, deltaTime).array) == list(expected.array)
+
+def test_19():
+    '''
+    Test compact Vector, Quaternion and Matrix Implementations.
+    __slots__ -- no per instance __dict__
+    in place operators __iadd__, __isub__, __imul__, __itruediv__
+    rotate_into -- rotate a Vector into an existing output Vector
+    direct 3x3 kernels match the column vector definitions
+    '''
+    a = Vector(1,2,3)
+    assert not hasattr(a, '__dict__')
+    assert not hasattr(Quaternion(), '__dict__')
+    assert not hasattr(Matrix(), '__dict__')
+
+    b = a
+    a += Vector(1,1,1)
+    assert b is a and a == Vector(2,3,4)
+    a -= Vector(2,2,2)
+    assert a == Vector(0,1,2)
+    a *= 2
+    assert a == Vector(0,2,4)
+    a /= 2
+    assert a == Vector(0,1,2)
+
+    q = Quaternion(1,0,3,2)
+    q *= 2
+    assert str(q) == 'Quaternion(2, 0, 6, 4)'
+
+    M = Matrix(x=Vector(5,1,2), y=Vector(1,3,2), z=Vector(1,2,4))
+    assert M.x == Vector(5,1,2)
+    assert M.transpose().x == Vector(5,1,1)
+    assert (M * M.inverse()).trace() - 3 <= 1e-12
+
+    out = Vector()
+    assert M.rotate_into(Vector(1,1,1), out) is out
+    assert out == M * Vector(1,1,1)
+
+    Q = PRVtoQuaternion(Vector(0,0,1), 90)
+    assert Q.rotate_into(Vector(1,0,0), out) is out
+    assert (out - Vector(0,1,0)).magnitude() <= 1e-8
+    assert (Q.toMatrix().transpose() * Vector(1,0,0) - out).magnitude() <= 1e-8
+
+def test_20():
+    '''
+    Test fleet mode of the LEOSS class.
+    setFleetMode method -- the magnetic disturbance is batched and no spacecraft needs the fallback hook
+    '''
+    fleet = mixedFleet(True)
+    assert not fleet[2].needsFallback()
+    assert not fleet[0].needsFallback()
+
+def test_21():
+    '''
+    Test fleet mode of the LEOSS class.
+    setFleetMode method -- integrate all spacecraft together as one stacked state array
+    verify that the batched gravity, drag and attitude dynamics match the per-spacecraft path
+    '''
+    single, fleet = simulatePair(mixedFleet, 5, 1/8)
+
+    assert fleet.time == single.time
+    for i in range(3):
+        assert (fleet[i].getposition() - single[i].getposition()).magnitude() <= 1e-6
+        assert (fleet[i].getvelocity() - single[i].getvelocity()).magnitude() <= 1e-9
+        assert (fleet[i].state.bodyrate - single[i].state.bodyrate).magnitude() <= 1e-12
+        assert fleet[i].state.quaternion == single[i].state.quaternion
+        assert (fleet[i].netforce - single[i].netforce).magnitude() <= 1e-9
+    assert (fleet[2].nettorque - single[2].nettorque).magnitude() <= 1e-15
+    assert len(fleet.getRecorders()["SAT-0"]["State"]) == len(single.getRecorders()["SAT-0"]["State"])
+
+def test_22():
+    '''
+    Test adaptive step simulation.
+    DormandPrince class -- Dormand-Prince 5(4) with rtol and atol error control
+    verify that the specific mechanical energy and orbit specific angular momentum is conserved
+    verify that the recorders are fed at the requested output cadence
+    '''
+    system = LEOSS()
+    system.epoch(2023,1,1)
+
+    system.addSpacecraft("DIWATA-1")
+    system[0].setmass(4.00)
+    system[0].setsize(Vector(0.1,0.1,0.1))
+    system[0].setposition(Vector(-3398.36655479e3, 2536.91064491e3,  5312.67851581e3 ))
+    system[0].setvelocity(Vector(-5.05043202e3, -5.73213209e3, -0.49795572e3))
+
+    pos0 = system[0].state.position
+    vel0 = system[0].state.velocity
+    h0   = pos0.cross(vel0).magnitude()
+    xi0  = (vel0.magnitude()**2)/2 - ( system.mu/pos0.magnitude() )
+
+    stepper = DormandPrince(system, timeStep=4, outputStep=60, rtol=1e-10, atol=1e-6)
+    while system.time < 6000:
+        stepper.advance(6000)
+
+    pos1 = system[0].state.position
+    vel1 = system[0].state.velocity
+    h1   = pos1.cross(vel1).magnitude()
+    xi1  = (vel1.magnitude()**2)/2 - ( system.mu/pos1.magnitude() )
+
+    assert system.time == 6000
+    assert abs(h1-h0)/h0 < 1e-9
+    assert abs(xi1-xi0)/abs(xi0) < 1e-9
+    assert stepper.accepted < 6000/4
+    assert len(system.getRecorders()["DIWATA-1"]["Datetime"]) == 100
+    assert system.getRecorders()["DIWATA-1"]["Datetime"][1] == datetime.datetime(2023,1,1,0,1,0)
+
+def test_23():
+    '''
+    Test adaptive step simulation.
+    simulate method with integrator='rk45' -- the attitude dynamics follow the fixed step RK4 solution
+    verify that the default output step takes fewer derivative evaluations than fixed step RK4
+    '''
+    fixed    = newSystem(size=(0.1,0.2,0.3), bodyrate=(5,-4,3))
+    adaptive = newSystem(size=(0.1,0.2,0.3), bodyrate=(5,-4,3))
+    simulate(fixed, 10, 1/32)
+    simulate(adaptive, 10, 1/32, integrator='rk45', rtol=1e-10, atol=1e-10, outputStep=1)
+
+    assert len(adaptive.getRecorders()["DIWATA"]["State"]) == 10
+    assert (adaptive[0].state.bodyrate - fixed[0].state.bodyrate).magnitude() < 1e-8
+    assert adaptive[0].state.quaternion == fixed[0].state.quaternion
+
+    # by default a sample every second: with its derivative for the kinetics, fewer evaluations than RK4 takes
+    default = newSystem(size=(0.1,0.2,0.3), bodyrate=(5,-4,3))
+    stepper = DormandPrince(default, 1/32, rtol=1e-10, atol=1e-10)
+    while default.time < 10:
+        stepper.advance(10)
+    samples = len(default.getRecorders()["DIWATA"]["State"])
+    assert stepper.outputStep == 1.0 and samples == 10
+    assert stepper.evaluations + samples < 4*10*32
+
+def test_24():
+    '''
+    Test multi-rate simulation.
+    simulate method with integrator='multirate' -- orbit on orbitStep, attitude sub-steps on timeStep
+    verify that the orbit and attitude follow the single rate RK4 solution with magnetic disturbance
+    verify that the recorders still sample every attitude sub-step
+    '''
+    single = newSystem(bodyrate=(5,-4,3), dipole=(0.05,0.02,0.01))
+    multi  = newSystem(bodyrate=(5,-4,3), dipole=(0.05,0.02,0.01))
+    simulate(single, 8)
+    simulate(multi, 8, integrator='multirate', orbitStep=4.0)
+
+    assert multi.time == 8
+    assert len(multi.getRecorders()["DIWATA"]["State"]) == len(single.getRecorders()["DIWATA"]["State"]) == 8*32
+    assert (multi[0].getposition() - single[0].getposition()).magnitude() < 1e-3
+    assert (multi[0].state.bodyrate - single[0].state.bodyrate).magnitude() < 1e-7
+    assert (multi[0].state.quaternion - single[0].state.quaternion).angle() < 1e-6
+
+    for fieldTYPE in ("NONE", ""):
+        assert systemMagneticFieldInertial(multi, multi[0].getposition(), multi.time, fieldTYPE) == Vector(0,0,0)
+        assert systemMagneticField(multi, multi[0].state, multi.time, multi[0].dipole, fieldTYPE) == Vector(0,0,0)
+
+def test_25():
+    '''
+    Test the cubic Hermite interpolation of the orbit between multi-rate steps.
+    hermiteInterpolate -- position and velocity at a fraction of the step
+    '''
+    position, velocity = hermiteInterpolate(Vector(0,0,0), Vector(1,0,0), Vector(1,1,0), Vector(1,2,0), 1.0, 1.0)
+    assert position == Vector(1,1,0)
+    assert velocity == Vector(1,2,0)
+
+def test_26():
+    '''
+    Test dense output.
+    Recorder.setOutput method -- sample every step seconds from the step interpolant
+    verify that coarse RK4 and RK45 steps reproduce a fine RK4 run at the requested instants
+    '''
+    fine = newSystem(bodyrate=(5,-4,3))
+    simulate(fine, 8, 1/32)
+    reference = fine.getRecorders()["DIWATA"]
+
+    coarse = newSystem(bodyrate=(5,-4,3))
+    coarse.getRecorders()["DIWATA"].setOutput(step=1/32)
+    simulate(coarse, 8, 1/2)
+
+    adaptive = newSystem(bodyrate=(5,-4,3))
+    adaptive.getRecorders()["DIWATA"].setOutput(step=1/32)
+    simulate(adaptive, 8, 1, integrator='rk45', rtol=1e-10, atol=1e-10)
+
+    for system, tolerance in ((coarse, 1e-7), (adaptive, 1e-9)):
+        recorder = system.getRecorders()["DIWATA"]
+        assert len(recorder["State"]) == 8*32
+        assert recorder["Datetime"] == reference["Datetime"]
+        for state, expected in zip(recorder["State"], reference["State"]):
+            assert (state.position - expected.position).magnitude() < 1e-3
+            assert (state.quaternion - expected.quaternion).vector().magnitude() < tolerance
+
+def test_27():
+    '''
+    Test dense output.
+    Recorder.setOutput method -- sample at listed times, the ones outside the simulated span are not recorded
+    '''
+    listed = newSystem(bodyrate=(5,-4,3))
+    listed.getRecorders()["DIWATA"].setOutput(times=[7.5, 0.25, 100])
+    simulate(listed, 8, 1/2)
+    assert listed.getRecorders()["DIWATA"]["Datetime"] == [datetime.datetime(2023,9,26,3,11,18,250000), datetime.datetime(2023,9,26,3,11,25,500000)]
+
+def test_28():
+    '''
+    Test analytic orbit propagation.
+    setPropagator method -- the "KEPLER" solution follows the numerical two-body solution
+    '''
+    numerical = newSystem()
+    kepler    = newSystem()
+    kepler.setPropagator("KEPLER")
+    simulate(numerical, 600, 1, orbitPropOnly=True)
+    simulate(kepler, 600, 1, orbitPropOnly=True)
+
+    assert kepler.time == 600
+    assert len(kepler.getRecorders()["DIWATA"]["State"]) == len(numerical.getRecorders()["DIWATA"]["State"]) == 600
+    assert kepler.getRecorders()["DIWATA"]["Datetime"] == numerical.getRecorders()["DIWATA"]["Datetime"]
+    for state, expected in zip(kepler.getRecorders()["DIWATA"]["State"], numerical.getRecorders()["DIWATA"]["State"]):
+        assert (state.position - expected.position).magnitude() < 1e-6
+    assert (kepler[0].getvelocity() - numerical[0].getvelocity()).magnitude() < 1e-9
+
+def test_29():
+    '''
+    Test analytic orbit propagation.
+    setPropagator method -- "J2" drifts the ascending node at the secular rate and leaves the other spacecraft numerical
+    '''
+    mixed = newSystem(2)
+    mixed.setPropagator("J2")
+    mixed[1].setPropagator("NUMERICAL")
+    mixed[1].setmass(50)
+    simulate(mixed, 86400, 600, orbitPropOnly=True)
+
+    node0 = Vector(0,0,1).cross(POSITION.cross(VELOCITY))
+    node1 = Vector(0,0,1).cross(mixed[0].getposition().cross(mixed[0].getvelocity()))
+    drift = (math.atan2(node1.y, node1.x) - math.atan2(node0.y, node0.x))*R2D
+    assert abs(drift - (-4.95)) < 0.05
+    assert len(mixed.getRecorders()["SAT-1"]["State"]) == 144
+
+def test_30():
+    '''
+    Test analytic orbit propagation.
+    setPropagator method -- unknown propagators are rejected by the system and by the spacecraft
+    '''
+    try:
+        newSystem().setPropagator("SGP4")
+        assert False
+    except ValueError:
+        pass
+    try:
+        newSystem()[0].setPropagator("SGP4")
+        assert False
+    except ValueError:
+        pass
+    try:
+        newSystem()[0].setPropagator(2)
+        assert False
+    except TypeError:
+        pass
+
+def test_31():
+    '''
+    Test magnetic field models.
+    MemoizedIGRFField -- shares syntheses between RK4 stages, stays exact and hands out copies
+    '''
+    exact    = magneticSystem(IGRFField())
+    memoized = magneticSystem(MemoizedIGRFField())
+    simulate(exact, 2)
+    simulate(memoized, 2)
+
+    assert exact.magneticField.evaluations == 4*64
+    assert memoized.magneticField.evaluations + memoized.magneticField.hits == 4*64
+    assert memoized.magneticField.hits > 64
+    assert (memoized[0].state.bodyrate - exact[0].state.bodyrate).magnitude() < 1e-12
+
+    field = memoized.magneticField.ned(14.6, 121.0, 420.0, 2023)
+    field += Vector(1,1,1)
+    assert memoized.magneticField.ned(14.6, 121.0, 420.0, 2023) == IGRFField().ned(14.6, 121.0, 420.0, 2023)
+
+def test_32():
+    '''
+    Test magnetic field models.
+    GriddedIGRFField -- exact on its nodes and refines itself down to the error bound, built at the field year
+    '''
+    exact   = magneticSystem(IGRFField())
+    gridded = magneticSystem(GriddedIGRFField(resolution=(60,60,200), altitudeRange=(300,700), errorBound=5000))
+    simulate(exact, 2)
+    simulate(gridded, 2)
+
+    grid = gridded.magneticField
+    assert grid.resolution == (30, 30, 100)
+    assert grid.error < 5000
+    assert grid.year == gridded.fieldyear()
+    assert (gridded[0].state.bodyrate - exact[0].state.bodyrate).magnitude() < 1e-5
+
+    # built again only once the year moves past the tolerance
+    assert (grid.ned(0, 30, 500, 2023) - IGRFField().ned(0, 30, 500, 2023)).magnitude() < 1e-6
+    assert grid.year == 2023
+    grid.ned(0, 30, 500, 2023.05)
+    assert grid.year == 2023
+
+def test_33():
+    '''
+    Test magnetic field models.
+    setMagneticFieldModel method -- only field model objects are accepted
+    '''
+    try:
+        newSystem().setMagneticFieldModel("IGRF")
+        assert False
+    except TypeError:
+        pass
+
+def test_34():
+    '''
+    Test native IGRF synthesis.
+    IGRF_MODEL.ned and nedPoint methods -- vectorized and scalar spherical harmonic synthesis against pyIGRF, in decimal years
+    '''
+    import pyIGRF
+
+    latitudes  = [-90.0, -41.3, 0.0, 14.6, 63.2, 90.0]
+    longitudes = [30.0, -170.2, 0.0, 121.0, 45.5, 0.0]
+    altitudes  = [500.0, 0.0, 350.0, 420.0, 1200.0, 500.0]
+    fields = IGRF_MODEL.ned(latitudes, longitudes, altitudes, 2023)
+    assert fields.shape == (6, 3)
+    for field, latitude, longitude, altitude in zip(fields, latitudes, longitudes, altitudes):
+        expected = pyIGRF.igrf_value(latitude, longitude, altitude, 2023)[3:6]
+        point = IGRF_MODEL.nedPoint(latitude, longitude, altitude, 2023)
+        for i in range(3):
+            assert abs(field[i] - expected[i]) < 1e-6
+            assert abs(point[i] - expected[i]) < 1e-6
+
+    expected = pyIGRF.igrf_value(14.6, 121.0, 420.0, 2023.74)[3:6]
+    point = IGRF_MODEL.nedPoint(14.6, 121.0, 420.0, 2023.74)
+    for i in range(3):
+        assert abs(point[i] - expected[i]) < 1e-6
+    system = newSystem(0)
+    assert abs(system.fieldyear() - 2023.7352) < 1e-3
+
+def test_35():
+    '''
+    Test native IGRF synthesis.
+    systemMagneticFieldArray method -- NED and inertial field along a trajectory, against the scalar inertial field
+    '''
+    system = newSystem(0)
+    positions = [ [4395.079058029986e3, 3631.5889348004957e3, -3712.575674067216e3],
+                  [-5.76886641743168e6, 2.5823185921356733e6, 1.010210403510053e6] ]
+    _, inertial = systemMagneticFieldArray(system, positions, [0.0, 30.0])
+    for position, time, field in zip(positions, [0.0, 30.0], inertial):
+        expected = systemMagneticFieldInertial(system, Vector(*position), time, "EARTH")
+        assert (Vector(*field.tolist()) - expected).magnitude() < 1e-15
+
+def test_36():
+    '''
+    Test native IGRF synthesis.
+    verify the per-spacecraft magnetic torque in fleet mode against the per-spacecraft path
+    '''
+    def build(fleetMode):
+        system = newSystem(3, fleetMode, bodyrate=(5,-4,3), dipole=(0.05,0.02,0.01))
+        for i in range(3):
+            system[i].setposition(POSITION + Vector(1e5*i,0,0))
+        system[1].magnetfieldTYPE = "NONE"
+        return system
+
+    single, fleet = simulatePair(build, 1)
+    for i in range(3):
+        assert (fleet[i].nettorque - single[i].nettorque).magnitude() < 1e-18
+        assert (fleet[i].state.bodyrate - single[i].state.bodyrate).magnitude() < 1e-12
+
+def test_37():
+    '''
+    Test the per-step environment.
+    Environment class -- sidereal angle, geodetic location, NED frame, magnetic field and sun, computed on first use
+    verify that the location and magnetic field match locate and systemMagneticFieldInertial
+    '''
+    system = newSystem(dipole=(0.05,0.02,0.01))
+    environment = Environment(system, system[0].getposition(), 0.0)
+    assert environment.location == system.locate(system[0], 0.0)
+    assert environment.magneticField == systemMagneticFieldInertial(system, system[0].getposition(), 0.0, "EARTH")
+    assert environment.sunVector == system.sunVector
+    assert (environment.eciToEcef*system[0].getposition()).magnitude() - system[0].getposition().magnitude() < 1e-6
+    assert system[0].getEnvironment() is system[0].getEnvironment()
+
+def test_38():
+    '''
+    Test the per-step environment.
+    verify that the magnetometer and the first RK4 stage share one field evaluation per step
+    '''
+    system = newSystem(dipole=(0.05,0.02,0.01))
+    system[0].addSensor(Sensor('ideal_MTM'))
+    system[0].sensors['ideal_MTM'].setMethod(magnetometer_function)
+    system[0].sensors['ideal_MTM'].power = True
+    system.magneticField.evaluations = 0
+    simulate(system, 1, 1/4)
+
+    assert system.magneticField.evaluations == 4*4
+    assert system[0].environment.matches(system.getRecorders()["DIWATA"]["State"][-1].position, 0.75)
+    first = system.getRecorders()["DIWATA"]["State"][0]
+    assert system[0]['ideal_MTM'] == first.quaternion.toMatrix()*Environment(system, first.position, 0.0).magneticField
+
+def test_39():
+    '''
+    Test the closed-form geodetic conversion.
+    geodeticCoordinates -- latitude and height without iteration, including the poles, equator and near the centre
+    '''
+    system = newSystem(0)
+
+    b = system.radi*(1 - GEODETIC_E2)**0.5
+    latitude, height = geodeticCoordinates(system, 0.0, 0.0, b + 500e3)
+    assert abs(latitude - math.pi/2) < 1e-15 and abs(height - 500e3) < 1e-6
+    latitude, height = geodeticCoordinates(system, 0.0, 0.0, -b - 500e3)
+    assert abs(latitude + math.pi/2) < 1e-15 and abs(height - 500e3) < 1e-6
+    latitude, height = geodeticCoordinates(system, system.radi + 400e3, 0.0, 0.0)
+    assert latitude == 0 and abs(height - 400e3) < 1e-6
+    geodeticCoordinates(system, 100.0, 60.0, 80.0)
+
+def test_40():
+    '''
+    Test the closed-form geodetic conversion.
+    geodeticArray -- vectorized latitude, longitude and altitude for many positions and times, against locate
+    '''
+    system = newSystem()
+    positions = []
+    times     = []
+    for i in range(8):
+        position = 1e3*Vector(4395.079058029986 - 1500*i, 3631.5889348004957, -3712.575674067216 + 1000*i)
+        positions.append([position.x, position.y, position.z])
+        times.append(600.0*i)
+
+    locations = geodeticArray(system, positions, times)
+    assert locations.shape == (8, 3)
+    for i in range(8):
+        system[0].setposition(Vector(*positions[i]))
+        location = system.locate(system[0], times[i])
+        assert abs(locations[i,0] - location.x) < 1e-9
+        assert abs(locations[i,1] - location.y) < 1e-9
+        assert abs(locations[i,2] - location.z) < 1e-9
+
+def test_41():
+    '''
+    Test the sun ephemeris providers.
+    SunEphemeris -- solar series on float seconds since the epoch, unit sun vector and its subsolar point
+    setSunEphemeris method -- only ephemeris objects are accepted
+    '''
+    system = newSystem(0)
+    sunVector, sunLocation = systemSun(system, 1000.0)
+    assert abs(sunVector.magnitude() - 1) < 1e-15
+    assert (subsolarPoint(system, sunVector, 1000.0) - sunLocation).magnitude() < 1e-9
+
+    try:
+        system.setSunEphemeris(IGRFField())
+        assert False
+    except TypeError:
+        pass
+
+def test_42():
+    '''
+    Test the sun ephemeris providers.
+    SunTable -- tabulated sun vector, declination and right ascension, rebuilt when a query leaves the window
+    systemSunArray -- sun vectors and subsolar points for an array of times
+    verify that the table and the batch API agree with systemSun
+    '''
+    system = newSystem(0)
+    times = np.linspace(0, 3*86400, 1001)
+    exactVectors, exactLocations = systemSunArray(system, times)
+
+    table = SunTable(step=60.0)
+    system.setSunEphemeris(table)
+    tableVectors, tableLocations = systemSunArray(system, times)
+    assert np.max(np.abs(tableVectors - exactVectors)) < 1e-9
+    assert np.max(np.abs(tableLocations - exactLocations)) < 1e-7
+
+    for i in range(0, 1001, 100):
+        vector, location = systemSun(system, times[i])
+        assert (vector - Vector(*exactVectors[i].tolist())).magnitude() < 1e-9
+        assert abs(location.x - exactLocations[i,0]) < 1e-7
+        assert abs((location.y - exactLocations[i,1] + 180) % 360 - 180) < 1e-7
+
+    start = table.start
+    systemSun(system, 30*86400.0)
+    assert table.start > start
+
+def test_43():
+    '''
+    Test the simulation clock.
+    Clock class -- integer ticks since the epoch, Unix time, decimal year and datetimes on request
+    verify that stepping does not accumulate float error
+    '''
+    clock = Clock()
+    clock.setEpoch(datetime.datetime(2023,12,31,23,59,59,500000))
+    for i in range(100000):
+        clock.advance(0.1)
+    assert clock.time == 10000.0
+    assert clock.datetime() == datetime.datetime(2024,1,1,2,46,39,500000)
+    assert clock.unixTime() == int(clock.datetime().timestamp())
+    assert int(clock.decimalYear()) == 2024
+    assert int(clock.decimalYear(0.0)) == 2023
+
+    clock.set(0.0)
+    for i in range(30000):
+        clock.advance(1/3)
+    assert clock.time == 10000.0
+
+def test_44():
+    '''
+    Test the simulation clock.
+    Recorder -- numeric sample times, Datetime item built lazily, datetimes accepted by update
+    '''
+    system = newSystem()
+    simulate(system, 1, 1/4)
+
+    recorder = system.getRecorders()["DIWATA"]
+    assert recorder.times == [0.0, 0.25, 0.5, 0.75]
+    assert len(recorder["Datetime"]) == 4
+    assert recorder["Datetime"][-1] == datetime.datetime(2023,9,26,3,11,18,750000)
+    assert recorder["Datetime"][1:3] == [datetime.datetime(2023,9,26,3,11,18,250000), datetime.datetime(2023,9,26,3,11,18,500000)]
+    assert system.yearnow() == 2023
+
+    recorder.update(datetime.datetime(2023,9,26,3,11,19))
+    assert recorder.times[-1] == 1.0
+
+def test_45():
+    '''
+    Test the atmosphere model tables.
+    us76Density, cira12Density -- densities for a float or an array of altitudes
+    verify that altitudes at and above 1000 km are clamped instead of failing
+    '''
+    altitudes = np.linspace(-10, 1200, 500)
+    for density in (us76Density, cira12Density):
+        densities = density(altitudes)
+        for altitude, value in zip(altitudes.tolist(), densities.tolist()):
+            assert abs(density(altitude) - value) <= 1e-12*value
+    assert us76Density(1000.0) == us76Density(1500.0) == 3.019e-15
+    assert us76Density(0.0) == 1.225
+
+    system = newSystem()
+    system[0].setposition(Vector(system.radi + 1200e3, 0, 0))
+    system[0].setvelocity(Vector(0, 7000, 0))
+    system[0].setAtmosphereModel("US76")
+    assert systemAtmosphere(system, system[0].state, system[0].size, "US76").magnitude() > 0
+
+def test_46():
+    '''
+    Test the atmosphere model registry.
+    registerAtmosphereModel -- new density models selectable with setAtmosphereModel
+    '''
+    system = newSystem()
+    system[0].setvelocity(Vector(0, 7000, 0))
+    try:
+        system[0].setAtmosphereModel("EXPONENTIAL")
+        assert False
+    except ValueError:
+        pass
+
+    registerAtmosphereModel("EXPONENTIAL", lambda altitude: 1e-12*np.exp(-(altitude - 400)/60))
+    try:
+        system[0].setAtmosphereModel("EXPONENTIAL")
+        system[0].setposition(Vector(system.radi + 400e3, 0, 0))
+        drag = systemAtmosphere(system, system[0].state, system[0].size, "EXPONENTIAL")
+        assert abs(drag.magnitude() - 0.5*1e-12*2.2*meanArea(system[0].size)*(7000 - 7.29211585e-05*(system.radi + 400e3))**2) < 1e-20
+    finally:
+        del ATMOSPHERE_MODELS["EXPONENTIAL"]
+
+def test_47():
+    '''
+    Test the atmosphere model tables.
+    systemAtmosphereArray -- drag forces along a whole trajectory, against systemAtmosphere
+    '''
+    system = newSystem()
+    positions  = [ [system.radi + 1e3*altitude, 0, 0] for altitude in (300, 500, 700) ]
+    velocities = [ [0, 7500, 0] ]*3
+    forces = systemAtmosphereArray(system, positions, velocities, system[0].size, "CIRA12")
+    for position, velocity, force in zip(positions, velocities, forces):
+        state = State()
+        state.position = Vector(*position)
+        state.velocity = Vector(*velocity)
+        expected = systemAtmosphere(system, state, system[0].size, "CIRA12")
+        assert (Vector(*force.tolist()) - expected).magnitude() <= 1e-12*expected.magnitude()
+
+def test_48():
+    '''
+    Test the cached inertia of the Spacecraft class.
+    getinertia, getinverseInertia and inertia -- built once, rebuilt when the mass or the size change
+    '''
+    spacecraft = newSystem(size=(0.1,0.2,0.3))[0]
+
+    inertia = spacecraft.getinertia()
+    assert inertia is spacecraft.getinertia()
+    assert spacecraft.getinverseInertia() is spacecraft.getinverseInertia()
+    assert (inertia*Vector(1,1,1) - rectbodyInertia(Vector(0.1,0.2,0.3), 4)*Vector(1,1,1)).magnitude() == 0
+
+    spacecraft.setmass(8)
+    assert (spacecraft.getinertia()*Vector(1,1,1) - 2*(inertia*Vector(1,1,1))).magnitude() < 1e-15
+    spacecraft.setsize(Vector(0.1,0.1,0.1))
+    assert (spacecraft.getinertia()*Vector(1,0,0) - Vector(8*0.02/12,0,0)).magnitude() < 1e-15
+
+    spacecraft = newSystem(size=(0.1,0.2,0.3))[0]
+    assert spacecraft.inertia is spacecraft.getinertia()
+    spacecraft.state.mass = 8
+    assert (spacecraft.inertia*Vector(1,1,1) - 2*(inertia*Vector(1,1,1))).magnitude() < 1e-15
+    assert (spacecraft.getinverseInertia()*(spacecraft.inertia*Vector(1,2,3)) - Vector(1,2,3)).magnitude() < 1e-12
+
+def test_49():
+    '''
+    Test the general inertia of the Spacecraft class.
+    setinertia -- only a 3x3 Matrix is accepted, a box given as a tensor integrates like the box
+    '''
+    try:
+        newSystem()[0].setinertia(Vector(1,2,3))
+        assert False
+    except TypeError:
+        pass
+
+    box   = inertiaSystem(False, None)
+    given = inertiaSystem(False, rectbodyInertia(Vector(0.1,0.2,0.3), 4))
+    simulate(box, 1)
+    simulate(given, 1)
+    assert given[0].state.bodyrate == box[0].state.bodyrate
+
+def test_50():
+    '''
+    Test the general inertia of the Spacecraft class.
+    verify that fleet mode integrates with the full inertia tensor like the per-spacecraft path
+    '''
+    tensor = Matrix.fromcomponents(0.05, 0.002, 0.001,
+                                   0.002, 0.04, 0.003,
+                                   0.001, 0.003, 0.03)
+    single, fleet = simulatePair(lambda fleetMode: inertiaSystem(fleetMode, tensor), 1)
+    box = inertiaSystem(False, None)
+    simulate(box, 1)
+    for i in range(2):
+        assert (fleet[i].state.bodyrate - single[i].state.bodyrate).magnitude() < 1e-12
+    assert (single[0].state.bodyrate - box[0].state.bodyrate).magnitude() > 1e-6
+
+def test_51():
+    '''
+    Test the geopotential gravity models.
+    GeopotentialModel class -- EGM96 coefficients to degree and order 4, degree 2 order 0 reproduces "J2"
+    '''
+    try:
+        GeopotentialModel(degree=8)
+        assert False
+    except ValueError:
+        pass
+
+    system = newSystem(0)
+    zonal = GeopotentialModel(degree=2, order=0, mu=system.mu, radius=system.radi)
+    system.setGeopotentialModel(zonal)
+    twobody = systemGravity(system, 1, POSITION, "SPHERICAL2BODY")
+    j2      = systemGravity(system, 1, POSITION, "J2") - twobody
+    model   = systemGravity(system, 1, POSITION, "GEOPOTENTIAL", 100.0) - twobody
+    assert (j2 - model).magnitude() < 1e-6*j2.magnitude()
+
+def test_52():
+    '''
+    Test the geopotential gravity models.
+    GeopotentialModel class -- the normalised V/W recursion for one position and for an array of positions agree
+    '''
+    system = newSystem(0)
+    system.setGeopotentialModel(GeopotentialModel())
+    positions = np.array([[4395.1e3, 3631.6e3, -3712.6e3], [-1000e3, 6500e3, 2000e3], [100e3, -50e3, 6800e3]])
+    accelerations = system.geopotential.acceleration(positions)
+    for position, acceleration in zip(positions.tolist(), accelerations.tolist()):
+        point = system.geopotential.accelerationPoint(*position)
+        assert max(abs(a - b) for a, b in zip(point, acceleration)) < 1e-15
+
+def test_53():
+    '''
+    Test the geopotential gravity models.
+    setGravityModel method -- "SPHERICAL2BODY", "J2" and "GEOPOTENTIAL" per spacecraft, unknown models rejected,
+    the EGM96 coefficients only read once "GEOPOTENTIAL" is used
+    verify that fleet mode matches the per-spacecraft path and that the harmonics beyond J2 stay small
+    '''
+    try:
+        newSystem()[0].setGravityModel("EGM2008")
+        assert False
+    except ValueError:
+        pass
+
+    def build(fleetMode):
+        system = newSystem(3, fleetMode)
+        for spacecraft, gravityTYPE in zip(system.spacecraftObjects, ["SPHERICAL2BODY", "J2", "GEOPOTENTIAL"]):
+            spacecraft.setGravityModel(gravityTYPE)
+        return system
+
+    assert newSystem().geopotentialModel is None
+    single, fleet = simulatePair(build, 60, 1, orbitPropOnly=True)
+    assert single.geopotentialModel is single.geopotential
+    for i in range(3):
+        assert (fleet[i].getposition() - single[i].getposition()).magnitude() < 1e-6
+    assert (single[1].getposition() - single[0].getposition()).magnitude() > 10
+    assert (single[2].getposition() - single[1].getposition()).magnitude() < 0.1*(single[1].getposition() - single[0].getposition()).magnitude()
+
+def test_54():
+    '''
+    Test the lunisolar third-body perturbation.
+    ChebyshevEphemeris class -- segments fitted to the solar and lunar series, scalar and batch evaluation
+    '''
+    system = newSystem(0)
+    days = daysSinceJ2000(system, np.linspace(0, 10*86400, 2001))
+    for ephemeris, series in ((system.thirdBody.sun, sunPositionArray), (system.thirdBody.moon, moonPositionArray)):
+        assert np.max(np.abs(ephemeris.positions(days) - series(days))) < 0.1
+        for day in days[::250].tolist():
+            assert max(abs(a - b) for a, b in zip(ephemeris.position(day), series([day])[0].tolist())) < 0.1
+    assert 3.5e8 < np.linalg.norm(moonPositionArray([days[0]])[0]) < 4.1e8
+    assert 1.47e11 < np.linalg.norm(sunPositionArray([days[0]])[0]) < 1.53e11
+
+def test_55():
+    '''
+    Test the lunisolar third-body perturbation.
+    systemThirdBody -- the sun and moon point mass forces against a direct evaluation
+    '''
+    system = newSystem(0)
+    day = daysSinceJ2000(system, 0.0)
+    force = systemThirdBody(system, 4, POSITION, 0.0, "SUNMOON")
+    expected = np.zeros(3)
+    for series, mu in ((sunPositionArray, system.thirdBody.muSun), (moonPositionArray, system.thirdBody.muMoon)):
+        body = series([day])[0]
+        delta = body - np.array([POSITION.x, POSITION.y, POSITION.z])
+        expected += 4*mu*(delta/np.linalg.norm(delta)**3 - body/np.linalg.norm(body)**3)
+    assert (force - Vector(*expected.tolist())).magnitude() < 1e-12
+    assert 1e-7 < force.magnitude()/4 < 1e-5
+    assert systemThirdBody(system, 4, POSITION, 0.0, "NONE") == Vector(0,0,0)
+
+def test_56():
+    '''
+    Test the lunisolar third-body perturbation.
+    setThirdBodyModel method -- "SUN", "MOON" or "SUNMOON" added to the orbit dynamics, unknown bodies rejected
+    verify that fleet mode matches the per-spacecraft path
+    '''
+    try:
+        newSystem()[0].setThirdBodyModel("JUPITER")
+        assert False
+    except ValueError:
+        pass
+
+    def build(fleetMode):
+        system = newSystem(4, fleetMode)
+        for spacecraft, thirdbodyTYPE in zip(system.spacecraftObjects, ["NONE", "SUN", "MOON", "SUNMOON"]):
+            spacecraft.setThirdBodyModel(thirdbodyTYPE)
+        return system
+
+    single, fleet = simulatePair(build, 120, 1, orbitPropOnly=True)
+    for i in range(4):
+        assert (fleet[i].getposition() - single[i].getposition()).magnitude() < 1e-6
+    assert (single[3].getposition() - single[0].getposition()).magnitude() > 1e-3
+
+def test_57():
+    '''
+    Test the Earth's shadow.
+    shadowFunction -- illumination 0 in umbra, 1 in sunlight for the conical and cylindrical models, unknown models rejected
+    '''
+    system = newSystem(0)
+    sun = system.sunVector
+    across = sun.cross(Vector(0,0,1)).normalize()
+    radius = system.radi + 500e3
+
+    assert shadowFunction(system, radius*sun, sun, "CONICAL") == 1.0
+    assert shadowFunction(system, -radius*sun, sun, "CONICAL") == 0.0
+    assert shadowFunction(system, -radius*sun, sun, "CYLINDRICAL") == 0.0
+    assert shadowFunction(system, radius*across, sun, "CYLINDRICAL") == 1.0
+    assert shadowFunction(system, POSITION, sun, "CONICAL") == 0.0
+    try:
+        shadowFunction(system, radius*sun, sun, "SPHERICAL")
+        assert False
+    except ValueError:
+        pass
+
+def test_58():
+    '''
+    Test the Earth's shadow.
+    shadowFunctionArray -- in between in the conical penumbra, against shadowFunction
+    '''
+    system = newSystem(0)
+    sun = system.sunVector
+    across = sun.cross(Vector(0,0,1)).normalize()
+    radius = system.radi + 500e3
+
+    angles = np.radians(np.linspace(100, 120, 2001))
+    positions = radius*(np.cos(angles)[:,None]*np.array([sun.x, sun.y, sun.z]) + np.sin(angles)[:,None]*np.array([across.x, across.y, across.z]))
+    conical = shadowFunctionArray(system, positions, [sun.x, sun.y, sun.z], "CONICAL")
+    cylindrical = shadowFunctionArray(system, positions, [sun.x, sun.y, sun.z], "CYLINDRICAL")
+    penumbra = (conical > 0) & (conical < 1)
+    assert penumbra.sum() > 10 and np.all(np.diff(conical) <= 1e-12)
+    assert set(np.unique(cylindrical).tolist()) == {0.0, 1.0}
+    for k in range(0, len(angles), 50):
+        assert abs(shadowFunction(system, Vector(*positions[k].tolist()), sun, "CONICAL") - conical[k]) < 1e-8
+
+def test_59():
+    '''
+    Test the solar radiation pressure.
+    systemSolarPressure, systemSolarPressureArray -- cannonball force scaled by the illumination, unknown models rejected
+    '''
+    try:
+        newSystem()[0].setSRPModel("FLATPLATE")
+        assert False
+    except ValueError:
+        pass
+
+    system = srpSystem(False)
+    spacecraft = system[1]
+    force = systemSolarPressure(system, spacecraft.state, spacecraft.size, 1.5, "CANNONBALL", "CONICAL")
+    illumination = spacecraft.getillumination()
+    assert abs(force.magnitude() - illumination*4.56e-6*1.5*meanArea(spacecraft.size)) < 1e-15
+    assert systemSolarPressure(system, spacecraft.state, spacecraft.size, 1.5, "NONE", "CONICAL") == Vector(0,0,0)
+
+    states = np.array([ [s.state.position.x, s.state.position.y, s.state.position.z] for s in (system[1], system[1]) ])
+    forces, illuminations = systemSolarPressureArray(system, states, [0.0, 0.0], spacecraft.size, 1.5, "CONICAL")
+    assert np.max(np.abs(forces[0] - np.array([force.x, force.y, force.z]))) < 1e-12
+    assert abs(illuminations[0] - illumination) < 1e-12
+
+def test_60():
+    '''
+    Test the solar radiation pressure.
+    setSRPModel, setShadowModel methods -- cannonball force and centre of pressure torque
+    verify fleet mode against the per-spacecraft path and the "Illumination" recorder item
+    verify that in sunlight the cannonball force changes the velocity by -P Cr A/m t along the sun vector
+    '''
+    sun = srpSystem(False).sunVector
+    single, fleet = simulatePair(srpSystem, 60, 1/4)
+    for i in range(3):
+        assert (fleet[i].getposition() - single[i].getposition()).magnitude() < 1e-6
+        assert (fleet[i].getbodyrate() - single[i].getbodyrate()).magnitude() < 1e-9
+    assert single[2].getbodyrate().magnitude() > 0
+    assert single[1].getbodyrate().magnitude() == 0
+    illumination = single.getRecorders()["SAT-1"]["Illumination"]
+    assert len(illumination) == len(single.getRecorders()["SAT-1"]["State"])
+    assert all(value == 1.0 for value in illumination)
+
+    # P = 4.56e-6 N/m^2, Cr = 1.5, the mean area of the 0.1 x 0.1 x 0.3 m box and 4 kg, against the spacecraft
+    # without SRP; the gravity gradient over their separation leaves about 1e-3 of it
+    expected = -(4.56e-6*1.5*(0.1*0.1 + 0.1*0.3 + 0.1*0.3)/3/4*60)*sun
+    change = single[1].getvelocity() - single[0].getvelocity()
+    assert (change - expected).magnitude() < 2e-3*expected.magnitude()
+
+def test_61():
+    '''
+    Test the solar radiation pressure.
+    sunsensor_function -- no sun vector in the Earth's shadow
+    '''
+    system = srpSystem(False)
+    radius = system.radi + 500e3
+    system[0].setposition(-radius*system.sunVector)
+    assert system[0]["Illumination"] == 0.0
+    assert sunsensor_function(system[0], []) == Vector(0,0,0)
+    system[0].setposition(radius*system.sunVector)
+    assert abs(sunsensor_function(system[0], []).magnitude() - 1) < 1e-12
+
+def test_62():
+    '''
+    Test the multi-face spacecraft geometry.
+    FaceTable class -- face areas, normals and centres of pressure, the box of the spacecraft size by default
+    '''
+    faces = FaceTable.box(Vector(0.1,0.2,0.3))
+    assert len(faces) == 6
+    assert abs(faces.projectedArea([1,0,0])[0] - 0.2*0.3) < 1e-15
+    assert abs(faces.projectedArea([0,0,-1])[0] - 0.1*0.2) < 1e-15
+    try:
+        FaceTable([1.0, 2.0], [[1,0,0]], [[0,0,0]])
+        assert False
+    except ValueError:
+        pass
+    try:
+        newSystem()[0].setGeometryModel("MESH")
+        assert False
+    except ValueError:
+        pass
+
+def test_63():
+    '''
+    Test the multi-face spacecraft geometry.
+    systemPanels -- attitude dependent drag and SRP force and torque from the faces, against a loop over the faces
+    '''
+    system = panelSystem(False)
+    spacecraft = system[2]
+    state = spacecraft.state
+    force, torque = systemPanels(system, state, spacecraft.getfaces(), "US76", "CANNONBALL", "CONICAL", 1.5)
+
+    rotation = matrixToArray(state.quaternion.toMatrix())
+    position = np.array([state.position.x, state.position.y, state.position.z])
+    velocity = np.array([state.velocity.x, state.velocity.y, state.velocity.z])
+    v_rel = velocity - np.cross([0.0, 0.0, 7.29211585e-05], position)
+    vr = np.linalg.norm(v_rel)
+    density = us76Density((np.linalg.norm(position) - system.radi)/1e3)
+    wind = rotation @ v_rel/vr
+    sun  = rotation @ np.array([system.sunVector.x, system.sunVector.y, system.sunVector.z])
+    expectedForce = np.zeros(3)
+    expectedTorque = np.zeros(3)
+    for area, normal, center in zip(spacecraft.getfaces().areas, spacecraft.getfaces().normals, spacecraft.getfaces().centers):
+        face = -0.5*density*2.2*vr*vr*area*max(0.0, normal @ wind)*wind - 4.56e-6*1.5*area*max(0.0, normal @ sun)*sun
+        expectedForce += face
+        expectedTorque += np.cross(center, face)
+    expectedForce = rotation.T @ expectedForce
+    assert np.max(np.abs(np.array([force.x, force.y, force.z]) - expectedForce)) < 1e-18
+    assert np.max(np.abs(np.array([torque.x, torque.y, torque.z]) - expectedTorque)) < 1e-20
+    assert torque.magnitude() > 1e-9
+
+def test_64():
+    '''
+    Test the multi-face spacecraft geometry.
+    systemPanels -- no torque on the symmetric box, a drag force changing with the attitude
+    '''
+    system = panelSystem(False)
+    state = system[2].state
+    _, torque = systemPanels(system, state, system[1].getfaces(), "US76", "CANNONBALL", "CONICAL", 1.5)
+    assert torque.magnitude() < 1e-20
+    force0, _ = systemPanels(system, state, system[1].getfaces(), "US76", "NONE", "CONICAL", 1.5)
+    system[1].setorientation(Vector(0,0,0))
+    force1, _ = systemPanels(system, system[1].state, system[1].getfaces(), "US76", "NONE", "CONICAL", 1.5)
+    assert abs(force0.magnitude() - force1.magnitude()) > 0.05*force1.magnitude()
+
+def test_65():
+    '''
+    Test the multi-face spacecraft geometry.
+    setGeometryModel, setfaces methods -- verify fleet mode against the per-spacecraft path
+    '''
+    single, fleet = simulatePair(panelSystem, 60, 1/4)
+    for i in range(3):
+        assert (fleet[i].getposition() - single[i].getposition()).magnitude() < 1e-6
+        assert (fleet[i].getbodyrate() - single[i].getbodyrate()).magnitude() < 1e-9
+    assert (single[2].getbodyrate() - single[1].getbodyrate()).magnitude() > 1e-4
+
+def test_66(tmp_path):
+    '''
+    Test the space weather driven atmosphere.
+    SpaceWeather class -- daily F10.7 and Ap from history and forecast CSV files, converted once into a memory-mapped table
+    verify the gaps and the precedence of the files
+    '''
+    import os
+
+    history, forecast = spaceWeatherFiles(tmp_path)
+    weather = SpaceWeather(history, forecast)
+    assert os.path.exists(os.path.join(tmp_path, "SW-history.npy"))
+    assert isinstance(SpaceWeather(history, forecast).table, np.memmap)
+
+    day = daysSinceJ2000(newSystem(0), 0.0)
+    assert weather.indices(day) == (150.0, 40.0)
+    assert weather.indices(day + 1) == (150.0, 40.0)
+    assert weather.indices(day + 2) == (120.0, 5.0)
+    assert weather.indices(day + 4) == (200.0, 80.0)
+    assert weather.indices(day + 400) == (200.0, 80.0)
+    assert weather.indices(day - 400) == (150.0, 10.0)
+    f107, ap = weather.indicesArray([day - 1, day, day + 2, day + 4])
+    assert f107.tolist() == [150.0, 150.0, 120.0, 200.0] and ap.tolist() == [10.0, 40.0, 5.0, 80.0]
+
+def test_67(tmp_path):
+    '''
+    Test the space weather driven atmosphere.
+    SpaceWeather class -- the table is rebuilt when a file is newer than the cache, a cache given without .npy gets it
+    '''
+    import os, time
+
+    history, forecast = spaceWeatherFiles(tmp_path)
+    SpaceWeather(history, forecast)
+    cache = os.path.join(tmp_path, "weather")
+    assert SpaceWeather(history, forecast, cache=cache).cache == cache + ".npy"
+    assert isinstance(SpaceWeather(history, forecast, cache=cache).table, np.memmap)
+    with open(forecast, "a") as file:
+        file.write("2023-10-02,100.0,0\n")
+    os.utime(forecast, (time.time() + 10, time.time() + 10))
+    day = daysSinceJ2000(newSystem(0), 0.0)
+    assert SpaceWeather(history, forecast).indices(day + 7) == (100.0, 0.0)
+
+def test_68():
+    '''
+    Test the space weather driven atmosphere.
+    spaceWeatherDensity -- density from the exospheric temperature of F10.7 and Ap, for a float or an array of altitudes,
+    extrapolated above 500 km with the scale height there
+    '''
+    assert abs(spaceWeatherDensity(400.0, 70.0, 0.0) - 6e-10*math.exp(-225*(27 - 0.012*200)/900)) < 1e-25
+    assert spaceWeatherDensity(400.0, 200.0, 80.0) > spaceWeatherDensity(400.0, 120.0, 5.0)
+    altitudes = np.linspace(150, 600, 50)
+    for altitude, value in zip(altitudes.tolist(), spaceWeatherDensity(altitudes, 150.0, 40.0).tolist()):
+        assert abs(spaceWeatherDensity(altitude, 150.0, 40.0) - value) <= 1e-12*value
+
+    T = 900 + 2.5*(150 - 70) + 1.5*40
+    assert abs(spaceWeatherDensity(600.0, 150.0, 40.0)/spaceWeatherDensity(500.0, 150.0, 40.0) - math.exp(-100*23.4/T)) < 1e-12
+    assert abs(spaceWeatherDensity(500.0 + 1e-9, 150.0, 40.0)/spaceWeatherDensity(500.0, 150.0, 40.0) - 1) < 1e-9
+
+def test_69(tmp_path):
+    '''
+    Test the space weather driven atmosphere.
+    setAtmosphereModel method -- "SPACEWEATHER" drag follows the indices of the day of the simulation clock
+    '''
+    system = newSystem()
+    system.setSpaceWeather(SpaceWeather(*spaceWeatherFiles(tmp_path)))
+    system[0].setposition(Vector(system.radi + 400e3, 0, 0))
+    system[0].setvelocity(Vector(0, 7500, 0))
+    system[0].setAtmosphereModel("SPACEWEATHER")
+    state = system[0].state
+    drag0 = systemAtmosphere(system, state, system[0].size, "SPACEWEATHER")
+    system.time = 4*86400
+    drag4 = systemAtmosphere(system, state, system[0].size, "SPACEWEATHER")
+    ratio = spaceWeatherDensity(400.0, 200.0, 80.0)/spaceWeatherDensity(400.0, 150.0, 40.0)
+    assert abs(drag4.magnitude()/drag0.magnitude() - ratio) < 1e-12
+
+    positions  = [ [system.radi + 400e3, 0, 0] ]*3
+    velocities = [ [0, 7500, 0] ]*3
+    forces = systemAtmosphereArray(system, positions, velocities, system[0].size, "SPACEWEATHER", [0.0, 2*86400, 4*86400])
+    assert abs(np.linalg.norm(forces[0]) - drag0.magnitude()) <= 1e-12*drag0.magnitude()
+    assert abs(np.linalg.norm(forces[2]) - drag4.magnitude()) <= 1e-12*drag4.magnitude()
+    assert np.linalg.norm(forces[1]) < np.linalg.norm(forces[0])
+
+def test_70():
+    '''
+    Test the columnar Recorder.
+    Recorder class -- items flattened into float64 columns of preallocated rows, sources resolved once
+    RecordedSequence -- recorder[item] views building the State or Vector of a row when read, array of the columns
+    '''
+    system, magnetometer = recordedSystem()
+    recorder = system.getRecorders()["DIWATA"]
+    states = recorder["State"]
+    assert len(states) == len(recorder.times) == len(recorder["Datetime"]) == 40
+    assert states.array.shape == (40, 14) and states.array.dtype == np.float64
+    assert recorder["MTM"].array.shape == (40, 3)
+    assert recorder["Illumination"].array.shape == (40, 1)
+    assert recorder.rows.dtype == np.float64 and recorder.width == 1 + 14 + 3*5 + 1 + 3
+    assert states[-1].position == Vector(*states.array[-1,1:4].tolist())
+    assert isinstance(states[5], State) and isinstance(recorder["MTM"][5], Vector)
+    assert states[1:3] == [states[1], states[2]]
+    assert recorder["MTM"][-1] == magnetometer.data
+
+    recorder.update(10.0)
+    assert states[-1].position == system[0].getposition()
+    assert states[-1].quaternion == system[0].state.quaternion
+    assert recorder.times[-1] == 10.0 and len(states) == 41
+
+    try:
+        recorder["UNKNOWN"]
+        assert False
+    except TypeError:
+        pass
+
+def test_71():
+    '''
+    Test the columnar Recorder.
+    Recorder class -- items added later, items kept as objects and the growth of the rows
+    '''
+    system, magnetometer = recordedSystem()
+    spacecraft = system[0]
+    recorder = system.getRecorders()["DIWATA"]
+    states = recorder["State"]
+    gyroscope = Sensor("GYRO")
+    gyroscope.setMethod(lambda spacecraft, args: spacecraft.state.bodyrate)
+    gyroscope.power = True
+    spacecraft.addSensor(gyroscope)
+    label = Sensor("MODE")
+    label.setMethod(lambda spacecraft, args: "DETUMBLE")
+    label.power = True
+    spacecraft.addSensor(label)
+    spacecraft.updateSensors()
+    for i in range(3000):
+        recorder.update(10.0 + i/4)
+    assert len(recorder["GYRO"]) == 3000 and len(states) == 3040
+    assert recorder["MODE"][-1] == "DETUMBLE" and len(recorder["MODE"]) == 3000
+    assert recorder["GYRO"][0] == spacecraft.state.bodyrate
+    assert np.array_equal(np.asarray(recorder.times[40:]), 10.0 + np.arange(3000)/4)
+
+def test_72():
+    '''
+    Test the columnar Recorder.
+    Recorder class -- an item whose value changes type is kept as objects from then on
+    '''
+    system, magnetometer = recordedSystem()
+    recorder = system.getRecorders()["DIWATA"]
+    magnetometer.setMethod(lambda spacecraft, args: [1.0, 2.0, 3.0])
+    system[0].updateSensors()
+    recorder.update(800.0)
+    values = recorder["MTM"]
+    assert len(values) == 41 and values[-1] == [1.0, 2.0, 3.0] and isinstance(values[0], Vector)
+    assert recorder["State"][-1].position == system[0].getposition()
+
+def test_73():
+    '''
+    Test the recording policies.
+    RecordPolicy class -- every k-th update of the whole recorder, latest values at every update
+    verify the kept samples and an unchanged B-dot detumbling
+    '''
+    recorder, bodyrate = detumbledRecorder(None)
+    assert len(recorder.times) == 80 and bodyrate != Vector(5,-5,5)
+    decimated, decimatedrate = detumbledRecorder(RecordPolicy("EVERY", 4))
+    assert decimatedrate == bodyrate
+    assert len(decimated["State"]) == len(decimated.times) == 20 and decimated.times[1] == 1.0
+    assert decimated["ideal_MTM"][5] == recorder["ideal_MTM"][20]
+    assert decimated.latest("State") == recorder["State"][-1] and decimated.latestTime == recorder.times[-1]
+    assert decimated.seen("ideal_MTM") == 80
+
+def test_74():
+    '''
+    Test the recording policies.
+    Recorder.setPolicy method -- a time cadence and on-change with a deadband for some items, removed again
+    '''
+    recorder, bodyrate = detumbledRecorder(None)
+    recorder.setPolicy(RecordPolicy("CADENCE", 2.0), ["ideal_MTM"])
+    recorder.setPolicy(RecordPolicy("ONCHANGE", 1e-3), ["Sunvector"])
+    for i in range(40):
+        recorder.update(20.0 + i/4)
+    assert len(recorder.times) == 120 and len(recorder["State"]) == 120
+    assert list(recorder.timesOf("ideal_MTM")) == [20.0, 22.0, 24.0, 26.0, 28.0] and len(recorder["ideal_MTM"]) == 5
+    assert len(recorder["Sunvector"]) == 1 and "ideal_MTM" not in recorder.dataDict
+    assert recorder.latest("ideal_MTM") == recorder["ideal_MTM"][-1] and recorder.seen("ideal_MTM") == 40
+    recorder.setPolicy(None, ["ideal_MTM"])
+    recorder.update(30.0)
+    assert len(recorder["ideal_MTM"]) == 1 and recorder.groups[0].channels.keys() == {"Sunvector"}
+
+def test_75():
+    '''
+    Test the recording policies.
+    RecordPolicy class -- pre and post windows around sked and function triggers
+    '''
+    recorder, bodyrate = detumbledRecorder(None)
+    flag = [False]
+    recorder.setPolicy(RecordPolicy("WINDOW", 1.0, 0.5))
+    recorder.setPolicy(RecordPolicy("WINDOW", 0.0, 0.25, lambda spacecraft: flag[0]), ["ideal_BDOT"])
+    for i in range(40):
+        time = 40.0 + i/4
+        if time == 45.0:
+            recorder.trigger(time, "SKED")
+        flag[0] = time >= 48.0
+        recorder.update(time)
+    assert list(recorder.times[80:]) == [44.0, 44.25, 44.5, 44.75, 45.0, 45.25, 45.5]
+    assert list(recorder.timesOf("ideal_BDOT")) == [48.0, 48.25]
+
+def test_76():
+    '''
+    Test the recording policies.
+    RecordPolicy class, setPolicy method -- unknown policies, empty values and policies given as str are rejected
+    '''
+    try:
+        RecordPolicy("SOMETIMES")
+        assert False
+    except ValueError:
+        pass
+    try:
+        RecordPolicy("EVERY", 0)
+        assert False
+    except ValueError:
+        pass
+    try:
+        newSystem().getRecorders()["DIWATA"].setPolicy("EVERY")
+        assert False
+    except TypeError:
+        pass
+
+def test_77(tmp_path):
+    '''
+    Test the streaming recorder sink.
+    Recorder class -- rows moved to disk every chunk, values and arrays read across the segments and memory
+    verify the recording against one kept in memory, items added later included
+    '''
+    memory, streamed = streamedRecorder(None), streamedRecorder(RecorderSink(str(tmp_path), 100))
+    assert streamed.spilled == 500 and len(streamed.times) == 500
+    assert len(streamed.rows) <= 200
+    assert np.array_equal(streamed["State"].array, memory["State"].array)
+    assert np.array_equal(streamed["GYRO"].array, memory["GYRO"].array) and len(streamed["GYRO"]) == 250
+    assert streamed["State"][123] == memory["State"][123] and streamed["GYRO"][-1] == memory["GYRO"][-1]
+    assert list(streamed.times[98:102]) == [98.0, 99.0, 100.0, 101.0]
+
+    streamed.update(500.0)
+    assert len(streamed.times) == 501 and streamed.times[-1] == 500.0 and streamed.spilled == 500
+
+def test_78(tmp_path):
+    '''
+    Test the streaming recorder sink.
+    RecorderSink class -- chunks of every item saved as .npy segments by a writer thread, read back memory-mapped,
+    at most maxOpen segments kept open
+    '''
+    import os
+
+    sink = RecorderSink(str(tmp_path), 100)
+    streamed = streamedRecorder(sink)
+    sink.sync()
+    assert sorted(os.listdir(os.path.join(tmp_path, "DIWATA", "State")))[:2] == ["000000000000.npy", "000000000100.npy"]
+    assert sorted(os.listdir(os.path.join(tmp_path, "DIWATA", "GYRO")))[0] == "000000000250.npy"
+    chunks = list(streamed.chunks("GYRO"))
+    assert [ len(times) for times, values in chunks ] == [50, 100, 100] and chunks[0][0][0] == 250.0
+    assert isinstance(chunks[0][1], np.memmap) and np.array_equal(chunks[-1][0], np.arange(400.0, 500.0))
+    sink.close()
+
+    bounded = RecorderSink(os.path.join(tmp_path, "bounded"), 100, maxOpen=3)
+    assert np.array_equal(streamedRecorder(bounded)["State"].array, streamedRecorder(None)["State"].array)
+    assert len(bounded.memmaps) == 3
+    bounded.close()
+
+    try:
+        RecorderSink(str(tmp_path), 0)
+        assert False
+    except ValueError:
+        pass
+
+def test_79(tmp_path):
+    '''
+    Test the streaming recorder sink.
+    export function -- the CSV of a streamed recording matches the one kept in memory
+    '''
+    import os
+
+    memory, streamed = streamedRecorder(None), streamedRecorder(RecorderSink(str(tmp_path), 100))
+    export(memory, 0, -1, os.path.join(tmp_path, "memory"))
+    export(streamed, 0, -1, os.path.join(tmp_path, "streamed"))
+    with open(os.path.join(tmp_path, "memory.csv")) as file:
+        exported = file.read().splitlines()
+    with open(os.path.join(tmp_path, "streamed.csv")) as file:
+        assert file.read().splitlines()[:len(exported)] == exported
+
+def test_80():
+    '''
+    Test the time index of the Recorder.
+    Recorder class -- at, nearest, between and last by arithmetic on uniform times
+    RecordedSequence -- the same queries giving the columns of an item as arrays
+    '''
+    system = newSystem()
+    recorder = system.getRecorders()["DIWATA"]
+    simulate(system, 100, 1/4)
+
+    assert recorder.at(10.0) == 40 and recorder.nearest(10.1) == 40 and recorder.nearest(10.2) == 41
+    assert recorder.between(10.0, 11.0) == slice(40, 45) and recorder.last(3) == slice(397, 400)
+    assert recorder.uniform and recorder.nearest(-5) == 0 and recorder.nearest(1e6) == 399
+    states = recorder["State"]
+    assert np.array_equal(states.at(10.0), states.array[40]) and states.between(10.0, 11.0).shape == (5, 14)
+    assert np.shares_memory(states.last(2), states.array) and np.array_equal(states.last(2), states.array[-2:])
+    assert State.fromarray(np.array(states.nearest(99.9))) == states[-1]
+    try:
+        recorder.at(10.1)
+        assert False
+    except ValueError:
+        pass
+
+def test_81(tmp_path):
+    '''
+    Test the time index of the Recorder.
+    Recorder class -- at, nearest and between by bisection on irregular times with segments on disk
+    verify the lookups against a search of the times
+    '''
+    system = newSystem()
+    recorder = system.getRecorders()["DIWATA"]
+    simulate(system, 100, 1/4)
+    states = recorder["State"]
+
+    recorder.setSink(RecorderSink(str(tmp_path), 64))
+    for time in [100.0, 100.5, 102.0, 103.0] + [ 110.0 + 0.3*i for i in range(200) ]:
+        recorder.update(time)
+    times = np.asarray(recorder.times.array[:,0])
+    assert recorder.at(102.0) == 402 and not recorder.uniform and len(recorder.timeChannel.segments) > 0
+    for time in [0.0, 50.1, 99.75, 100.0, 100.2, 101.9, 103.0, 106.0, 110.0, 115.1, 169.7, 200.0]:
+        index = int(np.argmin(np.abs(times - time)))
+        assert recorder.nearest(time) == index
+        assert recorder.between(time, time + 10) == slice(int(np.searchsorted(times, time - 1e-7)), int(np.searchsorted(times, time + 10 + 1e-7, 'right')))
+    assert np.array_equal(recorder.times.between(100.0, 103.0)[:,0], [100.0, 100.5, 102.0, 103.0])
+    assert np.array_equal(states.between(100.0, 140.0), states.array[400:505])
+
+def test_82():
+    '''
+    Test the array and DataFrame export of the Recorder.
+    Recorder class -- to_arrays gives read-only float columns by name, cached until new samples arrive
+    verify the columns against the recorded items and the geodetic columns against geodeticArray
+    '''
+    system = newSystem()
+    recorder = system.getRecorders()["DIWATA"]
+    simulate(system, 20, 1/4)
+
+    arrays = recorder.to_arrays()
+    states = recorder["State"]
+    assert list(arrays)[0] == 't' and len(arrays['t']) == 80
+    assert np.array_equal(arrays['t'], np.asarray(recorder.times.array[:,0]))
+    assert np.array_equal(arrays['x'], states.array[:,1]) and np.array_equal(arrays['r'], states.array[:,13])
+    assert np.shares_memory(arrays['q0'], recorder.rows) and not arrays['q0'].flags.writeable
+    assert np.array_equal(arrays['Sunlocation.y'], recorder["Sunlocation"].array[:,1])
+    geodetic = geodeticArray(system, states.array[:,1:4], np.asarray(recorder.times.array[:,0]))
+    assert np.allclose(np.column_stack((arrays['lat'], arrays['lon'], arrays['alt'])), geodetic)
+    assert recorder.to_arrays()['x'] is arrays['x']
+
+def test_83():
+    '''
+    Test the array and DataFrame export of the Recorder.
+    Recorder class -- to_frame gives the same columns as a DataFrame, items added later padded with NaN
+    '''
+    system = newSystem()
+    recorder = system.getRecorders()["DIWATA"]
+    simulate(system, 20, 1/4)
+    arrays = recorder.to_arrays()
+    frame = recorder.to_frame(['State'])
+    assert frame.shape == (80, 15) and recorder.to_frame(['State']) is frame
+    assert np.array_equal(frame['zdot'].values, arrays['zdot'])
+
+    gyroscope = Sensor("GYRO")
+    gyroscope.setMethod(lambda spacecraft, args: spacecraft.state.bodyrate)
+    gyroscope.power = True
+    system[0].addSensor(gyroscope)
+    label = Sensor("MODE")
+    label.setMethod(lambda spacecraft, args: "DETUMBLE")
+    label.power = True
+    system[0].addSensor(label)
+    simulate(system, 25, 1/4)
+    arrays = recorder.to_arrays(['GYRO'])
+    assert len(arrays['t']) == 100 and recorder.to_frame(['State']) is not frame
+    assert np.isnan(arrays['GYRO.x'][:80]).all() and np.array_equal(arrays['GYRO.z'][80:], recorder["GYRO"].array[:,2])
+    assert 'MODE' not in recorder.to_arrays() and 'GYRO.y' in recorder.to_arrays()
+    try:
+        recorder.to_arrays(['MODE'])
+        assert False
+    except TypeError:
+        pass
+
+def test_84(tmp_path):
+    '''
+    Test the array and DataFrame export of the Recorder.
+    Recorder class -- to_arrays reads the segments on disk and the rows in memory
+    '''
+    system = newSystem()
+    recorder = system.getRecorders()["DIWATA"]
+    simulate(system, 20, 1/4)
+    recorder.setSink(RecorderSink(str(tmp_path), 32))
+    simulate(system, 30, 1/4)
+    arrays = recorder.to_arrays(['State', 'Geodetic'])
+    assert len(arrays['t']) == 120 and len(recorder.timeChannel.segments) > 0
+    assert np.array_equal(arrays['x'], np.concatenate([ block[:,1] for times, block in recorder.chunks("State") ]))
+
+def test_85():
+    '''
+    Test augmented assignment on the State views.
+    VectorView, QuaternionView -- +=, -=, *= and /= give new objects and leave the State unchanged
+    '''
+    state = State(4.5, Vector(100,60,80), Vector(5,3,4), Quaternion(1,0,0,0), Vector(0.1,0.2,0.3))
+    position = state.position
+    position += Vector(1,1,1)
+    assert position == Vector(101,61,81) and state.position == Vector(100,60,80)
+    velocity = state.velocity
+    velocity -= Vector(1,1,1)
+    velocity *= 2
+    velocity /= 4
+    assert velocity == Vector(2,1,1.5) and state.velocity == Vector(5,3,4)
+    quaternion = state.quaternion
+    quaternion *= 2
+    assert quaternion.w == 2 and state.quaternion.w == 1
+    assert list(state.array) == [4.5, 100, 60, 80, 5, 3, 4, 1, 0, 0, 0, 0.1, 0.2, 0.3]
+
+def test_86():
+    '''
+    Test multi-rate simulation in fleet mode.
+    simulate method with integrator='multirate' -- the orbit steps of all spacecraft batched through a Fleet
+    verify against multi-rate integration spacecraft by spacecraft
+    '''
+    single, fleet = simulatePair(mixedFleet, 8, 1/32, integrator='multirate', orbitStep=4.0)
+    for i in range(3):
+        assert (fleet[i].getposition() - single[i].getposition()).magnitude() < 1e-6
+        assert (fleet[i].getvelocity() - single[i].getvelocity()).magnitude() < 1e-9
+        assert (fleet[i].state.bodyrate - single[i].state.bodyrate).magnitude() < 1e-12
+        assert (fleet[i].netforce - single[i].netforce).magnitude() < 1e-9
+    assert len(fleet.getRecorders()["SAT-0"]["State"]) == len(single.getRecorders()["SAT-0"]["State"]) == 8*32
+
+def test_87():
+    '''
+    Test dense output.
+    Recorder.updateAt method -- the kinetics and the sun of a sample are evaluated at its time
+    verify that sampling leaves the kinetics of the spacecraft as the integrator left them
+    '''
+    plain  = newSystem(bodyrate=(5,-4,3), dipole=(0.05,0.02,0.01))
+    sampled = newSystem(bodyrate=(5,-4,3), dipole=(0.05,0.02,0.01))
+    sampled.getRecorders()["DIWATA"].setOutput(step=1/8)
+    simulate(plain, 2, 1/2)
+    simulate(sampled, 2, 1/2)
+    assert sampled[0].netforce == plain[0].netforce and sampled[0].nettorque == plain[0].nettorque
+
+    recorder = sampled.getRecorders()["DIWATA"]
+    reference = newSystem(bodyrate=(5,-4,3), dipole=(0.05,0.02,0.01))
+    for k in (3, 6, 13):
+        time, state = recorder.times[k], recorder["State"][k]
+        reference[0].derivative(state, time)
+        assert recorder["Netforce"][k] == reference[0].netforce
+        assert recorder["Nettorque"][k] == reference[0].nettorque
+        assert recorder["Sunlocation"][k] == systemSun(sampled, time)[1]
+
+def test_88():
+    '''
+    Test analytic orbit propagation.
+    keplerPropagate with secularJ2 -- the velocities are the time derivative of the drifting positions
+    '''
+    system = newSystem(0)
+    times = np.array([3600.0 - 0.5, 3600.0, 3600.5, 86400.0 - 0.5, 86400.0, 86400.5])
+    positions, velocities = keplerPropagate(system, POSITION, VELOCITY, times, True)
+    for k in (1, 4):
+        difference = (positions[k+1] - positions[k-1])/1.0
+        assert np.linalg.norm(difference - velocities[k]) < 1e-2
+
+def test_89():
+    '''
+    Test the solar ephemeris.
+    daysSinceJ2000 method -- the sun runs on the epoch's Julian date, also for October to December epochs
+    '''
+    system = newSystem(0)
+    for date, jdate in (((2023,10,15,0,0,0,0), 2460232.5), ((2023,12,25,12,0,0,0), 2460304.0), ((2004,3,3,4,30,0,0), 2453067.6875)):
+        system.epoch(*date)
+        assert abs(daysSinceJ2000(system, 0.0) + 2451545 - jdate) < 1e-9
+        assert abs(daysSinceJ2000(system, 86400.0) + 2451545 - (jdate + 1)) < 1e-9
+
+def test_90():
+    '''
+    Test the solar ephemeris.
+    systemSun and sunPositionArray methods -- sun position of 2006-04-02 00:00 UTC against the reference of [Vallado Example 5-1]
+    '''
+    system = newSystem(0)
+    system.epoch(2006,4,2,0,0,0,0)
+    reference = np.array([146186178.0, 28788978.0, 12481360.0])*1e3
+
+    sun = systemSun(system, 0.0)[0]
+    angle = math.acos(min(1.0, np.dot([sun.x, sun.y, sun.z], reference)/np.linalg.norm(reference)))*R2D
+    assert angle < 0.01
+    position = sunPositionArray([daysSinceJ2000(system, 0.0)])[0]
+    assert abs(np.linalg.norm(position) - np.linalg.norm(reference)) < 1e6
+
+def test_91(monkeypatch):
+    '''
+    Test the solar radiation pressure.
+    Spacecraft.illuminationAt method -- one shadow evaluation per stage for the SRP force and torque and the sun sensor
+    '''
+    import leoss.main
+    calls = []
+    shadow = leoss.main.shadowFunction
+    monkeypatch.setattr(leoss.main, "shadowFunction", lambda *args: calls.append(args[1]) or shadow(*args))
+
+    system = newSystem(bodyrate=(1,2,3))
+    system[0].setSRPModel("CANNONBALL")
+    system[0].setpressureCenter(Vector(0.0, 0.0, 0.05))
+    simulate(system, 1, 1)
+    assert len(calls) == 4
+    sunsensor_function(system[0], [])
+    sunsensor_function(system[0], [])
+    assert len(calls) == 5
+
+def test_92():
+    '''
+    Test the recorder policies.
+    setPolicy method -- an item given its own policy before the first update is recorded on it
+    '''
+    system = newSystem()
+    recorder = system.getRecorders()["DIWATA"]
+    recorder.setPolicy(RecordPolicy("EVERY", 4), ["Sunlocation"])
+    simulate(system, 2, 1/4)
+    assert len(recorder["Sunlocation"]) == len(recorder.timesOf("Sunlocation"))
+    assert len(recorder["Sunlocation"]) < len(recorder["State"])
+    assert recorder.latest("Sunlocation") == system.sunLocation
+
+def test_93():
+    '''
+    Test the recorder policies.
+    setPolicy method -- the values of the last update survive a change of policy between runs
+    verify that the B-dot controller keeps reading them with the controllers on
+    '''
+    system = newSystem(bodyrate=(5,-5,5))
+    spacecraft = system[0]
+    spacecraft.magnetfieldTYPE = "EARTH"
+    components = (ideal_magnetometer, ideal_bdotcontroller, ideal_magnetorquer)
+    for component, add in zip(components, (spacecraft.addSensor, spacecraft.addController, spacecraft.addActuator)):
+        component.power = True
+        add(component)
+    try:
+        simulate(system, 5, 1/4)
+        recorder = system.getRecorders()["DIWATA"]
+        magneticField = recorder.latest("ideal_MTM")
+        recorder.setPolicy(RecordPolicy("EVERY", 2), ["State"])
+        assert recorder.seen("ideal_MTM") > 1
+        assert recorder.latest("ideal_MTM") == magneticField
+        simulate(system, 10, 1/4)
+        assert recorder.latest("ideal_MTM") == spacecraft["ideal_MTM"]
+        assert len(recorder["State"]) < len(recorder["ideal_MTM"])
+    finally:
+        for component in components:
+            component.power = False
+
+def test_94():
+    '''
+    Test the array and DataFrame export of the Recorder.
+    Recorder class -- items with their own policy are exported on their own times, not mixed with the others
+    '''
+    system = newSystem()
+    recorder = system.getRecorders()["DIWATA"]
+    recorder.setPolicy(RecordPolicy("EVERY", 4), ["Sunlocation"])
+    simulate(system, 20, 1/4)
+
+    arrays = recorder.to_arrays(['Sunlocation'])
+    assert np.array_equal(arrays['t'], np.asarray(recorder.timesOf("Sunlocation").array[:,0]))
+    assert np.array_equal(arrays['Sunlocation.x'], recorder["Sunlocation"].array[:,0])
+    assert len(arrays['t']) < len(recorder.to_arrays()['t']) and 'Sunlocation.x' not in recorder.to_arrays()
+    assert recorder.to_frame(['Sunlocation']).shape == (len(arrays['t']), 4)
+    assert np.array_equal(recorder.export('Sunlocation')['Sunlocation.y'], arrays['Sunlocation.y'])
+    try:
+        recorder.to_arrays(['State', 'Sunlocation'])
+        assert False
+    except TypeError as error:
+        assert "EVERY" in str(error)
+
+def test_95():
+    '''
+    Test magnetic field models.
+    GriddedIGRFField -- the grid is synthesised in blocks, a refinement synthesises only its new nodes
+    '''
+    grid = GriddedIGRFField(resolution=(60,60,200), altitudeRange=(300,700), errorBound=5000, maxSamples=10, blockSize=7)
+    grid.build(2023.5)
+    assert grid.resolution == (30, 30, 100) and grid.grid.shape == (7, 13, 5, 3)
+    assert grid.evaluations == 7*13*5 + 2*10
+
+    latitudes, longitudes, altitudes = np.meshgrid(grid.latitudes, grid.longitudes, grid.altitudes, indexing='ij')
+    exact = IGRF_MODEL.ned(latitudes, longitudes, altitudes, 2023.5)
+    assert np.allclose(grid.grid, exact, rtol=0, atol=1e-6)
+    assert (grid.ned(30, 60, 500, 2023.5) - Vector(*exact[4,8,2])).magnitude() < 1e-6
+
+def test_96():
+    '''
+    Test analytic orbit propagation.
+    setPropagator method -- the samples are recorded at once, at their own location and sun, with the propagator's gravity as the only force
+    '''
+    system = newSystem(recordList=["Sunvector", "Illumination"])
+    system[0].setAtmosphereModel("US76")
+    system[0].setSRPModel("CANNONBALL")
+    system.setPropagator("J2")
+    simulate(system, 3600, 10, orbitPropOnly=True)
+
+    recorder = system.getRecorders()["DIWATA"]
+    assert len(recorder["State"]) == 360
+    for k in (1, 200, 359):
+        time, state = recorder.times[k], recorder["State"][k]
+        sunVector, sunLocation = systemSun(system, time)
+        assert time == 10*k
+        assert (recorder["Location"][k] - Environment(system, state.position, time).location).magnitude() < 1e-9
+        assert (recorder["Sunvector"][k] - sunVector).magnitude() < 1e-12
+        assert (recorder["Sunlocation"][k] - sunLocation).magnitude() < 1e-9
+        assert recorder["Illumination"][k] == shadowFunction(system, state.position, sunVector, system[0].shadowTYPE)
+        assert (recorder["Netforce"][k] - systemGravity(system, state.mass, state.position, "J2")).magnitude() < 1e-12
+        assert recorder["Nettorque"][k] == Vector(0,0,0)
+
+def test_97(monkeypatch):
+    '''
+    Test dense output.
+    Recorder.updateAt method -- the spacecraft and the system are put back when the sample fails
+    '''
+    system = newSystem()
+    spacecraft = system[0]
+    state, sunVector = spacecraft.state, system.sunVector
+    sample = state.copy()
+    sample.position = 2*sample.position
+
+    def failing(state, time):
+        raise ValueError("derivative")
+    monkeypatch.setattr(spacecraft, "derivative", failing)
+    try:
+        system.getRecorders()["DIWATA"].updateAt(30.0, sample)
+        assert False
+    except ValueError:
+        pass
+    assert spacecraft.state is state and system.sunVector is sunVector
+
+def test_98(tmp_path):
+    '''
+    Test analytic orbit propagation.
+    Recorder.updateBlock method -- the samples of an analytic run go through the policy and the sink of the recorder
+    '''
+    def run(policy, sink):
+        system = newSystem()
+        system.setPropagator("KEPLER")
+        recorder = system.getRecorders()["DIWATA"]
+        recorder.setPolicy(policy)
+        recorder.setSink(sink)
+        simulate(system, 1000, 1, orbitPropOnly=True)
+        return recorder
+
+    plain     = run(None, None)
+    decimated = run(RecordPolicy("EVERY", 4), None)
+    streamed  = run(None, RecorderSink(str(tmp_path), 64))
+    assert len(decimated["State"]) == 250
+    assert np.array_equal(decimated.to_arrays()['x'], plain.to_arrays()['x'][::4])
+    assert len(streamed.timeChannel.segments) > 0
+    assert np.array_equal(streamed.to_arrays()['x'], plain.to_arrays()['x'])
+    assert streamed.latest("State") == plain.latest("State")
+
+def test_99():
+    '''
+    Test the general inertia of the Spacecraft class.
+    setinertia -- the tensor is copied, changing the given Matrix in place afterwards leaves the inertia and its inverse as they were
+    '''
+    spacecraft = newSystem()[0]
+    tensor = Matrix(Vector(1,0,0), Vector(0,2,0), Vector(0,0,3))
+    spacecraft.setinertia(tensor)
+    assert (spacecraft.getinverseInertia()*Vector(1,1,1) - Vector(1,1/2,1/3)).magnitude() < 1e-15
+
+    tensor *= 2
+    assert spacecraft.getinertia()*Vector(1,1,1) == Vector(1,2,3)
+    assert (spacecraft.getinverseInertia()*Vector(1,1,1) - Vector(1,1/2,1/3)).magnitude() < 1e-15
+
+    spacecraft.setinertia(tensor)
+    assert (spacecraft.getinverseInertia()*Vector(1,1,1) - Vector(1/2,1/4,1/6)).magnitude() < 1e-15
+
+def test_100(tmp_path):
+    '''
+    Test the space weather driven atmosphere.
+    SpaceWeather class -- the cache is keyed on the files it was converted from, adding a forecast rebuilds it
+    '''
+    history, forecast = spaceWeatherFiles(tmp_path)
+    day = daysSinceJ2000(newSystem(0), 0.0)
+    assert SpaceWeather(history).indices(day + 5) == (120.0, 5.0)
+    assert SpaceWeather(history, forecast).indices(day + 5) == (200.0, 80.0)
+    assert SpaceWeather(history).indices(day + 5) == (120.0, 5.0)
+    with open(os.path.join(tmp_path, "SW-history.sources")) as file:
+        assert file.read().splitlines() == [os.path.abspath(history)]
+
+def test_101():
+    '''
+    Test the fleet derivative.
+    Fleet.orbitDerivative -- the translational part alone, without the attitude torques and the fallback hook
+    verify that it matches Spacecraft.orbitDerivative and that Fleet.derivative still adds the fallback force
+    '''
+    calls = []
+
+    class Pushed(Spacecraft):
+        def fallbackKinetics(self, state, time):
+            calls.append(time)
+            return Vector(1,0,0), Vector(0,0,0)
+
+    system = newSystem(2, True, bodyrate=(5,-4,3), dipole=(0.05,0.02,0.01))
+    system[1].__class__ = Pushed
+    system[1].setSRPModel("CANNONBALL")
+    system.sunVector, system.sunLocation = systemSun(system)
+    fleet  = Fleet(system, system.numericalSpacecraft())
+    states = system.stackStates()
+
+    orbit = fleet.orbitDerivative(states, 0.0)
+    assert calls == []
+    assert not orbit[:,7:14].any()
+    for i in range(2):
+        single = system[i].orbitDerivative(system[i].state, 0.0)
+        assert (Vector(*orbit[i,4:7].tolist()) - single.velocity).magnitude() <= 1e-12
+
+    full = fleet.derivative(states, 0.0)
+    assert calls == [0.0]
+    assert (Vector(*(full[1,4:7] - orbit[1,4:7]).tolist()) - Vector(1/4,0,0)).magnitude() <= 1e-12
+    assert (full[0,4:7] == orbit[0,4:7]).all()
+
+def test_102():
+    '''
+    Test the geopotential gravity models.
+    setGravityModel method -- "J2" on the equator and over the pole against -mu/r^2 (1 + 3/2 J2 (R/r)^2) and -mu/r^2 (1 - 3 J2 (R/r)^2)
+    GeopotentialModel class -- the degree 2 harmonics of EGM96 against their closed form on the equator and over the pole
+    '''
+    system = newSystem(0)
+    r = system.radi + 500e3
+    g = 398600.4418e9/r**2
+    k = (6378.137e3/r)**2
+    equator = systemGravity(system, 1, Vector(r,0,0), "J2")
+    pole    = systemGravity(system, 1, Vector(0,0,r), "J2")
+    assert abs(equator.x + g*(1 + 1.5*1.08262668e-3*k)) < 1e-12*g and equator.y == equator.z == 0
+    assert abs(pole.z + g*(1 - 3*1.08262668e-3*k)) < 1e-12*g and pole.x == pole.y == 0
+
+    # J2 = -sqrt(5) C20 and C22, S22 unnormalised by sqrt(5/12) from the EGM96 file
+    model = GeopotentialModel(degree=2)
+    f   = 3.986004415e14*6378136.3**2/r**4
+    J2  = 0.484165371736e-3*5**0.5
+    C22 = 0.243914352398e-5*(5/12)**0.5
+    S22 = -0.140016683654e-5*(5/12)**0.5
+    ax, ay, az = model.accelerationPoint(r, 0, 0)
+    assert abs(ax - (-1.5*J2 - 9*C22)*f) < 1e-9*abs(ax)
+    assert abs(ay - 6*S22*f) < 1e-9*abs(ay)
+    assert abs(GeopotentialModel(degree=2, order=0).accelerationPoint(0, 0, r)[2] - 3*J2*f) < 1e-9*J2*f
+
+def test_103():
+    '''
+    Test the lunisolar third-body perturbation.
+    systemThirdBody -- 500 km above the Earth towards the body, mu (1/(s - r)^2 - 1/s^2) away from the Earth,
+    and across that line the tidal compression -mu r/(s^2 + r^2)^(3/2)
+    '''
+    system = newSystem(0)
+    day = daysSinceJ2000(system, 0.0)
+    r = system.radi + 500e3
+    for name, body, mu in (("SUN", system.thirdBody.sun, 1.32712440018e20), ("MOON", system.thirdBody.moon, 4.9028e12)):
+        position = np.array(body.position(day))
+        s = np.linalg.norm(position)
+        towards = position/s
+        across  = np.cross(towards, [0,0,1])/np.linalg.norm(np.cross(towards, [0,0,1]))
+
+        force = systemThirdBody(system, 4, Vector(*(r*towards).tolist()), 0.0, name)
+        expected = mu*(1/(s - r)**2 - 1/s**2)*towards
+        assert np.linalg.norm(np.array([force.x, force.y, force.z])/4 - expected) < 1e-9*np.linalg.norm(expected)
+
+        force = systemThirdBody(system, 4, Vector(*(r*across).tolist()), 0.0, name)
+        compression = -mu*r/(s*s + r*r)**1.5
+        assert abs(np.dot([force.x, force.y, force.z], across)/4 - compression) < 1e-9*abs(compression)